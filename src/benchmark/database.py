@@ -0,0 +1,263 @@
+""" db.database.Databaseの基礎関数ごとの処理時間と、読み込みと書き込みの並行性を測るベンチマーク
+
+entriesテーブルの行数を変えながら、select / search / insert / insertOrReplace / update / delete を
+アプリケーションと同じく1回ずつwithブロック（=1トランザクション）で実行して計測する。
+続けて、entries.entry()と同じEXCLUSIVEトランザクションで書き込み続けるスレッドと、読み込みを続ける複数のスレッドを
+同時に走らせ、読み込みのスループットとレイテンシを計測する。
+
+結果はJSONに書き出す。CIの成果物として保存しておけば、connection pool、PRAGMA、SQLの生成の変更による
+性能の変化を比較できる。
+
+使い方 (srcディレクトリで実行):
+    python -m benchmark.database --sizes 10,1000,100000,1000000 --output bench_db.json
+    python -m benchmark.database --sizes 10,1000 --readers 1,4 --profile rollback
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+from typing import Any, Callable, Dict, List, Optional
+
+from benchmark.storage_profile import PROFILES
+from db import schema
+from db.database import Database
+from db.pool import ConnectionPool, StorageProfile
+
+
+# コンタクトチャンネルIDはDiscordのIDと同じ桁数にする
+_CHANNEL_BASE: int = 700000000000000000
+_FILL_CHUNK: int = 10000
+
+
+def _percentile(values: List[float], ratio: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * ratio))]
+
+
+def _summary(latencies: List[float]) -> Dict[str, float]:
+    total = sum(latencies)
+    return {
+        "ops_per_sec": len(latencies) / total if total > 0 else 0.0,
+        "mean_ms": total / len(latencies) * 1000 if latencies else 0.0,
+        "p50_ms": _percentile(latencies, 0.50) * 1000,
+        "p99_ms": _percentile(latencies, 0.99) * 1000,
+        "max_ms": max(latencies, default=0.0) * 1000,
+    }
+
+
+def fill(database: str, pool: ConnectionPool, rows: int):
+    """ entriesテーブルを作りなおし、rows行を挿入する. IDは1からrowsまで、discord_user_idは0からrows-1まで
+    """
+    schema.migrate(database, recreate=True, pool=pool)
+    with Database(database, isolation_level="EXCLUSIVE", pool=pool) as db:
+        for begin in range(0, rows, _FILL_CHUNK):
+            db.insertMany("entries", [{"discord_user_id": i, "contact_channel_id": _CHANNEL_BASE + i}
+                                      for i in range(begin, min(rows, begin + _FILL_CHUNK))])
+        db.commit()
+
+
+class _Operation:
+    """ 計測する基礎関数の呼び出し
+
+    run()を計測し、その後にrestore()を計測せずに実行する。restore()は行数を元に戻すのに使う。
+    """
+
+    def __init__(self, name: str, isolation_level: Optional[str],
+                 run: Callable[[Database, int], Any], restore: Optional[Callable[[Database, int], Any]] = None):
+        self.name: str = name
+        self.isolation_level: Optional[str] = isolation_level
+        self.run: Callable[[Database, int], Any] = run
+        self.restore: Optional[Callable[[Database, int], Any]] = restore
+
+
+def _operations(rows: int, rand: random.Random) -> List[_Operation]:
+    def existing() -> int:
+        return rand.randrange(rows)
+
+    def entry(user_id: int) -> Dict[str, Any]:
+        return {"discord_user_id": user_id, "contact_channel_id": _CHANNEL_BASE + user_id}
+
+    return [
+        _Operation("select", None,
+                   lambda db, n: db.select("entries", condition={"discord_user_id": existing()})),
+        _Operation("search", None,
+                   lambda db, n: db.search("entries", condition={"contact_channel_id": "{}%".format(
+                       _CHANNEL_BASE + existing())})),
+        _Operation("insert", "EXCLUSIVE",
+                   lambda db, n: db.insert("entries", candidate=entry(rows + n)),
+                   lambda db, n: db.delete("entries", condition={"discord_user_id": rows + n})),
+        _Operation("insertOrReplace", "EXCLUSIVE",
+                   lambda db, n: db.insertOrReplace("entries", candidate=dict(id=n % rows + 1, **entry(n % rows)))),
+        _Operation("update", "EXCLUSIVE",
+                   lambda db, n: db.update("entries", candidate={"current_phase_id": n % 5 + 1},
+                                           condition={"discord_user_id": existing()})),
+        _Operation("delete", "EXCLUSIVE",
+                   lambda db, n: db.delete("entries", condition={"id": n % rows + 1}),
+                   lambda db, n: db.insertOrReplace("entries", candidate=dict(id=n % rows + 1, **entry(n % rows)))),
+    ]
+
+
+def runOperations(database: str, pool: ConnectionPool, rows: int,
+                  iterations: int, max_seconds: float, seed: int) -> List[Dict[str, Any]]:
+    """ 行数rowsのテーブルで、基礎関数ごとに最大iterations回（最大max_seconds秒）の処理時間を計測する
+    """
+    fill(database, pool, rows)
+    rand = random.Random(seed)
+    results: List[Dict[str, Any]] = []
+    for operation in _operations(rows, rand):
+        latencies: List[float] = []
+        deadline = time.perf_counter() + max_seconds
+        for n in range(iterations):
+            begin = time.perf_counter()
+            with Database(database, isolation_level=operation.isolation_level, pool=pool) as db:
+                operation.run(db, n)
+                db.commit()
+            latencies.append(time.perf_counter() - begin)
+            if operation.restore is not None:
+                with Database(database, isolation_level=operation.isolation_level, pool=pool) as db:
+                    operation.restore(db, n)
+                    db.commit()
+            if time.perf_counter() > deadline:
+                break
+        result: Dict[str, Any] = {"operation": operation.name, "rows": rows, "iterations": len(latencies)}
+        result.update(_summary(latencies))
+        results.append(result)
+    return results
+
+
+def runConcurrency(database: str, profile: StorageProfile, rows: int, readers: int, seconds: float) -> Dict[str, Any]:
+    """ EXCLUSIVEトランザクションで書き込み続けるスレッド1つと、読み込み続けるreaders個のスレッドを同時に走らせる
+    """
+    pool = ConnectionPool(max_connections=readers + 1, storage_profile=profile)
+    fill(database, pool, rows)
+
+    stop = threading.Event()
+    latencies: List[List[float]] = [[] for _ in range(readers)]
+    errors: List[int] = [0] * (readers + 1)
+    writes: List[float] = []
+
+    def writer():
+        user_id = rows
+        while not stop.is_set():
+            user_id += 1
+            begin = time.perf_counter()
+            try:
+                # entries.entry()と同じ
+                with Database(database, isolation_level="EXCLUSIVE", pool=pool) as db:
+                    db.insert("entries", candidate={"discord_user_id": user_id,
+                                                    "contact_channel_id": _CHANNEL_BASE + user_id})
+                    db.select("entries", condition={"discord_user_id": user_id})
+                    db.commit()
+                writes.append(time.perf_counter() - begin)
+            except sqlite3.OperationalError:
+                errors[readers] += 1
+
+    def reader(index: int):
+        rand = random.Random(index)
+        while not stop.is_set():
+            begin = time.perf_counter()
+            try:
+                with Database(database, pool=pool) as db:
+                    db.select("entries", condition={"discord_user_id": rand.randrange(rows)})
+                latencies[index].append(time.perf_counter() - begin)
+            except sqlite3.OperationalError:
+                errors[index] += 1
+
+    threads = [threading.Thread(target=writer)] + [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    pool.closeAll()
+
+    all_latencies = [v for lat in latencies for v in lat]
+    return {
+        "rows": rows,
+        "readers": readers,
+        "reads_per_sec": len(all_latencies) / seconds,
+        "writes_per_sec": len(writes) / seconds,
+        "read_p50_ms": _percentile(all_latencies, 0.50) * 1000,
+        "read_p99_ms": _percentile(all_latencies, 0.99) * 1000,
+        "read_max_ms": max(all_latencies, default=0.0) * 1000,
+        "write_p50_ms": _percentile(writes, 0.50) * 1000,
+        "write_p99_ms": _percentile(writes, 0.99) * 1000,
+        "busy_errors": sum(errors),
+    }
+
+
+def _intList(text: str) -> List[int]:
+    return [int(v) for v in text.split(",") if v]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark db.database.Database operations and write concurrency.")
+    parser.add_argument("--sizes", type=_intList, default=[10, 100, 1000, 10000, 100000, 1000000],
+                        help="comma separated table sizes (rows)")
+    parser.add_argument("--iterations", type=int, default=1000, help="maximum iterations per operation")
+    parser.add_argument("--max-seconds", type=float, default=5.0, help="maximum duration per operation and size")
+    parser.add_argument("--readers", type=_intList, default=[1, 4, 8],
+                        help="comma separated numbers of reader threads in the concurrency runs")
+    parser.add_argument("--concurrency-rows", type=int, default=10000, help="table size in the concurrency runs")
+    parser.add_argument("--concurrency-seconds", type=float, default=3.0, help="duration of each concurrency run")
+    parser.add_argument("--profile", choices=list(PROFILES.keys()), default="wal", help="storage profile")
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    parser.add_argument("--output", default="bench_db.json", help="JSON file to write the results")
+    args = parser.parse_args()
+
+    profile = PROFILES[args.profile]
+    result: Dict[str, Any] = {
+        "environment": {
+            "date": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "profile": args.profile,
+            "storage_profile": repr(profile),
+        },
+        "operations": [],
+        "concurrency": [],
+    }
+
+    with tempfile.TemporaryDirectory() as workdir:
+        print("{:<16} {:>9} {:>7} {:>12} {:>10} {:>10} {:>10}".format(
+            "operation", "rows", "iters", "ops/s", "p50(ms)", "p99(ms)", "max(ms)"))
+        for rows in args.sizes:
+            pool = ConnectionPool(storage_profile=profile)
+            database = os.path.join(workdir, "bench_{}.db".format(rows))
+            for r in runOperations(database, pool, rows, args.iterations, args.max_seconds, args.seed):
+                result["operations"].append(r)
+                print("{:<16} {:>9d} {:>7d} {:>12.0f} {:>10.3f} {:>10.3f} {:>10.3f}".format(
+                    r["operation"], r["rows"], r["iterations"], r["ops_per_sec"],
+                    r["p50_ms"], r["p99_ms"], r["max_ms"]))
+            pool.closeAll()
+
+        print()
+        print("{:<8} {:>9} {:>10} {:>10} {:>12} {:>12} {:>12} {:>8}".format(
+            "readers", "rows", "reads/s", "writes/s", "read p50", "read p99", "write p99", "busy"))
+        for readers in args.readers:
+            database = os.path.join(workdir, "bench_concurrency_{}.db".format(readers))
+            r = runConcurrency(database, profile, args.concurrency_rows, readers, args.concurrency_seconds)
+            result["concurrency"].append(r)
+            print("{:<8d} {:>9d} {:>10.0f} {:>10.0f} {:>12.3f} {:>12.3f} {:>12.3f} {:>8d}".format(
+                r["readers"], r["rows"], r["reads_per_sec"], r["writes_per_sec"],
+                r["read_p50_ms"], r["read_p99_ms"], r["write_p99_ms"], r["busy_errors"]))
+
+    with open(args.output, mode="w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print()
+    print("Wrote results to {}".format(args.output))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+""" VemtClient.on_message のコマンド振り分けのスループットを測るベンチマーク
+
+何もしないコマンドを登録したVemtClientに、コマンドのメッセージを流し続けて1秒あたりの処理数を測る。
+メッセージは全て別のユーザーから送られたものとして、スケジューラーを通して実行し終えるまでを測る。
+比較のため、全てのサブコマンドを1つのargparseで解析する従来の方式（shlex + parse_args）の解析速度も測る。
+
+使い方 (srcディレクトリで実行):
+    python -m benchmark.dispatch --messages 20000 --commands 20
+"""
+import argparse
+import asyncio
+import shlex
+import time
+import types
+
+from typing import List
+
+import bot_loader  # noqa: F401  clientより先に読み込む（main.pyと同じ順序. 循環importのため）
+from classes import VemtArgumentParser, CommandScheduler
+from client import VemtClient
+
+
+class _FakeChannel:
+    def __init__(self):
+        self.sent: int = 0
+
+    async def send(self, content: str):
+        self.sent += 1
+
+
+class _FakeUser:
+    def __init__(self, user_id: int):
+        self.id: int = user_id
+        self.bot: bool = False
+
+    def __str__(self) -> str:
+        return "user#{}".format(self.id)
+
+
+class _FakeGuild:
+    def __init__(self, guild_id: int):
+        self.id: int = guild_id
+
+
+class _FakeMessage:
+    def __init__(self, content: str, channel: _FakeChannel, user_id: int):
+        self.content: str = content
+        self.channel: _FakeChannel = channel
+        self.author: _FakeUser = _FakeUser(user_id)
+        self.guild: _FakeGuild = _FakeGuild(1)
+
+
+def _makeProcessor(index: int) -> types.ModuleType:
+    """ 何もしないBOTモジュールを作成する
+    """
+    module = types.ModuleType("bench_command_{}".format(index))
+
+    def setup(subparser: argparse._SubParsersAction, dev: bool = False):
+        parser = subparser.add_parser("+bench{}".format(index), help="benchmark command {}".format(index))
+        parser.add_argument("--count", type=int, default=0)
+        parser.add_argument("target", nargs="?")
+        return parser
+
+    async def authenticate(args, client, message):
+        pass
+
+    async def run(args, client, message):
+        pass
+
+    module.setup = setup
+    module.authenticate = authenticate
+    module.run = run
+    return module
+
+
+def _messages(commands: int, count: int) -> List[str]:
+    return ["+bench{} target_{} --count {}".format(i % commands, i, i) for i in range(count)]
+
+
+def benchmarkOnMessage(client: VemtClient, contents: List[str]) -> float:
+    """ on_messageを順に実行し、1秒あたりの処理数を返す
+    """
+    channel = _FakeChannel()
+    messages = [_FakeMessage(content, channel, i) for i, content in enumerate(contents)]
+
+    async def dispatchAll():
+        for message in messages:
+            await client.on_message(message)
+        await client.scheduler.join()
+
+    loop = asyncio.new_event_loop()
+    try:
+        begin = time.perf_counter()
+        loop.run_until_complete(dispatchAll())
+        elapsed = time.perf_counter() - begin
+    finally:
+        loop.close()
+    assert channel.sent == 0, "unexpected reply: dispatch failed"
+    return len(messages) / elapsed
+
+
+def benchmarkLegacyParse(commands: int, contents: List[str]) -> float:
+    """ 全てのサブコマンドを1つのパーサーで解析する従来の方式で、1秒あたりの解析数を返す
+    """
+    parser = VemtArgumentParser(prog="", add_help=False)
+    subparser = parser.add_subparsers(parser_class=VemtArgumentParser)
+    for i in range(commands):
+        _makeProcessor(i).setup(subparser)
+
+    begin = time.perf_counter()
+    for content in contents:
+        parser.parse_args(shlex.split(content))
+    return len(contents) / (time.perf_counter() - begin)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure command dispatch throughput of VemtClient.on_message.")
+    parser.add_argument("--messages", type=int, default=20000, help="number of messages to dispatch")
+    parser.add_argument("--commands", type=int, default=20, help="number of registered commands")
+    args = parser.parse_args()
+
+    for i in range(args.commands):
+        VemtClient.addProcessor(_makeProcessor(i))
+    client = VemtClient(argparse.Namespace(dev=False),
+                        loop=asyncio.new_event_loop(),
+                        scheduler=CommandScheduler(max_pending=args.messages))
+    contents = _messages(args.commands, args.messages)
+
+    print("{:<30} {:>12}".format("stage", "msgs/s"))
+    print("{:<30} {:>12.0f}".format("legacy parse (shlex+argparse)", benchmarkLegacyParse(args.commands, contents)))
+    print("{:<30} {:>12.0f}".format("on_message (router)", benchmarkOnMessage(client, contents)))
+
+
+if __name__ == "__main__":
+    main()
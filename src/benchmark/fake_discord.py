@@ -0,0 +1,330 @@
+""" ベンチマーク用の、Discordに接続しないギルド・チャンネル・ロール・メンバー・メッセージ
+
+BOTのコマンドが使う範囲だけを実装する。REST APIに相当する操作（送信、作成、削除など）は、
+FakeRestのレイテンシとレート制限のモデルに従って待ってから結果を返す。
+"""
+import asyncio
+import itertools
+import random
+import time
+
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+
+class RateLimit:
+    """ レート制限のバケットの設定. per秒あたりlimit回まで
+    """
+
+    def __init__(self, limit: int, per: float):
+        assert limit > 0 and per > 0
+        self.limit: int = limit
+        self.per: float = per
+
+
+class _Bucket:
+    __slots__ = ("remaining", "reset_at")
+
+    def __init__(self):
+        self.remaining: int = 0
+        self.reset_at: float = 0.0
+
+
+class FakeRest:
+    """ DiscordのREST APIのレイテンシとレート制限のモデル
+
+    呼び出しごとに、バケットの残り回数が無ければリセットまで待ち（discord.pyが429を受けて待つのに相当）、
+    その後レイテンシの分だけ待つ。バケットはDiscordと同じく、ルートと主要なパラメーター（チャンネルID、ギルドID）の組で分ける。
+    """
+
+    # ルートごとのレート制限. Discordの実際の値に近いもの
+    DEFAULT_LIMITS: Dict[str, RateLimit] = {
+        "send_message": RateLimit(5, 5.0),
+        "edit_message": RateLimit(5, 5.0),
+        "create_channel": RateLimit(10, 10.0),
+        "delete_channel": RateLimit(5, 5.0),
+        "create_role": RateLimit(10, 10.0),
+        "delete_role": RateLimit(10, 10.0),
+        "add_role": RateLimit(10, 10.0),
+        "remove_role": RateLimit(10, 10.0),
+        "edit_member": RateLimit(10, 10.0),
+    }
+    # 全てのルートで共通のレート制限
+    GLOBAL_LIMIT: RateLimit = RateLimit(50, 1.0)
+
+    def __init__(self,
+                 latency: float = 0.05,
+                 jitter: float = 0.02,
+                 rate_limited: bool = True,
+                 limits: Optional[Dict[str, RateLimit]] = None,
+                 seed: int = 0,
+                 recorder: Optional[Callable[[str, float, float], None]] = None):
+        """ FakeRestを初期化する
+
+        Args:
+            latency (float): 1回の呼び出しのレイテンシ（秒）
+            jitter (float): レイテンシに加える一様乱数の幅（秒）
+            rate_limited (bool): レート制限を模擬するか
+            limits (Optional[Dict[str, RateLimit]]): ルートごとのレート制限. Noneの場合はDEFAULT_LIMITS
+            seed (int): レイテンシの乱数のシード
+            recorder (Optional[Callable[[str, float, float], None]]): 呼び出しごとに呼ばれる関数.
+                recorder(ルート, レート制限で待った時間, 全体の所要時間)
+        """
+        self.__latency: float = latency
+        self.__jitter: float = jitter
+        self.__rate_limited: bool = rate_limited
+        self.__limits: Dict[str, RateLimit] = limits if limits is not None else FakeRest.DEFAULT_LIMITS
+        self.__random: random.Random = random.Random(seed)
+        self.__recorder: Optional[Callable[[str, float, float], None]] = recorder
+        self.__buckets: Dict[Hashable, _Bucket] = {}
+        self.__calls: int = 0
+        self.__limited: int = 0
+        self.__ids = itertools.count(700000000000000000)
+
+    @property
+    def calls(self) -> int:
+        """ 呼び出された回数
+        """
+        return self.__calls
+
+    @property
+    def limited(self) -> int:
+        """ レート制限に掛かって待った回数
+        """
+        return self.__limited
+
+    def nextId(self) -> int:
+        """ 作成したリソースに割り当てるIDを取得する
+        """
+        return next(self.__ids)
+
+    async def __acquire(self, key: Hashable, limit: RateLimit) -> bool:
+        bucket = self.__buckets.get(key)
+        if bucket is None:
+            bucket = self.__buckets[key] = _Bucket()
+        limited = False
+        while True:
+            now = time.monotonic()
+            if now >= bucket.reset_at:
+                bucket.remaining = limit.limit
+                bucket.reset_at = now + limit.per
+            if bucket.remaining > 0:
+                bucket.remaining -= 1
+                return limited
+            limited = True
+            await asyncio.sleep(bucket.reset_at - now)
+
+    async def call(self, route: str, major: Hashable):
+        """ REST APIを1回呼び出したものとして待つ
+
+        Args:
+            route (str): ルート. DEFAULT_LIMITSのキー
+            major (Hashable): バケットを分けるパラメーター. チャンネルIDやギルドID
+        """
+        begin = time.perf_counter()
+        self.__calls += 1
+        limited = False
+        if self.__rate_limited:
+            limited |= await self.__acquire("global", FakeRest.GLOBAL_LIMIT)
+            limit = self.__limits.get(route)
+            if limit is not None:
+                limited |= await self.__acquire((route, major), limit)
+        if limited:
+            self.__limited += 1
+        waited = time.perf_counter() - begin if limited else 0.0
+        await asyncio.sleep(self.__latency + self.__random.uniform(0, self.__jitter))
+        if self.__recorder is not None:
+            self.__recorder(route, waited, time.perf_counter() - begin)
+
+
+class FakeRole:
+    def __init__(self, rest: FakeRest, guild: "FakeGuild", role_id: int, name: str):
+        self.__rest: FakeRest = rest
+        self.guild: "FakeGuild" = guild
+        self.id: int = role_id
+        self.name: str = name
+
+    def __repr__(self) -> str:
+        return "<FakeRole id={} name={!r}>".format(self.id, self.name)
+
+    async def delete(self):
+        await self.__rest.call("delete_role", self.guild.id)
+        self.guild.removeRole(self)
+
+
+class FakeMember:
+    def __init__(self, rest: FakeRest, guild: "FakeGuild", user_id: int, name: str, bot: bool = False):
+        self.__rest: FakeRest = rest
+        self.guild: "FakeGuild" = guild
+        self.id: int = user_id
+        self.name: str = name
+        self.nick: Optional[str] = None
+        self.bot: bool = bot
+        self.roles: List[FakeRole] = []
+
+    def __str__(self) -> str:
+        return "{}#{:04d}".format(self.name, self.id % 10000)
+
+    async def add_roles(self, *roles: FakeRole):
+        await self.__rest.call("add_role", self.guild.id)
+        self.roles.extend(roles)
+
+    async def remove_roles(self, *roles: FakeRole):
+        await self.__rest.call("remove_role", self.guild.id)
+        self.roles = [role for role in self.roles if role not in roles]
+
+    async def edit(self, nick: Optional[str] = None):
+        await self.__rest.call("edit_member", self.guild.id)
+        self.nick = nick
+
+
+class FakeMessage:
+    def __init__(self, rest: FakeRest, message_id: int, content: str,
+                 channel: "FakeTextChannel", author: FakeMember):
+        self.__rest: FakeRest = rest
+        self.id: int = message_id
+        self.content: str = content
+        self.channel: "FakeTextChannel" = channel
+        self.author: FakeMember = author
+        self.guild: "FakeGuild" = channel.guild
+
+    async def edit(self, content: Optional[str] = None):
+        await self.__rest.call("edit_message", self.channel.id)
+        if content is not None:
+            self.content = content
+
+
+class FakeCategoryChannel:
+    def __init__(self, rest: FakeRest, guild: "FakeGuild", channel_id: int, name: str,
+                 overwrites: Optional[Dict[Any, Any]] = None):
+        self.__rest: FakeRest = rest
+        self.guild: "FakeGuild" = guild
+        self.id: int = channel_id
+        self.name: str = name
+        self.overwrites: Dict[Any, Any] = overwrites or {}
+
+    async def delete(self):
+        await self.__rest.call("delete_channel", self.id)
+        self.guild.removeChannel(self)
+
+
+class FakeTextChannel:
+    def __init__(self, rest: FakeRest, guild: "FakeGuild", channel_id: int, name: str,
+                 category: Optional[FakeCategoryChannel] = None, topic: Optional[str] = None,
+                 overwrites: Optional[Dict[Any, Any]] = None):
+        self.__rest: FakeRest = rest
+        self.guild: "FakeGuild" = guild
+        self.id: int = channel_id
+        self.name: str = name
+        self.category: Optional[FakeCategoryChannel] = category
+        self.topic: Optional[str] = topic
+        self.overwrites: Dict[Any, Any] = overwrites or {}
+        self.sent: List[str] = []
+
+    def __repr__(self) -> str:
+        return "<FakeTextChannel id={} name={!r}>".format(self.id, self.name)
+
+    async def send(self, content: Optional[str] = None, **kwargs) -> FakeMessage:
+        await self.__rest.call("send_message", self.id)
+        self.sent.append(content or "")
+        return FakeMessage(self.__rest, self.__rest.nextId(), content or "", self, self.guild.me)
+
+    async def delete(self):
+        await self.__rest.call("delete_channel", self.id)
+        self.guild.removeChannel(self)
+
+
+class FakeGuild:
+    """ BOTのコマンドが使う範囲のdiscord.Guild
+
+    チャンネルとロールの作成・削除は、FakeRestで待ってからギルドの一覧に反映する。
+    """
+
+    def __init__(self, rest: FakeRest, guild_id: int, name: str, owner_id: int):
+        self.__rest: FakeRest = rest
+        self.id: int = guild_id
+        self.name: str = name
+        self.__channels: Dict[int, Any] = {}
+        self.__roles: Dict[int, FakeRole] = {}
+        self.__members: Dict[int, FakeMember] = {}
+        self.default_role: FakeRole = FakeRole(rest, self, guild_id, "@everyone")
+        self.__roles[self.default_role.id] = self.default_role
+        self.owner: FakeMember = self.addMember(owner_id, "owner")
+        self.me: FakeMember = self.addMember(rest.nextId(), "vemt-bot", bot=True)
+        self.general: FakeTextChannel = self.__addChannel(
+            FakeTextChannel(rest, self, rest.nextId(), "general"))
+
+    def __repr__(self) -> str:
+        return "<FakeGuild id={} name={!r}>".format(self.id, self.name)
+
+    @property
+    def channels(self) -> List[Any]:
+        return list(self.__channels.values())
+
+    @property
+    def roles(self) -> List[FakeRole]:
+        return list(self.__roles.values())
+
+    @property
+    def members(self) -> List[FakeMember]:
+        return list(self.__members.values())
+
+    def addMember(self, user_id: int, name: str, bot: bool = False) -> FakeMember:
+        """ メンバーを追加する. REST APIは呼ばない
+        """
+        member = FakeMember(self.__rest, self, user_id, name, bot=bot)
+        self.__members[user_id] = member
+        return member
+
+    def getMember(self, user_id: int) -> Optional[FakeMember]:
+        return self.__members.get(user_id)
+
+    def get_channel(self, channel_id: Optional[int]) -> Optional[Any]:
+        return self.__channels.get(channel_id)
+
+    def get_role(self, role_id: Optional[int]) -> Optional[FakeRole]:
+        return self.__roles.get(role_id)
+
+    def removeChannel(self, channel: Any):
+        self.__channels.pop(channel.id, None)
+
+    def removeRole(self, role: FakeRole):
+        self.__roles.pop(role.id, None)
+
+    def __addChannel(self, channel: Any) -> Any:
+        self.__channels[channel.id] = channel
+        return channel
+
+    async def create_role(self, name: str, **kwargs) -> FakeRole:
+        await self.__rest.call("create_role", self.id)
+        role = FakeRole(self.__rest, self, self.__rest.nextId(), name)
+        self.__roles[role.id] = role
+        return role
+
+    async def create_category_channel(self, name: str,
+                                      overwrites: Optional[Dict[Any, Any]] = None) -> FakeCategoryChannel:
+        await self.__rest.call("create_channel", self.id)
+        return self.__addChannel(FakeCategoryChannel(self.__rest, self, self.__rest.nextId(), name, overwrites))
+
+    async def create_text_channel(self, name: str,
+                                  category: Optional[FakeCategoryChannel] = None,
+                                  topic: Optional[str] = None,
+                                  overwrites: Optional[Dict[Any, Any]] = None) -> FakeTextChannel:
+        await self.__rest.call("create_channel", self.id)
+        return self.__addChannel(FakeTextChannel(self.__rest, self, self.__rest.nextId(), name,
+                                                 category=category, topic=topic, overwrites=overwrites))
+
+
+def makeGuilds(rest: FakeRest, count: int, users: int) -> List[Tuple[FakeGuild, List[FakeMember]]]:
+    """ ギルドと、ギルドごとのオーナー以外のメンバーを作成する
+
+    Args:
+        rest (FakeRest): REST APIのモデル
+        count (int): ギルドの数
+        users (int): ギルドごとのオーナー以外のメンバーの数
+    """
+    ret: List[Tuple[FakeGuild, List[FakeMember]]] = []
+    for i in range(count):
+        guild = FakeGuild(rest, rest.nextId(), "bench-guild-{}".format(i), owner_id=rest.nextId())
+        members = [guild.addMember(rest.nextId(), "user{}".format(j)) for j in range(users)]
+        ret.append((guild, members))
+    return ret
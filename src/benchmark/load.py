@@ -0,0 +1,389 @@
+""" Discordに接続せずに、VemtClient.on_messageからのコマンドの処理全体に負荷を掛けるベンチマーク
+
+benchmark.fake_discordのギルドとREST APIのモデルを使い、実際のBOTモジュールとテンポラリディレクトリのデータベースで
+コマンドを実行する。コマンドごとに、on_messageを呼んでから処理が終わるまでのレイテンシ、
+データベース専用のスレッドプールでの処理時間、REST APIの所要時間を計測する。
+
+シナリオ:
+    entry-rush  全てのギルドを+initしてエントリー期間を開始した後、--mixの割合でコマンドを一斉に送る
+    init-reset  ギルドごとに+initと+resetを--loops回繰り返す. ギルドどうしは並行に実行する
+
+使い方 (リポジトリのルートで実行):
+    PYTHONPATH=src python -m benchmark.load entry-rush --guilds 4 --users 200 --mix entry=8,help=1,unknown=1
+    PYTHONPATH=src python -m benchmark.load init-reset --guilds 8 --loops 3 --latency 80
+"""
+import argparse
+import asyncio
+import contextvars
+import datetime
+import itertools
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import bot_loader
+import config as server_config
+from benchmark.fake_discord import FakeRest, FakeGuild, FakeMember, FakeMessage, FakeTextChannel, makeGuilds
+from classes import CommandScheduler, Outbox, EntryAdmission
+from client import VemtClient
+from db import async_database, database
+from db import pool as db_pool
+from db.api import registry, registry_cache
+
+
+class _CommandProbe:
+    """ 1つのコマンドの計測値
+    """
+
+    def __init__(self, label: str):
+        self.label: str = label
+        self.begin: float = time.perf_counter()
+        self.latency: float = 0.0
+        self.db: float = 0.0
+        self.api: float = 0.0
+        self.api_wait: float = 0.0
+        self.submitted: bool = False
+        self.finished: bool = False
+        self.done: asyncio.Future = asyncio.get_event_loop().create_future()
+
+    def finish(self):
+        if not self.finished:
+            self.finished = True
+            self.latency = time.perf_counter() - self.begin
+            self.done.set_result(None)
+
+
+# 実行中のコマンドの計測値. データベースのスレッドプールとREST APIのモデルが、呼び出し元のコマンドを特定するのに使う
+_currentProbe: contextvars.ContextVar = contextvars.ContextVar("benchmark_probe", default=None)
+
+
+class _Recorder:
+    """ コマンドの計測値と、コマンドの終了後に続く処理（受付待ち行列、送信待ち行列など）の計測値を集める
+    """
+
+    def __init__(self):
+        self.__lock: threading.Lock = threading.Lock()
+        self.probes: List[_CommandProbe] = []
+        self.background_db: float = 0.0
+        self.background_api: float = 0.0
+        self.api_calls: int = 0
+        self.api_limited: int = 0
+
+    def reset(self):
+        """ 計測値を捨てる. 準備段階のコマンドを計測から除くときに使う
+        """
+        with self.__lock:
+            self.probes = []
+            self.background_db = 0.0
+            self.background_api = 0.0
+            self.api_calls = 0
+            self.api_limited = 0
+
+    def start(self, label: str) -> _CommandProbe:
+        probe = _CommandProbe(label)
+        self.probes.append(probe)
+        return probe
+
+    def recordDb(self, probe: Optional[_CommandProbe], elapsed: float):
+        # ワーカースレッドから呼ばれる
+        with self.__lock:
+            if probe is not None and not probe.finished:
+                probe.db += elapsed
+            else:
+                self.background_db += elapsed
+
+    def recordApi(self, route: str, waited: float, elapsed: float):
+        self.api_calls += 1
+        if waited > 0:
+            self.api_limited += 1
+        probe: Optional[_CommandProbe] = _currentProbe.get()
+        if probe is not None and not probe.finished:
+            probe.api += elapsed
+            probe.api_wait += waited
+        else:
+            self.background_api += elapsed
+
+
+_recorder: _Recorder = _Recorder()
+
+
+class _TimingExecutor(ThreadPoolExecutor):
+    """ 投入元のコマンドに、ワーカースレッドでの処理時間を記録するスレッドプール
+    """
+
+    def submit(self, fn, *args, **kwargs):
+        # run_in_executor()はイベントループのスレッドで、呼び出し元のタスクのコンテキストのまま呼ぶ
+        probe: Optional[_CommandProbe] = _currentProbe.get()
+
+        def timed():
+            begin = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _recorder.recordDb(probe, time.perf_counter() - begin)
+
+        return super().submit(timed)
+
+
+class _MeasuringScheduler(CommandScheduler):
+    """ コマンドの処理が終わった時点で計測を終えるスケジューラー
+    """
+
+    def submit(self, guild_id: Optional[int], user_id: int, scope: str, job: Callable[[], Awaitable]):
+        probe: Optional[_CommandProbe] = _currentProbe.get()
+        if probe is not None:
+            probe.submitted = True
+
+        async def measured():
+            token = _currentProbe.set(probe)
+            try:
+                await job()
+            finally:
+                if probe is not None:
+                    probe.finish()
+                _currentProbe.reset(token)
+
+        super().submit(guild_id, user_id, scope, measured)
+
+
+class LoadHarness:
+    """ 偽のギルドにコマンドのメッセージを送り、VemtClientに処理させる
+    """
+
+    def __init__(self, client: VemtClient, rest: FakeRest, guilds: List[Tuple[FakeGuild, List[FakeMember]]]):
+        self.client: VemtClient = client
+        self.rest: FakeRest = rest
+        self.guilds: List[Tuple[FakeGuild, List[FakeMember]]] = guilds
+        self.__message_ids = itertools.count(1)
+
+    async def send(self, label: str, channel: FakeTextChannel, author: FakeMember, content: str) -> _CommandProbe:
+        """ コマンドのメッセージを送る. 処理の完了は待たない
+        """
+        probe = _recorder.start(label)
+        token = _currentProbe.set(probe)
+        try:
+            await self.client.on_message(FakeMessage(self.rest, next(self.__message_ids), content, channel, author))
+        finally:
+            _currentProbe.reset(token)
+        if not probe.submitted:
+            # 解析エラーや待ち行列の溢れなど、スケジューラーに渡らなかったコマンド
+            probe.finish()
+        return probe
+
+    async def command(self, label: str, channel: FakeTextChannel, author: FakeMember, content: str) -> _CommandProbe:
+        """ コマンドのメッセージを送り、処理が終わるまで待つ
+        """
+        probe = await self.send(label, channel, author, content)
+        await probe.done
+        return probe
+
+    async def drain(self):
+        """ 受け付けたコマンド、エントリー、メッセージの送信が全て終わるまで待つ
+        """
+        await self.client.scheduler.join()
+        await self.client.admission.join()
+        await self.client.outbox.flush()
+        await asyncio.gather(*[p.done for p in _recorder.probes])
+
+    async def initGuild(self, guild: FakeGuild):
+        await self.command("+init", guild.general, guild.owner, "+init {}".format(guild.name))
+        if self.client.getSnapshot(guild.id) is None:
+            raise RuntimeError("failed to initialize {}: {}".format(guild, guild.general.sent[-1:]))
+
+    async def openEntryPeriod(self, guild: FakeGuild):
+        now = datetime.datetime.now()
+        await async_database.asyncGuildDatabase(guild.id, isolation_level="EXCLUSIVE").upsertMany(
+            "registry_datetime", [
+                {"title": "schedule.limitation.entry.since", "itemvalue": now - datetime.timedelta(hours=1)},
+                {"title": "schedule.limitation.entry.until", "itemvalue": now + datetime.timedelta(days=1)}
+            ])
+        registry.invalidateCache(guild.id)
+
+
+def parseMix(text: str) -> List[Tuple[str, int]]:
+    """ "entry=8,help=1" の形式の割合を解析する
+    """
+    ret: List[Tuple[str, int]] = []
+    for item in text.split(","):
+        name, _, weight = item.partition("=")
+        if name.strip() not in _MIX_COMMANDS:
+            raise argparse.ArgumentTypeError("unknown command '{}' in mix. Choose from {}".format(
+                name, ", ".join(_MIX_COMMANDS.keys())))
+        ret.append((name.strip(), int(weight) if weight else 1))
+    return ret
+
+
+def _entryMessage(harness: LoadHarness, guild: FakeGuild, author: FakeMember) -> Tuple[FakeTextChannel, str]:
+    snapshot = harness.client.getSnapshot(guild.id)
+    return snapshot.channelEntry, "+entry"
+
+
+_MIX_COMMANDS: Dict[str, Callable[[LoadHarness, FakeGuild, FakeMember], Tuple[FakeTextChannel, str]]] = {
+    "entry": _entryMessage,
+    "help": lambda harness, guild, author: (guild.general, "+help"),
+    "unknown": lambda harness, guild, author: (guild.general, "+unknown-command"),
+}
+
+
+async def entryRush(harness: LoadHarness, mix: List[Tuple[str, int]], rate: float, seed: int):
+    """ 全てのギルドを初期化してエントリー期間を開始し、全てのメンバーから--mixの割合でコマンドを送る
+    """
+    await asyncio.gather(*[harness.initGuild(guild) for guild, _ in harness.guilds])
+    await asyncio.gather(*[harness.openEntryPeriod(guild) for guild, _ in harness.guilds])
+    await harness.drain()
+    _recorder.reset()
+
+    rand = random.Random(seed)
+    names = [name for name, _ in mix]
+    weights = [weight for _, weight in mix]
+    # ギルドをまたいで交互に届くように並べる
+    rounds = itertools.zip_longest(*[[(guild, guild.owner)] + [(guild, m) for m in members]
+                                     for guild, members in harness.guilds])
+    for guild, author in (sender for senders in rounds for sender in senders if sender is not None):
+        name = rand.choices(names, weights)[0]
+        channel, content = _MIX_COMMANDS[name](harness, guild, author)
+        await harness.send("+" + name, channel, author, content)
+        if rate > 0:
+            await asyncio.sleep(1.0 / rate)
+
+
+async def initReset(harness: LoadHarness, loops: int):
+    """ ギルドごとに+initと+resetを繰り返す
+    """
+
+    async def loop(guild: FakeGuild):
+        for _ in range(loops):
+            await harness.command("+init", guild.general, guild.owner, "+init {}".format(guild.name))
+            await harness.command("+reset", guild.general, guild.owner, "+reset")
+
+    await asyncio.gather(*[loop(guild) for guild, _ in harness.guilds])
+
+
+def _percentile(values: List[float], ratio: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * ratio))]
+
+
+def report(harness: LoadHarness, elapsed: float):
+    probes = _recorder.probes
+    print("{:<10} {:>7} {:>10} {:>10} {:>10} {:>10} {:>10} {:>10}".format(
+        "command", "count", "p50(ms)", "p99(ms)", "max(ms)", "db(ms)", "api(ms)", "limit(ms)"))
+    labels = sorted({p.label for p in probes})
+    for label in labels:
+        group = [p for p in probes if p.label == label]
+        latencies = [p.latency for p in group]
+        print("{:<10} {:>7d} {:>10.1f} {:>10.1f} {:>10.1f} {:>10.2f} {:>10.1f} {:>10.1f}".format(
+            label, len(group),
+            _percentile(latencies, 0.50) * 1000, _percentile(latencies, 0.99) * 1000, max(latencies) * 1000,
+            sum(p.db for p in group) / len(group) * 1000,
+            sum(p.api for p in group) / len(group) * 1000,
+            sum(p.api_wait for p in group) / len(group) * 1000))
+
+    client = harness.client
+    failures = sum(1 for guild, _ in harness.guilds for channel in guild.channels
+                   if isinstance(channel, FakeTextChannel)
+                   for content in channel.sent for line in content.splitlines() if line.startswith(":x:"))
+    print()
+    print("elapsed           {:>10.2f} s".format(elapsed))
+    print("throughput        {:>10.1f} commands/s".format(len(probes) / elapsed if elapsed > 0 else 0.0))
+    print("error replies     {:>10d}".format(failures))
+    if probes and failures * 2 > len(probes):
+        print("WARNING: most commands were answered with an error. "
+              "The latencies mostly measure the error path, not the command itself.")
+    print("entries           {:>10d} admitted, {} duplicated, {} failed".format(
+        client.admission.admitted, client.admission.duplicated, client.admission.failed))
+    print("outbox            {:>10d} posted, {} sent, peak depth {}".format(
+        client.outbox.posted, client.outbox.sent, client.outbox.peakDepth))
+    print("rest              {:>10d} calls, {} rate limited".format(_recorder.api_calls, _recorder.api_limited))
+    print("background        {:>10.1f} ms db, {:.1f} ms api".format(
+        _recorder.background_db * 1000, _recorder.background_api * 1000))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive VemtClient.on_message with a fake Discord and report latency.")
+    parser.add_argument("scenario", choices=["entry-rush", "init-reset"])
+    parser.add_argument("--guilds", type=int, default=4, help="number of guilds")
+    parser.add_argument("--users", type=int, default=100, help="number of members per guild (except the owner)")
+    parser.add_argument("--mix", type=parseMix, default="entry=1",
+                        help="weights of commands in entry-rush. e.g. entry=8,help=1,unknown=1")
+    parser.add_argument("--rate", type=float, default=0.0, help="messages per second in entry-rush. 0 sends at once")
+    parser.add_argument("--loops", type=int, default=3, help="number of +init/+reset rounds per guild")
+    parser.add_argument("--latency", type=float, default=50.0, help="REST API latency (ms)")
+    parser.add_argument("--jitter", type=float, default=20.0, help="REST API latency jitter (ms)")
+    parser.add_argument("--no-rate-limit", action="store_true", help="disable the rate limit model")
+    parser.add_argument("--backend", choices=[database.BACKEND_PER_GUILD, database.BACKEND_CONSOLIDATED],
+                        default=database.BACKEND_PER_GUILD, help="database backend")
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    parser.add_argument("--log-level", default="ERROR", help="log level of the bot (DEBUG / INFO / WARNING / ERROR)")
+    args = parser.parse_args()
+
+    # コマンドエラーのログで結果が埋もれないようにする
+    logging.basicConfig(level=args.log_level)
+
+    # main.pyと同じく、リポジトリのルートから設定を読み込む. 実行したディレクトリによらずルートに移動する
+    os.chdir(os.path.dirname(os.path.abspath(os.path.join(__file__, "../../"))))
+    server_config.loadConfig()
+    db_config = server_config.getConfig().database
+    scheduler_config = server_config.getConfig().scheduler
+    admission_config = server_config.getConfig().admission
+
+    for module in bot_loader.loadBotProcessors():
+        VemtClient.addProcessor(module, dev=True)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        # ギルドごとのデータベースはカレントディレクトリに作られる
+        os.chdir(workdir)
+        database.setupBackend(backend=args.backend, consolidated_filepath=os.path.join(workdir, "vemt.db"))
+        db_pool.setupConnectionPool(max_databases=db_config.poolMaxDatabases,
+                                    max_connections=db_config.poolMaxConnections)
+        async_database.setupExecutor(max_workers=db_config.executorMaxWorkers, executor_class=_TimingExecutor)
+        registry_cache.setupRegistryCache(ttl=db_config.registryCacheTtl)
+
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        rest = FakeRest(latency=args.latency / 1000, jitter=args.jitter / 1000,
+                        rate_limited=not args.no_rate_limit, seed=args.seed, recorder=_recorder.recordApi)
+        outbox = Outbox()
+        client = VemtClient(argparse.Namespace(dev=False), loop=loop,
+                            scheduler=_MeasuringScheduler(
+                                max_pending_per_lane=scheduler_config.maxPendingPerLane,
+                                max_pending=scheduler_config.maxPending,
+                                max_concurrent=scheduler_config.maxConcurrent),
+                            outbox=outbox,
+                            admission=EntryAdmission(
+                                outbox,
+                                batch_size=admission_config.batchSize,
+                                batch_interval=admission_config.batchIntervalMs / 1000,
+                                concurrency=admission_config.concurrency,
+                                request_interval=admission_config.requestIntervalMs / 1000))
+        harness = LoadHarness(client, rest, makeGuilds(rest, args.guilds, args.users))
+
+        async def scenario() -> float:
+            if args.scenario == "entry-rush":
+                # 計測はコマンドの送信から始める
+                await entryRush(harness, args.mix, args.rate, args.seed)
+            else:
+                _recorder.reset()
+                await initReset(harness, args.loops)
+            await harness.drain()
+            return time.perf_counter() - min((p.begin for p in _recorder.probes), default=time.perf_counter())
+
+        try:
+            elapsed = loop.run_until_complete(scenario())
+        finally:
+            async_database.shutdownExecutor()
+            db_pool.getConnectionPool().closeAll()
+            loop.close()
+        report(harness, elapsed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+""" ストレージ設定ごとの、エントリー殺到時の読み込み並行性を測るベンチマーク
+
+entries.entry()と同じEXCLUSIVEトランザクションで書き込み続けるスレッドと、
+レジストリを読み込み続けるスレッドを同時に走らせ、読み込みのスループットとレイテンシを比較する。
+
+使い方 (srcディレクトリで実行):
+    python -m benchmark.storage_profile --seconds 5 --readers 4
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from typing import Dict, List
+
+from db import schema
+from db.database import Database
+from db.pool import ConnectionPool, StorageProfile
+
+
+PROFILES: Dict[str, StorageProfile] = {
+    "rollback": StorageProfile(journal_mode="DELETE", synchronous="FULL", temp_store="DEFAULT"),
+    "wal": StorageProfile(journal_mode="WAL", synchronous="NORMAL", temp_store="MEMORY"),
+}
+
+
+def _percentile(values: List[float], ratio: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * ratio))]
+
+
+def run(profile_name: str, profile: StorageProfile, seconds: float, readers: int, workdir: str) -> dict:
+    database = os.path.join(workdir, "bench_{}.db".format(profile_name))
+    pool = ConnectionPool(max_connections=readers + 1, storage_profile=profile)
+    schema.migrate(database, recreate=True, pool=pool)
+    with Database(database, pool=pool) as db:
+        db.insertMany("registry_int", [{"title": "key.{}.id".format(i), "itemvalue": i} for i in range(100)])
+
+    stop = threading.Event()
+    latencies: List[List[float]] = [[] for _ in range(readers)]
+    errors: List[int] = [0] * (readers + 1)
+    writes: List[int] = [0]
+
+    def writer():
+        user_id = 0
+        while not stop.is_set():
+            user_id += 1
+            try:
+                with Database(database, isolation_level="EXCLUSIVE", pool=pool) as db:
+                    db.insert("entries", candidate={"discord_user_id": user_id, "contact_channel_id": user_id})
+                    db.commit()
+                writes[0] += 1
+            except sqlite3.OperationalError:
+                errors[readers] += 1
+
+    def reader(index: int):
+        while not stop.is_set():
+            begin = time.perf_counter()
+            try:
+                with Database(database, pool=pool) as db:
+                    db.select("registry_int", columns=["title", "itemvalue"])
+                latencies[index].append(time.perf_counter() - begin)
+            except sqlite3.OperationalError:
+                errors[index] += 1
+
+    threads = [threading.Thread(target=writer)] + [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    pool.closeAll()
+
+    all_latencies = [v for lat in latencies for v in lat]
+    return {
+        "profile": profile_name,
+        "reads_per_sec": len(all_latencies) / seconds,
+        "writes_per_sec": writes[0] / seconds,
+        "read_p50_ms": _percentile(all_latencies, 0.50) * 1000,
+        "read_p99_ms": _percentile(all_latencies, 0.99) * 1000,
+        "read_max_ms": max(all_latencies, default=0.0) * 1000,
+        "busy_errors": sum(errors),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare read concurrency of storage profiles during entry floods.")
+    parser.add_argument("--seconds", type=float, default=5.0, help="duration of each profile run")
+    parser.add_argument("--readers", type=int, default=4, help="number of reader threads")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        print("{:<10} {:>12} {:>12} {:>12} {:>12} {:>12} {:>8}".format(
+            "profile", "reads/s", "writes/s", "p50(ms)", "p99(ms)", "max(ms)", "busy"))
+        for name, profile in PROFILES.items():
+            r = run(name, profile, args.seconds, args.readers, workdir)
+            print("{:<10} {:>12.0f} {:>12.0f} {:>12.3f} {:>12.3f} {:>12.3f} {:>8d}".format(
+                r["profile"], r["reads_per_sec"], r["writes_per_sec"],
+                r["read_p50_ms"], r["read_p99_ms"], r["read_max_ms"], r["busy_errors"]))
+
+
+if __name__ == "__main__":
+    main()
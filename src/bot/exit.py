@@ -1,6 +1,10 @@
 import discord
 import argparse
 import exception
+from classes import CommandScheduler
+
+# ギルドの構成を変更するため、同じギルドの他のコマンドと並行に実行しない
+COMMAND_SCOPE = CommandScheduler.SCOPE_GUILD
 
 
 def setup(subparser: argparse._SubParsersAction, dev=False):
@@ -21,5 +25,7 @@ async def authenticate(args, client: discord.Client, message: discord.Message):
 
 
 async def run(args, client: discord.Client, message: discord.Message):
-    await message.channel.send('OK, See you. ')
+    await client.outbox.send(message.channel, 'OK, See you. ')
+    await client.admission.join()
+    await client.outbox.flush()
     await client.close()
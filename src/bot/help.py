@@ -14,5 +14,6 @@ async def authenticate(args, client: discord.Client, message: discord.Message):
 
 
 async def run(args, client, message: discord.Message):
-    await message.channel.send("ヘルプのヘルプ…:thinking_face:\n"
-                               + "もし何か困りごとがあれば、開発者の<@!462643174087720971>に聞いてみてね！")
+    await client.outbox.send(message.channel,
+                             "ヘルプのヘルプ…:thinking_face:\n"
+                             + "もし何か困りごとがあれば、開発者の<@!462643174087720971>に聞いてみてね！")
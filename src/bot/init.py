@@ -1,16 +1,18 @@
 import discord
 import argparse
 import logging
-import subprocess
-import os
 from typing import List, Optional
 import sqlite3
 
 import exception
+from classes import CommandScheduler, Provisioner, ProvisioningError
 import config
-from db import database
+from db import schema
 from db.api import registry
 
+# ギルドの構成を変更するため、同じギルドの他のコマンドと並行に実行しない
+COMMAND_SCOPE = CommandScheduler.SCOPE_GUILD
+
 
 def setup(subparser: argparse._SubParsersAction, dev: bool = True):
     parser = subparser.add_parser("+init",
@@ -34,7 +36,7 @@ async def run(args, client, message: discord.Message):
 
     # 既に初期化されていないか
     try:
-        if registry.isServerInitialized(message.guild.id):
+        if await registry.isServerInitializedAsync(message.guild.id):
             raise exception.VemtCommandError("このサーバーは既に初期化されています")
     except sqlite3.OperationalError:
         # DBが存在しない
@@ -44,8 +46,9 @@ async def run(args, client, message: discord.Message):
         raise exception.VemtCommandError("サーバー名が一致していません")
 
     logger.info("Start to initialize discord server.")
-    await message.channel.send('Discordサーバーを初期化します\n'
-                               '初期化中はサーバー設定の変更や、別のコマンドの発行をしないでください')
+    await client.outbox.send(message.channel,
+                             'Discordサーバーを初期化します\n'
+                             '初期化中はサーバー設定の変更や、別のコマンドの発行をしないでください')
 
     if not message.guild:
         raise exception.VemtCommandError("ギルドの取得に失敗しました")
@@ -94,103 +97,126 @@ async def run(args, client, message: discord.Message):
         logger.error("Not found @everyone role.", rl.name)
         raise exception.VemtCommandError("@everyoneロールが見つかりません")
 
-    # ニックネーム
-    logger.debug("- Changing BOT nickname to VEMT.")
-    await guild.me.edit(nick="VEMT")
-    logger.info("- Changed BOT nickname to VEMT.")
-
-    # ロールを作る
-    logger.debug("- Creating roles.")
-    bot_admin_role: discord.Role = await guild.create_role(name=config.getConfig().roleName.botAdmin,
-                                                           hoist=True, mentionable=True,
-                                                           colour=discord.Color(0x3498db))
-    manager_role: discord.Role = await guild.create_role(name=config.getConfig().roleName.manager,
-                                                         hoist=True, mentionable=True,
-                                                         colour=discord.Color(0xe74c3c))
-    exhibitor_role: discord.Role = await guild.create_role(name=config.getConfig().roleName.exhibitor,
-                                                           hoist=True, mentionable=True,
-                                                           colour=discord.Color(0x2ecc71))
-    pre_exhibitor_role: discord.Role = await guild.create_role(name=config.getConfig().roleName.preExhibitor,
-                                                               hoist=True, mentionable=True,
-                                                               colour=discord.Color(0x208c4e))
-    logger.info("- Created roles.")
-
-    # カテゴリを作る
-    logger.debug("- Creating categories.")
-    bot_category: discord.CategoryChannel = await guild.create_category_channel(config.getConfig().categoryName.bot)
-    contact_category: discord.CategoryChannel = await guild.create_category_channel(
-        name=config.getConfig().categoryName.contact,
-        overwrites={guild.default_role: discord.PermissionOverwrite(read_messages=False)})
-    logger.info("- Created categories.")
-
-    # チャンネルを作る
-    # BOTの管理用チャンネル
-    logger.debug("- Creating channels.")
-    bot_manage_channel: discord.TextChannel = await guild.create_text_channel(
-        name=config.getConfig().channelName.botControl,
-        category=bot_category,
-        topic="BOTの設定変更など、BOT管理を行うチャンネルです。`+config --help`でヘルプを表示します。",
-        overwrites={
-            guild.default_role: discord.PermissionOverwrite(read_messages=False),
-            bot_admin_role: discord.PermissionOverwrite(read_messages=True)
-        }
-    )
-
-    # 出展応募用チャンネル
-    entry_channel: discord.TextChannel = await guild.create_text_channel(
-        name=config.getConfig().channelName.entry,
-        category=bot_category,
-        topic="仮エントリーを申し込むためのチャンネルです。エントリー受付期間中、`+entry`で仮エントリーが可能です。",
-        overwrites={
-            guild.default_role: discord.PermissionOverwrite(send_messages=False)
-        }
-    )
-
-    # 情報問い合わせ用チャンネル
-    query_channel: discord.TextChannel = await guild.create_text_channel(
-        name=config.getConfig().channelName.query,
-        category=bot_category,
-        topic="様々な情報を取得することができます。運営専用チャンネルです。`+query --help`でヘルプを表示します。",
-        overwrites={
-            guild.default_role: discord.PermissionOverwrite(read_messages=False),
-            manager_role: discord.PermissionOverwrite(read_messages=True)
-        }
-    )
-
-    # ステータス確認用のチャンネル
-    status_channel: discord.TextChannel = await guild.create_text_channel(
-        name=config.getConfig().channelName.status,
-        category=bot_category,
-        topic="サーバーに関するステータス確認用のチャンネルです。",
-        overwrites={
-            guild.default_role: discord.PermissionOverwrite(read_messages=True, send_messages=False)
-        }
-    )
-    logger.info("- Created channels.")
-
-    # DBを作成
-    db_proc = subprocess.Popen(
-        "sqlite3 {} < {}".format(
-            database.toDBFilepath(guild.id),
-            os.path.abspath("src/db/scheme.sql")),
-        shell=True)
-    db_proc.wait()
-
-    # サーバー固有のIDを記録する
-    # Database
-    registry.setupGuildIds(guild_id=guild.id,
-                           category_bot_id=bot_category.id,
-                           category_contact_id=contact_category.id,
-                           channel_bot_control_id=bot_manage_channel.id,
-                           channel_entry_id=entry_channel.id,
-                           channel_status_id=status_channel.id,
-                           channel_query_id=query_channel.id,
-                           role_bot_admin_id=bot_admin_role.id,
-                           role_pre_exhibitor_id=pre_exhibitor_role.id,
-                           role_exhibitor_id=exhibitor_role.id,
-                           role_manager_id=manager_role.id)
-
-    await message.channel.send(
+    provisioner = Provisioner(concurrency=config.getConfig().rest.provisionConcurrency, logger=logger)
+    try:
+        # ロールとBOTのニックネーム → カテゴリ → チャンネルの順に、それぞれの段階の中では並行に作成する
+        previous_nick: Optional[str] = guild.me.nick
+        # ニックネームは削除では戻せないので、同じ段階のロールの作成に失敗しても戻るよう、段階の前に登録する
+        provisioner.addUndo("nickname", lambda: guild.me.edit(nick=previous_nick))
+        roles = await provisioner.stage("roles", {
+            "nickname": lambda: guild.me.edit(nick="VEMT"),
+            "bot_admin": lambda: guild.create_role(name=config.getConfig().roleName.botAdmin,
+                                                   hoist=True, mentionable=True,
+                                                   colour=discord.Color(0x3498db)),
+            "manager": lambda: guild.create_role(name=config.getConfig().roleName.manager,
+                                                 hoist=True, mentionable=True,
+                                                 colour=discord.Color(0xe74c3c)),
+            "exhibitor": lambda: guild.create_role(name=config.getConfig().roleName.exhibitor,
+                                                   hoist=True, mentionable=True,
+                                                   colour=discord.Color(0x2ecc71)),
+            "pre_exhibitor": lambda: guild.create_role(name=config.getConfig().roleName.preExhibitor,
+                                                       hoist=True, mentionable=True,
+                                                       colour=discord.Color(0x208c4e))
+        })
+        bot_admin_role: discord.Role = roles["bot_admin"]
+        manager_role: discord.Role = roles["manager"]
+        exhibitor_role: discord.Role = roles["exhibitor"]
+        pre_exhibitor_role: discord.Role = roles["pre_exhibitor"]
+
+        categories = await provisioner.stage("categories", {
+            "bot_category": lambda: guild.create_category_channel(config.getConfig().categoryName.bot),
+            "contact_category": lambda: guild.create_category_channel(
+                name=config.getConfig().categoryName.contact,
+                overwrites={guild.default_role: discord.PermissionOverwrite(read_messages=False)})
+        })
+        bot_category: discord.CategoryChannel = categories["bot_category"]
+        contact_category: discord.CategoryChannel = categories["contact_category"]
+
+        channels = await provisioner.stage("channels", {
+            # BOTの管理用チャンネル
+            "bot_control": lambda: guild.create_text_channel(
+                name=config.getConfig().channelName.botControl,
+                category=bot_category,
+                topic="BOTの設定変更など、BOT管理を行うチャンネルです。`+config --help`でヘルプを表示します。",
+                overwrites={
+                    guild.default_role: discord.PermissionOverwrite(read_messages=False),
+                    bot_admin_role: discord.PermissionOverwrite(read_messages=True)
+                }
+            ),
+            # 出展応募用チャンネル
+            "entry": lambda: guild.create_text_channel(
+                name=config.getConfig().channelName.entry,
+                category=bot_category,
+                topic="仮エントリーを申し込むためのチャンネルです。エントリー受付期間中、`+entry`で仮エントリーが可能です。",
+                overwrites={
+                    guild.default_role: discord.PermissionOverwrite(send_messages=False)
+                }
+            ),
+            # 情報問い合わせ用チャンネル
+            "query": lambda: guild.create_text_channel(
+                name=config.getConfig().channelName.query,
+                category=bot_category,
+                topic="様々な情報を取得することができます。運営専用チャンネルです。`+query --help`でヘルプを表示します。",
+                overwrites={
+                    guild.default_role: discord.PermissionOverwrite(read_messages=False),
+                    manager_role: discord.PermissionOverwrite(read_messages=True)
+                }
+            ),
+            # ステータス確認用のチャンネル
+            "status": lambda: guild.create_text_channel(
+                name=config.getConfig().channelName.status,
+                category=bot_category,
+                topic="サーバーに関するステータス確認用のチャンネルです。",
+                overwrites={
+                    guild.default_role: discord.PermissionOverwrite(read_messages=True, send_messages=False)
+                }
+            )
+        })
+        bot_manage_channel: discord.TextChannel = channels["bot_control"]
+        entry_channel: discord.TextChannel = channels["entry"]
+        query_channel: discord.TextChannel = channels["query"]
+        status_channel: discord.TextChannel = channels["status"]
+
+        # DBを作成
+        try:
+            await schema.setupGuildAsync(guild.id)
+        except sqlite3.Error as e:
+            logger.error("Failed to create database. {}: {}".format(type(e), e))
+            raise exception.VemtCommandError("データベースの作成に失敗しました")
+        registry.invalidateCache(guild.id)
+
+        # サーバー固有のIDを記録する
+        # Database
+        await registry.setupGuildIdsAsync(guild_id=guild.id,
+                                          category_bot_id=bot_category.id,
+                                          category_contact_id=contact_category.id,
+                                          channel_bot_control_id=bot_manage_channel.id,
+                                          channel_entry_id=entry_channel.id,
+                                          channel_status_id=status_channel.id,
+                                          channel_query_id=query_channel.id,
+                                          role_bot_admin_id=bot_admin_role.id,
+                                          role_pre_exhibitor_id=pre_exhibitor_role.id,
+                                          role_exhibitor_id=exhibitor_role.id,
+                                          role_manager_id=manager_role.id)
+
+    except (ProvisioningError, discord.HTTPException, sqlite3.Error, exception.VemtCommandError) as e:
+        # 作成途中のロールとチャンネルを削除して、初期化前の状態に戻す
+        logger.error("Failed to initialize guild. Rolling back. {}: {}".format(type(e), e))
+        failed = await provisioner.rollback()
+        if failed:
+            raise exception.VemtCommandError(
+                "サーバーの初期化に失敗しました。次のリソースの削除にも失敗したため、手動で削除してください: "
+                + ", ".join(failed))
+        raise exception.VemtCommandError("サーバーの初期化に失敗しました。作成したロールとチャンネルは削除しました")
+
+    # 作成したロールとチャンネルをクライアントのスナップショットに反映する
+    await client.refreshSnapshot(guild)
+
+    logger.info("- Provisioning timings: %s",
+                ", ".join("{}={:.1f}ms".format(name, sec * 1000) for name, sec in provisioner.timings))
+
+    await client.outbox.send(
+        message.channel,
         "**成功** サーバーの初期化が完了しました\n" +
         "BOTコマンドについては、`+help`コマンドから参照することができます。（ただし<@&{}>か<@&{}>のみが発行可能です）\n".format(
             bot_admin_role.id, manager_role.id) +
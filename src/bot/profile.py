@@ -0,0 +1,45 @@
+import asyncio
+import discord
+import argparse
+
+import exception
+
+
+def setup(subparser: argparse._SubParsersAction, dev: bool = False):
+    if dev:
+        parser = subparser.add_parser("+profile",
+                                      help="【BOT開発専用】コマンドの処理時間の記録を開始・終了します",
+                                      description="コマンドとギルドごとにcProfileで記録し、イベントループのスタックを"
+                                      "サンプリングします。stopで記録をファイルに書き出します。")
+        parser.add_argument("action", choices=["start", "stop"], help="記録の開始・終了")
+        parser.add_argument("--interval", type=float, default=5.0, help="スタックをサンプリングする間隔（ミリ秒）")
+        return parser
+    return None
+
+
+async def authenticate(args, client: discord.Client, message: discord.Message):
+    if not message.guild:
+        raise exception.InvalidChannelError("+profileコマンドはサーバでのみ発行可能です")
+
+    if message.guild.owner.id != message.author.id:
+        raise exception.PermissionDeniedError("+profileコマンドはサーバーのオーナーのみが発行可能です")
+
+
+async def run(args, client, message: discord.Message):
+    if args.action == "start":
+        if client.profiler.running:
+            raise exception.VemtCommandError("既に記録中です")
+        if args.interval <= 0:
+            raise exception.ArgError("--intervalには正の値を指定してください")
+        client.profiler.start(sample_interval=args.interval / 1000)
+        await client.outbox.send(message.channel, "記録を開始しました。`+profile stop`で終了します")
+        return
+
+    if not client.profiler.running:
+        raise exception.VemtCommandError("記録していません")
+    snapshot = client.profiler.stop()
+    files = await asyncio.get_event_loop().run_in_executor(None, snapshot.write)
+    lines = ["{:<12} {:>20} {:>6} {:>10.3f}s".format(*s) for s in snapshot.summary()[:20]]
+    # 表が崩れないようにコードブロックで送る. 他のメッセージとまとめない
+    await client.outbox.send(message.channel, "{}件のファイルを`{}`に書き出しました\n```\n{}\n```".format(
+        len(files), snapshot.directory, "\n".join(lines) or "(no commands)")[:1990], coalesce=False)
@@ -1,11 +1,18 @@
 import discord
 import argparse
+import logging
+import sqlite3
 
-from typing import List
+from typing import List, Set
 
 import config
 import exception
-from db.api import entries
+from classes import CommandScheduler, BulkDeleter
+from db import schema
+from db.api import entries, registry
+
+# ギルドの構成を変更するため、同じギルドの他のコマンドと並行に実行しない
+COMMAND_SCOPE = CommandScheduler.SCOPE_GUILD
 
 
 def setup(subparser: argparse._SubParsersAction, dev: bool = True):
@@ -22,51 +29,86 @@ async def authenticate(args, client: discord.Client, message: discord.Message):
 
 
 async def run(args, client, message: discord.Message):
-    await message.channel.send('Discordサーバーをもとに戻しています')
+    logger: logging.Logger = logging.getLogger("ResetProcess")
+    # 進捗を編集して表示するため、他のメッセージとまとめずに送る
+    progress_message: discord.Message = await client.outbox.send(
+        message.channel, 'Discordサーバーをもとに戻しています', coalesce=False)
 
     if not message.guild:
         raise exception.VemtCommandError("ギルドの取得に失敗しました", detail=f"message.guild={str(message.guild)}")
 
     guild: discord.Guild = message.guild
 
+    # 受付中のエントリーの処理が終わってから削除する
+    await client.admission.join(guild.id)
+
     # 作成済みのチャンネルを削除
     # あえて名前一致で削除する
     current_channels: List[discord.TextChannel] = guild.channels
-    def_channels: List[str] = [
+    def_channels: Set[str] = {
         config.getConfig().categoryName.bot,
         config.getConfig().categoryName.contact,
         config.getConfig().channelName.botControl,
         config.getConfig().channelName.entry,
         config.getConfig().channelName.status,
         config.getConfig().channelName.query
-    ]
-
-    for ch in current_channels:
-        for dc in def_channels:
-            if ch.name == dc:
-                await ch.delete()
+    }
 
     # コンタクトチャンネル
-    entries_list = entries.getAll(guild.id)
-    for ch in current_channels:
-        for entry in entries_list:
-            if ch.id == entry.contactChannelId:
-                await ch.delete()
+    try:
+        contact_channel_ids: Set[int] = {
+            entry.contactChannelId
+            for entry in await entries.getByChannelIdsAsync(guild.id, [ch.id for ch in current_channels])}
+    except sqlite3.OperationalError:
+        # DBが存在しない
+        contact_channel_ids = set()
 
     # 作成済みのロールを削除
     current_roles: List[discord.Role] = guild.roles
-    def_roles: List[str] = [
+    def_roles: Set[str] = {
         config.getConfig().roleName.botAdmin,
         config.getConfig().roleName.preExhibitor,
         config.getConfig().roleName.exhibitor,
         config.getConfig().roleName.manager
-    ]
+    }
 
+    async def progress(done: int, total: int):
+        await progress_message.edit(content="Discordサーバーをもとに戻しています ({} / {})".format(done, total))
+
+    deleter = BulkDeleter(concurrency=config.getConfig().rest.teardownConcurrency, progress=progress, logger=logger)
+    for ch in current_channels:
+        if ch.name in def_channels or ch.id in contact_channel_ids:
+            deleter.addChannel(ch)
     for rl in current_roles:
-        for drl in def_roles:
-            if rl.name == drl:
-                await rl.delete()
+        if rl.name in def_roles:
+            deleter.addRole(rl)
+    deleted, failed = await deleter.run()
+
+    # 削除できたコンタクトチャンネルのエントリーをDBから削除する
+    deleted_contact_ids = [target.id for target in deleted if target.id in contact_channel_ids]
+    if deleted_contact_ids:
+        count = await entries.deleteByChannelIdsAsync(guild.id, deleted_contact_ids)
+        logger.info("- Deleted %d entries of deleted contact channels.", count)
+
+    if failed:
+        raise exception.VemtCommandError(
+            "{}個のチャンネル・ロールを削除できませんでした。もう一度実行してください".format(len(failed)))
+
+    # 全て削除できたら、サーバーを初期化前の状態に戻す
+    if await _isServerInitialized(guild.id):
+        await schema.setupGuildAsync(guild.id)
+        registry.invalidateCache(guild.id)
+        logger.info("- Cleared database of guild %d.", guild.id)
+    client.dropSnapshot(guild.id)
 
     # ニックネーム戻す
     await guild.me.edit(nick=None)
-    await message.channel.send("**成功** サーバーをもとに戻しました\n")
+    await client.outbox.send(message.channel, "**成功** サーバーをもとに戻しました\n")
+
+
+async def _isServerInitialized(guild_id: int) -> bool:
+    try:
+        return await registry.isServerInitializedAsync(guild_id)
+    except sqlite3.OperationalError:
+        # DBが存在しない
+        return False
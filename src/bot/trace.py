@@ -0,0 +1,33 @@
+import discord
+import argparse
+
+import exception
+from easy_logging import dumpTraceStats, resetTraceStats, TRACE_SORT_KEYS
+
+
+def setup(subparser: argparse._SubParsersAction, dev: bool = False):
+    if dev:
+        parser = subparser.add_parser("+trace",
+                                      help="【BOT開発専用】関数ごとの呼び出し回数と所要時間を表示します",
+                                      description="easy_loggingでトレースしている関数の、呼び出し回数と所要時間を表示します。")
+        parser.add_argument("--sort", choices=TRACE_SORT_KEYS, default="total", help="並べ替えるキー")
+        parser.add_argument("--limit", type=int, default=20, help="表示する関数の最大数")
+        parser.add_argument("--reset", action="store_true", help="表示した後に0に戻します")
+        return parser
+    return None
+
+
+async def authenticate(args, client: discord.Client, message: discord.Message):
+    if not message.guild:
+        raise exception.InvalidChannelError("+traceコマンドはサーバでのみ発行可能です")
+
+    if message.guild.owner.id != message.author.id:
+        raise exception.PermissionDeniedError("+traceコマンドはサーバーのオーナーのみが発行可能です")
+
+
+async def run(args, client, message: discord.Message):
+    table = dumpTraceStats(sort_by=args.sort, limit=args.limit)
+    if args.reset:
+        resetTraceStats()
+    # 表が崩れないようにコードブロックで送る. 他のメッセージとまとめない
+    await client.outbox.send(message.channel, "```\n{}\n```".format(table[:1900]), coalesce=False)
@@ -34,4 +34,5 @@ def loadBotProcessors() -> list:
 def reloadBotProcessor(module):
     logger: logging.Logger = logging.getLogger("botLoader")
     importlib.reload(module)
+    VemtClient.invalidateHelp(module)
     logger.info(f"!!DEVELOPMENT MODE!! module '{module.__name__}' is reloaded.")
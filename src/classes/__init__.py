@@ -1 +1,10 @@
 from .vemt_argparse import VemtArgumentParser
+from .command_router import CommandRouter, CommandRoute
+from .command_scheduler import CommandScheduler
+from .provisioner import Provisioner, ProvisioningError
+from .bulk_deleter import BulkDeleter
+from .outbox import Outbox
+from .guild_snapshot import GuildSnapshot
+from .entry_admission import EntryAdmission
+from .command_profiler import CommandProfiler
+from .loop_watchdog import LoopWatchdog
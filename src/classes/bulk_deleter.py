@@ -0,0 +1,117 @@
+import asyncio
+import logging
+import time
+
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+import discord
+
+
+class BulkDeleter:
+    """ Discordのリソース（チャンネル、ロールなど）をまとめて並行に削除する
+
+    全体の同時実行数に加えて、DiscordのREST APIのレート制限の単位（バケット）ごとにも同時実行数を制限する。
+    チャンネルの削除はチャンネルごと、ロールの削除はギルドごとに同じバケットになる。
+    """
+
+    def __init__(self,
+                 concurrency: int = 8,
+                 bucket_concurrency: int = 1,
+                 progress: Optional[Callable[[int, int], Awaitable]] = None,
+                 progress_interval: float = 2.0,
+                 logger: Optional[logging.Logger] = None):
+        """ BulkDeleterを初期化する
+
+        Args:
+            concurrency (int): 全体で同時に実行する削除の最大数
+            bucket_concurrency (int): 同じバケットで同時に実行する削除の最大数
+            progress (Optional[Callable[[int, int], Awaitable]]): 進捗を通知する関数. progress(完了数, 全体数)
+            progress_interval (float): 進捗を通知する最短の間隔（秒）. 最後の1回は必ず通知する
+            logger (Optional[logging.Logger]): ロガー
+        """
+        assert concurrency > 0 and bucket_concurrency > 0
+        self.__concurrency: int = concurrency
+        self.__bucket_concurrency: int = bucket_concurrency
+        self.__progress: Optional[Callable[[int, int], Awaitable]] = progress
+        self.__progress_interval: float = progress_interval
+        self.__logger: logging.Logger = logger if logger is not None else logging.getLogger("BulkDeleter")
+        self.__targets: List[Tuple[str, Any, Hashable]] = []
+
+    @staticmethod
+    def channelBucket(channel: discord.abc.GuildChannel) -> Hashable:
+        """ チャンネルの削除のバケット. DELETE /channels/{channel_id}
+        """
+        return ("channel", channel.id)
+
+    @staticmethod
+    def roleBucket(role: discord.Role) -> Hashable:
+        """ ロールの削除のバケット. DELETE /guilds/{guild_id}/roles/{role_id}
+        """
+        return ("role", role.guild.id)
+
+    def __len__(self) -> int:
+        return len(self.__targets)
+
+    def add(self, name: str, target: Any, bucket: Hashable):
+        """ 削除するリソースを追加する
+
+        Args:
+            name (str): ログに出力するリソース名
+            target (Any): delete()を持つリソース
+            bucket (Hashable): レート制限のバケット. channelBucket()、roleBucket()を使う
+        """
+        self.__targets.append((name, target, bucket))
+
+    def addChannel(self, channel: discord.abc.GuildChannel):
+        self.add("channel '{}' ({})".format(channel.name, channel.id), channel, BulkDeleter.channelBucket(channel))
+
+    def addRole(self, role: discord.Role):
+        self.add("role '{}' ({})".format(role.name, role.id), role, BulkDeleter.roleBucket(role))
+
+    async def run(self) -> Tuple[List[Any], List[Any]]:
+        """ 追加したリソースを全て削除する. 既に削除されていたものは削除できたものとして扱う
+
+        Returns:
+            Tuple[List[Any], List[Any]]: 削除できたリソースと、削除に失敗したリソース
+        """
+        targets, self.__targets = self.__targets, []
+        semaphore = asyncio.Semaphore(self.__concurrency)
+        bucket_semaphores: Dict[Hashable, asyncio.Semaphore] = {}
+        deleted: List[Any] = []
+        failed: List[Any] = []
+        last_notified = [time.perf_counter()]
+        begin = time.perf_counter()
+
+        async def notify(force: bool = False):
+            if self.__progress is None:
+                return
+            now = time.perf_counter()
+            if force or now - last_notified[0] >= self.__progress_interval:
+                last_notified[0] = now
+                try:
+                    await self.__progress(len(deleted) + len(failed), len(targets))
+                except discord.HTTPException as e:
+                    self.__logger.warning("Failed to notify progress. %s: %s", type(e), e)
+
+        async def delete(name: str, target: Any, bucket: Hashable):
+            bucket_semaphore = bucket_semaphores.get(bucket)
+            if bucket_semaphore is None:
+                bucket_semaphore = bucket_semaphores[bucket] = asyncio.Semaphore(self.__bucket_concurrency)
+            async with bucket_semaphore, semaphore:
+                try:
+                    await target.delete()
+                    deleted.append(target)
+                    self.__logger.debug("-- Deleted %s", name)
+                except discord.NotFound:
+                    deleted.append(target)
+                    self.__logger.debug("-- Already deleted %s", name)
+                except discord.HTTPException as e:
+                    failed.append(target)
+                    self.__logger.error("Failed to delete %s. %s: %s", name, type(e), e)
+            await notify()
+
+        await asyncio.gather(*[delete(name, target, bucket) for name, target, bucket in targets])
+        await notify(force=True)
+        self.__logger.info("- Deleted %d / %d items in %.1f ms (%d failed)",
+                           len(deleted), len(targets), (time.perf_counter() - begin) * 1000, len(failed))
+        return deleted, failed
@@ -0,0 +1,207 @@
+import cProfile
+import collections
+import datetime
+import logging
+import marshal
+import os
+import sys
+import threading
+
+from typing import Any, Coroutine, Counter, Dict, List, Optional, Tuple
+
+
+# (コマンド, ギルド)
+_Key = Tuple[str, str]
+
+# コマンドを実行していない間のサンプルのキー
+_LOOP_KEY: _Key = ("loop", "-")
+
+
+class _ProfiledCoroutine:
+    """ コルーチンを1ステップ進める間だけcProfileを有効にするawaitable
+
+    イベントループでは複数のコマンドが交互に進むため、コルーチン全体をenable()/disable()で囲むと
+    他のコマンドの処理も混ざる。send()/throw()の間だけ有効にして、このコマンドの処理だけを記録する。
+    """
+
+    def __init__(self, coro: Coroutine, profile: cProfile.Profile, key: _Key, profiler: "CommandProfiler"):
+        self.__coro: Coroutine = coro
+        self.__profile: cProfile.Profile = profile
+        self.__key: _Key = key
+        self.__profiler: CommandProfiler = profiler
+
+    def __await__(self):
+        value: Any = None
+        error: Optional[BaseException] = None
+        while True:
+            self.__profiler.current = self.__key
+            self.__profile.enable()
+            try:
+                if error is not None:
+                    yielded = self.__coro.throw(error)
+                else:
+                    yielded = self.__coro.send(value)
+            except StopIteration as e:
+                return e.value
+            finally:
+                self.__profile.disable()
+                self.__profiler.current = None
+            try:
+                value, error = (yield yielded), None
+            except BaseException as e:
+                value, error = None, e
+
+
+class ProfileSnapshot:
+    """ CommandProfiler.stop()の時点の記録
+    """
+
+    def __init__(self, directory: str, stats: Dict[_Key, dict], invocations: Dict[_Key, int],
+                 samples: Dict[_Key, Counter[str]]):
+        self.directory: str = directory
+        self.__stats: Dict[_Key, dict] = stats
+        self.__invocations: Dict[_Key, int] = invocations
+        self.__samples: Dict[_Key, Counter[str]] = samples
+
+    def summary(self) -> List[Tuple[str, str, int, float]]:
+        """ (コマンド, ギルド, 実行回数, 関数の処理時間の合計)の一覧. 処理時間の降順
+        """
+        ret = [key + (self.__invocations.get(key, 0), sum(v[2] for v in stats.values()))
+               for key, stats in self.__stats.items()]
+        ret.sort(key=lambda s: s[3], reverse=True)
+        return ret
+
+    def write(self) -> List[str]:
+        """ コマンドとギルドの組ごとに、pstatsファイル（{コマンド}.{ギルド}.pstats）と
+        collapsed stack形式のファイル（{コマンド}.{ギルド}.collapsed）を書き出す
+
+        Returns:
+            List[str]: 書き出したファイルパス
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        ret: List[str] = []
+        for key, stats in self.__stats.items():
+            path = os.path.join(self.directory, "{}.{}.pstats".format(*key))
+            # pstats.Stats(path)で読める形式. cProfile.Profile.dump_stats()と同じ
+            with open(path, mode="wb") as f:
+                marshal.dump(stats, f)
+            ret.append(path)
+        for key, samples in self.__samples.items():
+            path = os.path.join(self.directory, "{}.{}.collapsed".format(*key))
+            with open(path, mode="w", encoding="utf-8") as f:
+                for stack, count in sorted(samples.items()):
+                    f.write("{} {}\n".format(stack, count))
+            ret.append(path)
+        return ret
+
+
+class CommandProfiler:
+    """ コマンドごとのcProfileと、イベントループのスタックのサンプリング
+
+    start()からstop()までの間、bot moduleのrun()をコマンドとギルドの組ごとに1つのcProfile.Profileで記録し、
+    別スレッドでイベントループのスレッドのスタックを一定間隔でサンプリングする。
+    stop()の結果から、組ごとのpstatsファイルと、flamegraph.pl / speedscopeで読めるcollapsed stack形式のファイルを書き出す。
+    """
+
+    def __init__(self, output_dir: str = "profiles", sample_interval: float = 0.005):
+        """ CommandProfilerを初期化する
+
+        Args:
+            output_dir (str): 書き出すディレクトリ. 記録ごとに日時のサブディレクトリを作る
+            sample_interval (float): スタックをサンプリングする間隔（秒）
+        """
+        assert sample_interval > 0
+        self.__output_dir: str = output_dir
+        self.__sample_interval: float = sample_interval
+        self.__logger: logging.Logger = logging.getLogger("CommandProfiler")
+        self.__profiles: Dict[_Key, cProfile.Profile] = {}
+        self.__invocations: Counter[_Key] = collections.Counter()
+        self.__samples: Dict[_Key, Counter[str]] = collections.defaultdict(collections.Counter)
+        self.__sampler: Optional[threading.Thread] = None
+        self.__stop: threading.Event = threading.Event()
+        self.__loop_thread_id: Optional[int] = None
+        self.__started_at: Optional[datetime.datetime] = None
+        # 実行中のコマンド. サンプリングのスレッドから参照する
+        self.current: Optional[_Key] = None
+
+    @property
+    def running(self) -> bool:
+        return self.__started_at is not None
+
+    @property
+    def startedAt(self) -> Optional[datetime.datetime]:
+        return self.__started_at
+
+    def start(self, sample_interval: Optional[float] = None):
+        """ 記録を開始する. イベントループのスレッドから呼ぶ
+        """
+        if self.running:
+            raise RuntimeError("Profiler is already running.")
+        if sample_interval is not None:
+            assert sample_interval > 0
+            self.__sample_interval = sample_interval
+        self.__loop_thread_id = threading.get_ident()
+        self.__started_at = datetime.datetime.now()
+        self.__stop.clear()
+        self.__sampler = threading.Thread(target=self.__sample, name="CommandProfiler", daemon=True)
+        self.__sampler.start()
+        self.__logger.info("Profiling started. (sample interval %.1f ms)", self.__sample_interval * 1000)
+
+    def stop(self) -> "ProfileSnapshot":
+        """ 記録を終了する. イベントループのスレッドから呼ぶ
+
+        実行中のコマンドが後から記録を更新しないように、この時点の結果を複製して返す。
+        ファイルへの書き出しは、返したProfileSnapshot.write()をexecutorで呼ぶ。
+        """
+        if not self.running:
+            raise RuntimeError("Profiler is not running.")
+        self.__stop.set()
+        assert self.__sampler is not None
+        self.__sampler.join()
+        self.__sampler = None
+
+        stats: Dict[_Key, dict] = {}
+        for key, profile in self.__profiles.items():
+            profile.create_stats()
+            stats[key] = profile.stats
+        snapshot = ProfileSnapshot(os.path.join(self.__output_dir, self.__started_at.strftime("%Y%m%d-%H%M%S")),
+                                   stats, dict(self.__invocations), dict(self.__samples))
+        self.__profiles = {}
+        self.__invocations = collections.Counter()
+        self.__samples = collections.defaultdict(collections.Counter)
+        self.__started_at = None
+        self.__logger.info("Profiling stopped. %d commands profiled.", len(stats))
+        return snapshot
+
+    def profile(self, coro: Coroutine, command: str, guild_id: Optional[int]):
+        """ コルーチンを記録するawaitableを返す. 記録していない場合はコルーチンをそのまま返す
+
+        Args:
+            coro (Coroutine): bot moduleのrun()
+            command (str): コマンド名. bot moduleの名前
+            guild_id (Optional[int]): ギルドのID. DMの場合はNone
+        """
+        if not self.running:
+            return coro
+        key: _Key = (command, str(guild_id) if guild_id is not None else "dm")
+        profile = self.__profiles.get(key)
+        if profile is None:
+            profile = self.__profiles[key] = cProfile.Profile()
+        self.__invocations[key] += 1
+        return _ProfiledCoroutine(coro, profile, key, self)
+
+    def __sample(self):
+        own_file = __file__
+        while not self.__stop.wait(self.__sample_interval):
+            frame = sys._current_frames().get(self.__loop_thread_id)
+            key = self.current or _LOOP_KEY
+            stack: List[str] = []
+            while frame is not None:
+                code = frame.f_code
+                # 計測のためのフレームは除く
+                if code.co_filename != own_file:
+                    stack.append("{} ({}:{})".format(code.co_name, os.path.basename(code.co_filename),
+                                                     code.co_firstlineno))
+                frame = frame.f_back
+            if stack:
+                self.__samples[key][";".join(reversed(stack))] += 1
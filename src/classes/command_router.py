@@ -0,0 +1,162 @@
+import argparse
+import shlex
+
+from typing import Dict, List, Optional, Tuple, Any
+
+import exception
+from .vemt_argparse import VemtArgumentParser, localize
+
+
+class CommandRoute:
+    """ 1つのコマンド（"+entry"など）と、その解析に使うパーサーの組
+    """
+
+    def __init__(self, name: str, parser: argparse.ArgumentParser, handler: Any):
+        self.__name: str = name
+        self.__parser: argparse.ArgumentParser = parser
+        self.__handler: Any = handler
+        self.__help: Optional[str] = _localizedHelp(parser)
+
+    @property
+    def name(self) -> str:
+        return self.__name
+
+    @property
+    def parser(self) -> argparse.ArgumentParser:
+        return self.__parser
+
+    @property
+    def handler(self) -> Any:
+        return self.__handler
+
+    @property
+    def help(self) -> str:
+        """ 日本語化済みのコマンドのヘルプ. 登録時に組み立て、破棄された場合は次に使うときに組み立てなおす
+        """
+        if self.__help is None:
+            self.__help = _localizedHelp(self.__parser)
+        return self.__help
+
+    def invalidateHelp(self):
+        """ キャッシュしたヘルプを破棄する
+        """
+        self.__help = None
+
+    def parse(self, argv: List[str]) -> argparse.Namespace:
+        """ コマンド名を除いた引数を、このコマンドのパーサーだけで解析する
+
+        Exceptions:
+            exception.ShowHelp: -h / --help が指定された場合. キャッシュ済みのヘルプを持つ
+            exception.ArgError: 引数が不正な場合
+        """
+        if self.__parser.add_help:
+            for token in argv:
+                if token == "--":
+                    break
+                if token in ("-h", "--help"):
+                    raise exception.ShowHelp(self.help)
+        return self.__parser.parse_args(argv)
+
+
+class CommandRouter:
+    """ メッセージの先頭のトークンから、コマンドを辞書引きで決定するルーター
+
+    全てのサブコマンドを1つのargparseで解析する代わりに、コマンドが決まってからそのパーサーだけで引数を解析する。
+    """
+
+    def __init__(self, parser: VemtArgumentParser):
+        """ ルーターを初期化する
+
+        Args:
+            parser (VemtArgumentParser): 全体のヘルプの表示に使う、サブコマンドを登録するパーサー
+        """
+        self.__parser: VemtArgumentParser = parser
+        self.__routes: Dict[str, CommandRoute] = {}
+        self.__help: Optional[str] = None
+        self.__choices: Optional[str] = None
+
+    def add(self, name: str, parser: argparse.ArgumentParser, handler: Any) -> CommandRoute:
+        """ コマンドを登録する. 同じ名前のコマンドは置き換える
+
+        Args:
+            name (str): コマンド名. "+entry"など
+            parser (argparse.ArgumentParser): コマンドの引数を解析するパーサー
+            handler (Any): コマンドを処理するBOTモジュール
+        """
+        route = CommandRoute(name, parser, handler)
+        self.__routes[name] = route
+        self.__help = None
+        self.__choices = None
+        return route
+
+    def invalidateHelp(self, handler: Any = None):
+        """ キャッシュしたヘルプを破棄する
+
+        Args:
+            handler (Any): このBOTモジュールのコマンドのヘルプだけを破棄する. Noneの場合は全て破棄する
+        """
+        for route in self.__routes.values():
+            if handler is None or route.handler is handler:
+                route.invalidateHelp()
+        self.__help = None
+
+    def get(self, name: str) -> Optional[CommandRoute]:
+        return self.__routes.get(name)
+
+    @property
+    def names(self) -> List[str]:
+        return list(self.__routes.keys())
+
+    @property
+    def help(self) -> str:
+        """ 全体のヘルプ. 初回に組み立ててキャッシュし、コマンドの登録で破棄する
+        """
+        if self.__help is None:
+            self.__help = _localizedHelp(self.__parser)
+        return self.__help
+
+    @staticmethod
+    def tokenize(content: str) -> List[str]:
+        """ メッセージをトークンに分割する
+
+        引用符やエスケープを含まない場合は、shlexを使わずに空白で分割する。
+
+        Exceptions:
+            exception.ArgError: 引用符が閉じられていない場合
+        """
+        if '"' not in content and "'" not in content and "\\" not in content:
+            return content.split()
+        try:
+            return shlex.split(content)
+        except ValueError as e:
+            raise exception.ArgError(str(e))
+
+    def resolve(self, content: str) -> Tuple[CommandRoute, List[str]]:
+        """ メッセージからコマンドを決定する
+
+        Args:
+            content (str): メッセージ
+
+        Exceptions:
+            exception.ArgError: 該当するコマンドが無い場合
+
+        Returns:
+            Tuple[CommandRoute, List[str]]: コマンドと、コマンド名を除いた引数
+        """
+        tokens = self.tokenize(content)
+        name = tokens[0] if tokens else ""
+        route = self.__routes.get(name)
+        if route is None:
+            if self.__choices is None:
+                self.__choices = ", ".join("'{}'".format(n) for n in self.__routes.keys())
+            raise exception.ArgError("invalid choice: '{}' (choose from {})".format(name, self.__choices))
+        return route, tokens[1:]
+
+
+def _localizedHelp(parser: argparse.ArgumentParser) -> str:
+    """ Internal Use.
+    パーサーのヘルプを、VemtArgumentParserが表示するときと同じように日本語化して取得する
+    """
+    if isinstance(parser, VemtArgumentParser):
+        return parser.formatLocalizedHelp()
+    return localize(parser.format_help())
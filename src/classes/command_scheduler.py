@@ -0,0 +1,229 @@
+import asyncio
+import collections
+import logging
+
+from typing import Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+import exception
+
+
+class _GuildGate:
+    """ ギルド単位の共有/排他ロック
+
+    ユーザー単位のコマンドは共有、ギルド単位のコマンドは排他で取得する。
+    排他の待ちがある間は新しい共有を待たせ、管理コマンドが待たされ続けないようにする。
+    """
+
+    def __init__(self):
+        self.__condition: asyncio.Condition = asyncio.Condition()
+        self.__shared: int = 0
+        self.__exclusive: bool = False
+        self.__waiting_exclusive: int = 0
+        self.__waiting: int = 0
+        self.lanes: int = 0
+
+    async def acquire(self, exclusive: bool):
+        # 待たずに取得できる場合は、Conditionを使わない
+        if exclusive and not self.__exclusive and self.__shared == 0:
+            self.__exclusive = True
+            return
+        if not exclusive and not self.__exclusive and self.__waiting_exclusive == 0:
+            self.__shared += 1
+            return
+
+        async with self.__condition:
+            self.__waiting += 1
+            try:
+                if exclusive:
+                    self.__waiting_exclusive += 1
+                    try:
+                        await self.__condition.wait_for(lambda: not self.__exclusive and self.__shared == 0)
+                    finally:
+                        self.__waiting_exclusive -= 1
+                    self.__exclusive = True
+                else:
+                    await self.__condition.wait_for(lambda: not self.__exclusive and self.__waiting_exclusive == 0)
+                    self.__shared += 1
+            finally:
+                self.__waiting -= 1
+
+    async def release(self, exclusive: bool):
+        if exclusive:
+            self.__exclusive = False
+        else:
+            self.__shared -= 1
+        if self.__waiting > 0:
+            async with self.__condition:
+                self.__condition.notify_all()
+
+
+class _Lane:
+    """ 同じキーのコマンドを順番に実行する待ち行列
+    """
+
+    def __init__(self, guild_id: Optional[int], exclusive: bool):
+        self.guild_id: Optional[int] = guild_id
+        self.exclusive: bool = exclusive
+        self.jobs: Deque[Callable[[], Awaitable]] = collections.deque()
+        # 待ち行列を処理するタスク. 待ち行列が空になるまでlanesに残るので、ここで参照を持つ
+        self.worker: Optional[asyncio.Future] = None
+
+
+class CommandScheduler:
+    """ コマンドをギルドをまたいで並行に、同じユーザー（管理コマンドは同じギルド）の中では順番に実行するスケジューラー
+
+    待ち行列には上限があり、溢れたコマンドはCommandBusyErrorで受付を断る。
+    """
+
+    # 同じギルドの同じユーザーのコマンドと直列に実行する
+    SCOPE_USER: str = "user"
+    # 同じギルドの全てのコマンドと直列に実行する. ギルドの構成を変更する管理コマンド用
+    SCOPE_GUILD: str = "guild"
+
+    def __init__(self, max_pending_per_lane: int = 4, max_pending: int = 1024, max_concurrent: int = 32):
+        """ スケジューラーを初期化する
+
+        Args:
+            max_pending_per_lane (int): 1つの待ち行列で、実行中を除いて待たせるコマンドの最大数
+            max_pending (int): 全体で、実行中を除いて待たせるコマンドの最大数
+            max_concurrent (int): 同時に実行するコマンドの最大数
+        """
+        assert max_pending_per_lane > 0 and max_pending > 0 and max_concurrent > 0
+        self.__max_pending_per_lane: int = max_pending_per_lane
+        self.__max_pending: int = max_pending
+        self.__max_concurrent: int = max_concurrent
+        self.__semaphore: Optional[asyncio.Semaphore] = None
+        self.__lanes: Dict[Tuple[Optional[int], Optional[int]], _Lane] = {}
+        self.__gates: Dict[Optional[int], _GuildGate] = {}
+        self.__pending: int = 0
+        self.__running: int = 0
+        self.__rejected: int = 0
+        self.__idle: Optional[asyncio.Event] = None
+
+    @property
+    def pending(self) -> int:
+        """ 実行を待っているコマンドの数
+        """
+        return self.__pending
+
+    @property
+    def running(self) -> int:
+        """ 実行中のコマンドの数
+        """
+        return self.__running
+
+    @property
+    def rejected(self) -> int:
+        """ 待ち行列が溢れて受付を断ったコマンドの数
+        """
+        return self.__rejected
+
+    @property
+    def lanes(self) -> int:
+        """ 処理中の待ち行列の数
+        """
+        return len(self.__lanes)
+
+    def submit(self,
+               guild_id: Optional[int],
+               user_id: int,
+               scope: str,
+               job: Callable[[], Awaitable]):
+        """ コマンドを待ち行列に追加する. 完了は待たない
+
+        Args:
+            guild_id (Optional[int]): コマンドが発行されたギルドのID. DMの場合はNone
+            user_id (int): コマンドを発行したユーザーのID
+            scope (str): 直列に実行する範囲. SCOPE_USER / SCOPE_GUILD
+            job (Callable[[], Awaitable]): コマンドの処理. 例外はログに出力して捨てるため、呼び出し側で処理しておくこと
+
+        Exceptions:
+            exception.CommandBusyError: 待ち行列が溢れている場合
+        """
+        assert scope in (CommandScheduler.SCOPE_USER, CommandScheduler.SCOPE_GUILD), scope
+        exclusive = scope == CommandScheduler.SCOPE_GUILD
+        key = (guild_id, None if exclusive else user_id)
+
+        lane = self.__lanes.get(key)
+        if self.__pending >= self.__max_pending or \
+                (lane is not None and len(lane.jobs) >= self.__max_pending_per_lane):
+            self.__rejected += 1
+            raise exception.CommandBusyError(
+                "処理待ちのコマンドが多すぎます。しばらく待ってから再度実行してください",
+                guild_id=guild_id, user_id=user_id, pending=self.__pending)
+
+        if lane is None:
+            lane = _Lane(guild_id, exclusive)
+            self.__lanes[key] = lane
+            gate = self.__gates.get(guild_id)
+            if gate is None:
+                gate = self.__gates[guild_id] = _GuildGate()
+            gate.lanes += 1
+            lane.jobs.append(job)
+            self.__pending += 1
+            self.__getIdle().clear()
+            lane.worker = asyncio.ensure_future(self.__work(key, lane))
+        else:
+            lane.jobs.append(job)
+            self.__pending += 1
+
+    async def join(self):
+        """ 受け付けた全てのコマンドが完了するまで待つ
+        """
+        if self.__lanes:
+            await self.__getIdle().wait()
+
+    async def cancel(self):
+        """ 実行中と待ち行列のコマンドを全て中断し、終わるまで待つ. 呼び出したコマンド自身は中断しない
+        """
+        current = asyncio.current_task()
+        workers = [lane.worker for lane in self.__lanes.values() if lane.worker is not current]
+        for worker in workers:
+            worker.cancel()
+        for result in await asyncio.gather(*workers, return_exceptions=True):
+            if isinstance(result, Exception):
+                logging.getLogger("CommandScheduler").error("Command worker failed. %s: %s", type(result), result)
+
+    def __getIdle(self) -> asyncio.Event:
+        if self.__idle is None:
+            self.__idle = asyncio.Event()
+            self.__idle.set()
+        return self.__idle
+
+    def __getSemaphore(self) -> asyncio.Semaphore:
+        # イベントループが動き出してから作る
+        if self.__semaphore is None:
+            self.__semaphore = asyncio.Semaphore(self.__max_concurrent)
+        return self.__semaphore
+
+    async def __work(self, key: Tuple[Optional[int], Optional[int]], lane: _Lane):
+        logger = logging.getLogger("CommandScheduler")
+        gate = self.__gates[lane.guild_id]
+        try:
+            while lane.jobs:
+                job = lane.jobs.popleft()
+                self.__pending -= 1
+                await gate.acquire(lane.exclusive)
+                try:
+                    async with self.__getSemaphore():
+                        self.__running += 1
+                        try:
+                            await job()
+                        finally:
+                            self.__running -= 1
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    logger.exception("Unhandled error in command. guild=%s, key=%s", lane.guild_id, key)
+                finally:
+                    await gate.release(lane.exclusive)
+        finally:
+            # 中断された場合は、残りのコマンドを捨てる
+            self.__pending -= len(lane.jobs)
+            lane.jobs.clear()
+            del self.__lanes[key]
+            gate.lanes -= 1
+            if gate.lanes == 0:
+                del self.__gates[lane.guild_id]
+            if not self.__lanes:
+                self.__getIdle().set()
@@ -0,0 +1,295 @@
+import asyncio
+import collections
+import logging
+import sqlite3
+import time
+
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+import discord
+
+from classes.guild_snapshot import GuildSnapshot
+from classes.outbox import Outbox
+from db.api import entries
+
+
+class _EntryRequest:
+    __slots__ = ("message", "snapshot")
+
+    def __init__(self, message: discord.Message, snapshot: GuildSnapshot):
+        self.message: discord.Message = message
+        self.snapshot: GuildSnapshot = snapshot
+
+    @property
+    def member(self) -> discord.Member:
+        return self.message.author
+
+
+class EntryAdmission:
+    """ +entryの受付待ち行列
+
+    エントリー期間の開始直後に集中するエントリーを、ギルドごとの待ち行列に受け付けて一定間隔でまとめて処理する。
+    重複の確認とエントリーの登録は、まとめた単位で1回ずつデータベースに問い合わせる。
+    ロールの付与とコンタクトチャンネルの作成は、ギルドごとに最短の間隔を空け、BOT全体の同時実行数を制限して並行に行う。
+    """
+
+    def __init__(self,
+                 outbox: Outbox,
+                 batch_size: int = 50,
+                 batch_interval: float = 0.5,
+                 concurrency: int = 4,
+                 request_interval: float = 0.2,
+                 logger: Optional[logging.Logger] = None):
+        """ EntryAdmissionを初期化する
+
+        Args:
+            outbox (Outbox): 結果を送信する送信待ち行列
+            batch_size (int): 1回にまとめて処理するエントリーの最大数
+            batch_interval (float): 待ち行列にエントリーを溜める時間（秒）
+            concurrency (int): 同時に実行するDiscordのREST APIの最大数
+            request_interval (float): 同じギルドへDiscordのREST APIを呼び出す最短の間隔（秒）
+            logger (Optional[logging.Logger]): ロガー
+        """
+        assert batch_size > 0 and concurrency > 0
+        self.__outbox: Outbox = outbox
+        self.__batch_size: int = batch_size
+        self.__batch_interval: float = batch_interval
+        self.__concurrency: int = concurrency
+        self.__request_interval: float = request_interval
+        self.__logger: logging.Logger = logger if logger is not None else logging.getLogger("EntryAdmission")
+        self.__queues: Dict[int, Deque[_EntryRequest]] = {}
+        self.__workers: Dict[int, asyncio.Future] = {}
+        self.__queued: Set[Tuple[int, int]] = set()
+        self.__semaphore: Optional[asyncio.Semaphore] = None
+        # レート制限はギルドごとなので、最短の間隔もギルドごとに空ける
+        self.__throttle_locks: Dict[int, asyncio.Lock] = {}
+        self.__next_requests: Dict[int, float] = {}
+        self.__admitted: int = 0
+        self.__duplicated: int = 0
+        self.__failed: int = 0
+
+    @property
+    def pending(self) -> int:
+        """ 処理を待っている、または処理中のエントリーの数
+        """
+        return len(self.__queued)
+
+    @property
+    def admitted(self) -> int:
+        """ 登録したエントリーの数
+        """
+        return self.__admitted
+
+    @property
+    def duplicated(self) -> int:
+        """ 既にエントリーしていたため断った数
+        """
+        return self.__duplicated
+
+    @property
+    def failed(self) -> int:
+        """ 作成や登録に失敗した数
+        """
+        return self.__failed
+
+    def isQueued(self, guild_id: int, user_id: int) -> bool:
+        """ ユーザーのエントリーが処理を待っている、または処理中かを取得する
+        """
+        return (guild_id, user_id) in self.__queued
+
+    def submit(self, message: discord.Message, snapshot: GuildSnapshot) -> bool:
+        """ エントリーを待ち行列に追加する. 完了は待たない
+
+        結果はmessageのチャンネルへの返信で通知する。
+
+        Args:
+            message (discord.Message): +entryコマンドのメッセージ
+            snapshot (GuildSnapshot): ギルドのスナップショット
+
+        Returns:
+            bool: 追加した場合はTrue. 既に同じユーザーのエントリーが待ち行列にある場合はFalse
+        """
+        guild_id = snapshot.guild.id
+        key = (guild_id, message.author.id)
+        if key in self.__queued:
+            return False
+        self.__queued.add(key)
+
+        queue = self.__queues.get(guild_id)
+        if queue is None:
+            queue = self.__queues[guild_id] = collections.deque()
+        queue.append(_EntryRequest(message, snapshot))
+        if guild_id not in self.__workers:
+            self.__workers[guild_id] = asyncio.ensure_future(self.__work(guild_id, queue))
+        return True
+
+    async def join(self, guild_id: Optional[int] = None):
+        """ 受け付けたエントリーの処理が全て終わるまで待つ
+
+        Args:
+            guild_id (Optional[int]): 待つギルドID. Noneの場合は全てのギルド
+        """
+        workers = list(self.__workers.values()) if guild_id is None \
+            else [self.__workers[guild_id]] if guild_id in self.__workers else []
+        if workers:
+            await asyncio.wait([asyncio.shield(w) for w in workers])
+
+    def __getSemaphore(self) -> asyncio.Semaphore:
+        # イベントループが動き出してから作る
+        if self.__semaphore is None:
+            self.__semaphore = asyncio.Semaphore(self.__concurrency)
+        return self.__semaphore
+
+    async def __throttle(self, guild_id: int):
+        """ DiscordのREST APIを呼び出す前に、同じギルドへの最短の間隔が空くまで待つ
+        """
+        if self.__request_interval <= 0:
+            return
+        lock = self.__throttle_locks.get(guild_id)
+        if lock is None:
+            lock = self.__throttle_locks[guild_id] = asyncio.Lock()
+        async with lock:
+            now = time.monotonic()
+            next_request = self.__next_requests.get(guild_id, 0.0)
+            if next_request > now:
+                await asyncio.sleep(next_request - now)
+                now = next_request
+            self.__next_requests[guild_id] = now + self.__request_interval
+
+    async def __request(self, guild_id: int, call: Callable[[], Awaitable[Any]]) -> Any:
+        """ ギルドごとの間隔を空けてから、全体の同時実行数の範囲でREST APIを呼び出す
+
+        間隔を待つ間はセマフォを取得しないので、1つのギルドのエントリーが他のギルドを待たせない。
+        """
+        await self.__throttle(guild_id)
+        async with self.__getSemaphore():
+            return await call()
+
+    async def __work(self, guild_id: int, queue: Deque[_EntryRequest]):
+        try:
+            while queue:
+                # 続けて届くエントリーを溜めてから、まとめて処理する
+                await asyncio.sleep(self.__batch_interval)
+                batch = [queue.popleft() for _ in range(min(self.__batch_size, len(queue)))]
+                try:
+                    await self.__admit(guild_id, batch)
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    self.__logger.exception("Unhandled error in entry admission. guild=%d", guild_id)
+                finally:
+                    for request in batch:
+                        self.__queued.discard((guild_id, request.member.id))
+        finally:
+            # 中断された場合は、残りのエントリーを捨てる
+            for request in queue:
+                self.__queued.discard((guild_id, request.member.id))
+            queue.clear()
+            del self.__queues[guild_id]
+            del self.__workers[guild_id]
+            self.__throttle_locks.pop(guild_id, None)
+            self.__next_requests.pop(guild_id, None)
+
+    async def __admit(self, guild_id: int, batch: List[_EntryRequest]):
+        begin = time.perf_counter()
+
+        # 既にエントリーしていない？
+        try:
+            existing = {e.discordUserId for e in await entries.getByDiscordIdsAsync(
+                guild_id, [request.member.id for request in batch])}
+        except sqlite3.Error as e:
+            self.__logger.error("Failed to check entries. %s: %s", type(e), e)
+            self.__failed += len(batch)
+            self.__reject(batch, "エントリーの確認に失敗しました。もう一度実行してください")
+            return
+        duplicated = [request for request in batch if request.member.id in existing]
+        self.__duplicated += len(duplicated)
+        self.__reject(duplicated, "既にエントリーが完了しています")
+        fresh = [request for request in batch if request.member.id not in existing]
+        if not fresh:
+            return
+
+        # ロールの付与とチャンネルの作成
+        results = await asyncio.gather(*[self.__provision(request) for request in fresh], return_exceptions=True)
+        created: List[Tuple[_EntryRequest, discord.TextChannel]] = []
+        failed: List[_EntryRequest] = []
+        for request, result in zip(fresh, results):
+            if isinstance(result, BaseException):
+                self.__logger.error("Failed to provision entry of user %d. %s: %s",
+                                    request.member.id, type(result), result)
+                failed.append(request)
+                self.__failed += 1
+            else:
+                created.append((request, result))
+        self.__reject(failed, "エントリーの処理に失敗しました。もう一度実行してください")
+        if not created:
+            return
+
+        # まとめて登録する
+        try:
+            await entries.entryManyAsync(guild_id, [(request.member.id, channel.id) for request, channel in created])
+        except sqlite3.Error as e:
+            self.__logger.error("Failed to commit %d entries. %s: %s", len(created), type(e), e)
+            await asyncio.gather(*[self.__rollback(request, channel) for request, channel in created])
+            self.__failed += len(created)
+            self.__reject([request for request, _ in created], "エントリーの登録に失敗しました。もう一度実行してください")
+            return
+        self.__admitted += len(created)
+
+        for request, channel in created:
+            self.__outbox.post(channel,
+                               "<@!{}>さん、こちらがコンタクトチャンネルです。".format(request.member.id),
+                               priority=Outbox.PRIORITY_STATUS)
+            self.__outbox.post(request.message.channel,
+                               "<@!{}>さん、仮エントリーを受け付けました。CONTACTチャンネルにて、手続きを続行してください。".format(
+                                   request.member.id))
+        self.__logger.info("- Admitted %d entries in %.1f ms (%d duplicated, %d failed). guild=%d",
+                           len(created), (time.perf_counter() - begin) * 1000, len(duplicated), len(failed), guild_id)
+
+    async def __provision(self, request: _EntryRequest) -> discord.TextChannel:
+        snapshot = request.snapshot
+        member = request.member
+        guild_id = snapshot.guild.id
+        # 役職「PreExhibitor」を与える
+        await self.__request(guild_id, lambda: member.add_roles(snapshot.rolePreExhibitor))
+
+        # コンタクトチャンネルを作成
+        channel_name = member.nick if member.nick is not None else str(member.name)
+        try:
+            return await self.__request(guild_id, lambda: snapshot.guild.create_text_channel(
+                name="{}-{}".format(channel_name, member.id),
+                overwrites={
+                    snapshot.guild.default_role: discord.PermissionOverwrite(read_messages=False),
+                    member: discord.PermissionOverwrite(read_messages=True),
+                    snapshot.roleManager: discord.PermissionOverwrite(read_messages=True)
+                },
+                category=snapshot.categoryContact
+            ))
+        except BaseException:
+            # エントリーの行が無いままロールだけが残らないように外す
+            await self.__removeRole(request)
+            raise
+
+    async def __rollback(self, request: _EntryRequest, channel: discord.TextChannel):
+        """ 登録に失敗したエントリーのチャンネルを削除し、ロールを外す
+        """
+        try:
+            await self.__request(request.snapshot.guild.id, channel.delete)
+        except discord.HTTPException as e:
+            self.__logger.error("Failed to delete contact channel %d. %s: %s", channel.id, type(e), e)
+        await self.__removeRole(request)
+
+    async def __removeRole(self, request: _EntryRequest):
+        """ 役職「PreExhibitor」を外す
+        """
+        try:
+            await self.__request(request.snapshot.guild.id,
+                                 lambda: request.member.remove_roles(request.snapshot.rolePreExhibitor))
+        except discord.HTTPException as e:
+            self.__logger.error("Failed to remove the pre-exhibitor role from user %d. %s: %s",
+                                request.member.id, type(e), e)
+
+    def __reject(self, requests: List[_EntryRequest], reason: str):
+        for request in requests:
+            self.__outbox.post(request.message.channel,
+                               ":x: **失敗** <@!{}>さん、{}".format(request.member.id, reason))
@@ -0,0 +1,84 @@
+import discord
+
+from typing import Optional
+
+from db.api import registry
+
+
+class GuildSnapshot:
+    """ BOTが管理するギルドのカテゴリ、チャンネル、ロールを、IDからオブジェクトに解決したもの
+
+    IDはデータベースから読み込み、オブジェクトはdiscord.pyのキャッシュから解決する。
+    ギルドの構成が変わったときは、rebuild()でデータベースを読まずに解決しなおす。
+    見つからないチャンネルやロールはNoneになる。
+    """
+
+    def __init__(self, guild: discord.Guild, ids: registry.Ids):
+        self.__guild: discord.Guild = guild
+        self.__ids: registry.Ids = ids
+        self.__category_bot: Optional[discord.CategoryChannel] = guild.get_channel(ids.categoryBot)
+        self.__category_contact: Optional[discord.CategoryChannel] = guild.get_channel(ids.categoryContact)
+        self.__channel_bot_control: Optional[discord.TextChannel] = guild.get_channel(ids.channelBotControl)
+        self.__channel_entry: Optional[discord.TextChannel] = guild.get_channel(ids.channelEntry)
+        self.__channel_status: Optional[discord.TextChannel] = guild.get_channel(ids.channelStatus)
+        self.__channel_query: Optional[discord.TextChannel] = guild.get_channel(ids.channelQuery)
+        self.__role_bot_admin: Optional[discord.Role] = guild.get_role(ids.roleBotAdmin)
+        self.__role_pre_exhibitor: Optional[discord.Role] = guild.get_role(ids.rolePreExhibitor)
+        self.__role_exhibitor: Optional[discord.Role] = guild.get_role(ids.roleExhibitor)
+        self.__role_manager: Optional[discord.Role] = guild.get_role(ids.roleManager)
+
+    def rebuild(self, guild: Optional[discord.Guild] = None) -> "GuildSnapshot":
+        """ 同じIDで、オブジェクトを解決しなおしたスナップショットを作成する
+
+        Args:
+            guild (Optional[discord.Guild]): 解決に使うギルド. Noneの場合は作成時のギルド
+        """
+        return GuildSnapshot(guild if guild is not None else self.__guild, self.__ids)
+
+    @property
+    def guild(self) -> discord.Guild:
+        return self.__guild
+
+    @property
+    def ids(self) -> registry.Ids:
+        return self.__ids
+
+    @property
+    def categoryBot(self) -> Optional[discord.CategoryChannel]:
+        return self.__category_bot
+
+    @property
+    def categoryContact(self) -> Optional[discord.CategoryChannel]:
+        return self.__category_contact
+
+    @property
+    def channelBotControl(self) -> Optional[discord.TextChannel]:
+        return self.__channel_bot_control
+
+    @property
+    def channelEntry(self) -> Optional[discord.TextChannel]:
+        return self.__channel_entry
+
+    @property
+    def channelStatus(self) -> Optional[discord.TextChannel]:
+        return self.__channel_status
+
+    @property
+    def channelQuery(self) -> Optional[discord.TextChannel]:
+        return self.__channel_query
+
+    @property
+    def roleBotAdmin(self) -> Optional[discord.Role]:
+        return self.__role_bot_admin
+
+    @property
+    def rolePreExhibitor(self) -> Optional[discord.Role]:
+        return self.__role_pre_exhibitor
+
+    @property
+    def roleExhibitor(self) -> Optional[discord.Role]:
+        return self.__role_exhibitor
+
+    @property
+    def roleManager(self) -> Optional[discord.Role]:
+        return self.__role_manager
@@ -0,0 +1,129 @@
+import asyncio
+import collections
+import logging
+import sys
+import threading
+import time
+import traceback
+
+from typing import Deque, Dict, List, Optional
+
+import metrics
+
+
+# ログとメトリクスに出すパーセンタイル
+_QUANTILES: List[float] = [0.5, 0.9, 0.99]
+
+
+def _quantile(values: List[float], ratio: float) -> float:
+    return values[min(len(values) - 1, int(len(values) * ratio))]
+
+
+class LoopWatchdog:
+    """ イベントループの遅れを測り、ループを止めている処理を見つける
+
+    ループ上のタスクは一定間隔でsleepし、予定より起きるのが遅れた時間を遅れとして記録する。
+    別スレッドはループの最後の応答からの時間を監視し、閾値を超えて応答が無い場合は、
+    その時点でループのスレッドが実行しているスタック（止めているコルーチン）をログに出す。
+    遅れのパーセンタイルは一定間隔でログとメトリクスに出す。
+    """
+
+    def __init__(self, interval: float = 0.25, slow_callback: float = 0.1, report_interval: float = 60.0):
+        """ LoopWatchdogを初期化する
+
+        Args:
+            interval (float): 遅れを測る間隔（秒）
+            slow_callback (float): ループが応答しない時間がこれを超えたらスタックを記録する（秒）
+            report_interval (float): 遅れのパーセンタイルをログに出す間隔（秒）
+        """
+        assert interval > 0 and slow_callback > 0 and report_interval > 0
+        self.__interval: float = interval
+        self.__slow_callback: float = slow_callback
+        self.__report_interval: float = report_interval
+        self.__logger: logging.Logger = logging.getLogger("LoopWatchdog")
+        self.__lags: Deque[float] = collections.deque(maxlen=max(1, int(report_interval / interval) * 2))
+        self.__task: Optional[asyncio.Task] = None
+        self.__thread: Optional[threading.Thread] = None
+        self.__stop: threading.Event = threading.Event()
+        self.__loop_thread_id: Optional[int] = None
+        # ループが最後に応答した時刻. 監視スレッドから参照する
+        self.__heartbeat: float = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self.__task is not None
+
+    def start(self):
+        """ 監視を開始する. イベントループのスレッドから呼ぶ
+        """
+        if self.running:
+            return
+        self.__loop_thread_id = threading.get_ident()
+        self.__heartbeat = time.monotonic()
+        self.__task = asyncio.get_event_loop().create_task(self.__measure())
+        self.__stop.clear()
+        self.__thread = threading.Thread(target=self.__watch, name="LoopWatchdog", daemon=True)
+        self.__thread.start()
+        self.__logger.info("Watching the event loop. (interval %.0f ms, slow callback %.0f ms)",
+                           self.__interval * 1000, self.__slow_callback * 1000)
+
+    def stop(self):
+        """ 監視を終了する
+        """
+        if not self.running:
+            return
+        self.__task.cancel()
+        self.__task = None
+        self.__stop.set()
+        self.__thread.join()
+        self.__thread = None
+
+    def percentiles(self) -> Dict[float, float]:
+        """ 直近の遅れのパーセンタイル（秒）. 記録が無い場合は空
+        """
+        lags = sorted(self.__lags)
+        if not lags:
+            return {}
+        return {q: _quantile(lags, q) for q in _QUANTILES + [1.0]}
+
+    async def __measure(self):
+        loop = asyncio.get_event_loop()
+        next_report = loop.time() + self.__report_interval
+        while True:
+            begin = loop.time()
+            await asyncio.sleep(self.__interval)
+            now = loop.time()
+            self.__heartbeat = time.monotonic()
+            lag = max(0.0, now - begin - self.__interval)
+            self.__lags.append(lag)
+            metrics.LOOP_LAG_SECONDS.observe(lag)
+            if now >= next_report:
+                next_report = now + self.__report_interval
+                self.__report()
+
+    def __report(self):
+        percentiles = self.percentiles()
+        if not percentiles:
+            return
+        for q in _QUANTILES:
+            metrics.LOOP_LAG_QUANTILE_SECONDS.set(percentiles[q], str(q))
+        self.__logger.info("Event loop lag: %s, max %.1f ms (%d samples)",
+                           ", ".join("p{:g} {:.1f} ms".format(q * 100, percentiles[q] * 1000) for q in _QUANTILES),
+                           percentiles[1.0] * 1000, len(self.__lags))
+        self.__lags.clear()
+
+    def __watch(self):
+        # 同じ停止を何度も記録しない
+        reported: float = 0.0
+        threshold = self.__interval + self.__slow_callback
+        while not self.__stop.wait(self.__slow_callback / 2):
+            heartbeat = self.__heartbeat
+            stalled = time.monotonic() - heartbeat
+            if stalled < threshold or heartbeat == reported:
+                continue
+            reported = heartbeat
+            metrics.LOOP_STALLS.inc()
+            frame = sys._current_frames().get(self.__loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else "(no frame)\n"
+            self.__logger.warning("Event loop has not responded for %.0f ms. Running:\n%s",
+                                  (stalled - self.__interval) * 1000, stack.rstrip())
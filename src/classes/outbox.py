@@ -0,0 +1,210 @@
+import asyncio
+import heapq
+import itertools
+import logging
+
+from typing import Any, Dict, List, Optional, Tuple
+
+import discord
+
+from easy_logging import easy_logging
+
+
+class _OutboundMessage:
+    __slots__ = ("content", "coalesce", "kwargs", "future")
+
+    def __init__(self, content: str, coalesce: bool, kwargs: Dict[str, Any], future: asyncio.Future):
+        self.content: str = content
+        self.coalesce: bool = coalesce and not kwargs
+        self.kwargs: Dict[str, Any] = kwargs
+        self.future: asyncio.Future = future
+
+
+class _ChannelQueue:
+    def __init__(self):
+        self.heap: List[Tuple[int, int, _OutboundMessage]] = []
+        # 待ち行列を送信するタスク. 待ち行列が空になるまでqueuesに残るので、ここで参照を持つ
+        self.worker: Optional[asyncio.Future] = None
+
+
+@easy_logging(function_trace=True, function_sample_rate=0.1)
+class Outbox:
+    """ チャンネルごとの送信待ち行列
+
+    同じチャンネルへの連続した送信は、2000文字に収まる範囲で1つのメッセージにまとめて送る。
+    待ち行列の中では、コマンドへの返信をステータスの投稿より先に送る。
+    """
+
+    # コマンドを発行したチャンネルへの返信
+    PRIORITY_REPLY: int = 0
+    # コンタクトチャンネルへの案内など、コマンドへの直接の返信ではない投稿
+    PRIORITY_STATUS: int = 1
+
+    # Discordのメッセージの最大文字数
+    MAX_LENGTH: int = 2000
+
+    def __init__(self, logger: Optional[logging.Logger] = None):
+        self.__logger: logging.Logger = logger if logger is not None else logging.getLogger("Outbox")
+        self.__queues: Dict[int, _ChannelQueue] = {}
+        self.__sequence = itertools.count()
+        self.__depth: int = 0
+        self.__peak_depth: int = 0
+        self.__posted: int = 0
+        self.__sent: int = 0
+        self.__idle: Optional[asyncio.Event] = None
+
+    @property
+    def depth(self) -> int:
+        """ 全てのチャンネルで送信を待っているメッセージの数
+        """
+        return self.__depth
+
+    @property
+    def peakDepth(self) -> int:
+        """ depthの最大値
+        """
+        return self.__peak_depth
+
+    @property
+    def posted(self) -> int:
+        """ 受け付けたメッセージの数
+        """
+        return self.__posted
+
+    @property
+    def sent(self) -> int:
+        """ 実際に送信したメッセージの数. postedとの差がまとめて送った数になる
+        """
+        return self.__sent
+
+    def depths(self) -> Dict[int, int]:
+        """ チャンネルIDごとの、送信を待っているメッセージの数
+        """
+        return {channel_id: len(queue.heap) for channel_id, queue in self.__queues.items()}
+
+    def post(self, channel: discord.abc.Messageable, content: str,
+             priority: int = PRIORITY_REPLY, coalesce: bool = True, **kwargs) -> asyncio.Future:
+        """ メッセージを送信待ち行列に追加する. 送信は待たない
+
+        送信に失敗した場合はログに出力する。
+
+        Args:
+            channel (discord.abc.Messageable): 送信先のチャンネル
+            content (str): メッセージ
+            priority (int): PRIORITY_REPLY / PRIORITY_STATUS
+            coalesce (bool): 他のメッセージとまとめてよいか. 送信後に編集するメッセージはFalseにする
+            kwargs: channel.send()に渡す引数. 指定した場合は他のメッセージとまとめない
+
+        Returns:
+            asyncio.Future: 送信したメッセージ（discord.Message）を結果に持つFuture. まとめて送った場合は共通のメッセージになる
+        """
+        future = self.__enqueue(channel, content, priority, coalesce, kwargs)
+        future.add_done_callback(self.__logFailure)
+        return future
+
+    async def send(self, channel: discord.abc.Messageable, content: str,
+                   priority: int = PRIORITY_REPLY, coalesce: bool = True, **kwargs) -> discord.Message:
+        """ メッセージを送信待ち行列に追加し、送信されるまで待つ. 引数はpost()と同じ
+
+        Exceptions:
+            discord.HTTPException: 送信に失敗した場合
+
+        Returns:
+            discord.Message: 送信したメッセージ. まとめて送った場合は共通のメッセージになる
+        """
+        return await self.__enqueue(channel, content, priority, coalesce, kwargs)
+
+    def __enqueue(self, channel: discord.abc.Messageable, content: str,
+                  priority: int, coalesce: bool, kwargs: Dict[str, Any]) -> asyncio.Future:
+        future = asyncio.get_event_loop().create_future()
+        message = _OutboundMessage(content, coalesce, kwargs, future)
+
+        queue = self.__queues.get(channel.id)
+        start = queue is None
+        if start:
+            queue = self.__queues[channel.id] = _ChannelQueue()
+        heapq.heappush(queue.heap, (priority, next(self.__sequence), message))
+        self.__posted += 1
+        self.__depth += 1
+        self.__peak_depth = max(self.__peak_depth, self.__depth)
+        if start:
+            self.__getIdle().clear()
+            queue.worker = asyncio.ensure_future(self.__work(channel, queue))
+        return future
+
+    async def flush(self):
+        """ 全てのメッセージが送信されるまで待つ
+        """
+        if self.__queues:
+            await self.__getIdle().wait()
+
+    async def cancel(self):
+        """ 送信中と送信待ちのメッセージを全て破棄し、送信のタスクが終わるまで待つ. 破棄したメッセージのFutureはキャンセルされる
+        """
+        workers = [queue.worker for queue in self.__queues.values()]
+        for worker in workers:
+            worker.cancel()
+        for result in await asyncio.gather(*workers, return_exceptions=True):
+            if isinstance(result, Exception):
+                self.__logger.error("Outbox worker failed. %s: %s", type(result), result)
+
+    def __getIdle(self) -> asyncio.Event:
+        if self.__idle is None:
+            self.__idle = asyncio.Event()
+            self.__idle.set()
+        return self.__idle
+
+    def __logFailure(self, future: asyncio.Future):
+        if not future.cancelled() and future.exception() is not None:
+            e = future.exception()
+            self.__logger.error("Failed to send message. %s: %s", type(e), e)
+
+    def __takeBatch(self, queue: _ChannelQueue) -> List[_OutboundMessage]:
+        """ 先頭のメッセージと、それにまとめられる後続のメッセージを取り出す
+        """
+        priority, _, first = heapq.heappop(queue.heap)
+        batch = [first]
+        if not first.coalesce:
+            return batch
+        length = len(first.content)
+        while queue.heap:
+            next_priority, _, following = queue.heap[0]
+            if next_priority != priority or not following.coalesce \
+                    or length + 1 + len(following.content) > Outbox.MAX_LENGTH:
+                break
+            heapq.heappop(queue.heap)
+            batch.append(following)
+            length += 1 + len(following.content)
+        return batch
+
+    async def __work(self, channel: discord.abc.Messageable, queue: _ChannelQueue):
+        try:
+            while queue.heap:
+                batch = self.__takeBatch(queue)
+                self.__depth -= len(batch)
+                try:
+                    sent = await channel.send("\n".join(m.content for m in batch), **batch[0].kwargs)
+                except asyncio.CancelledError:
+                    for m in batch:
+                        m.future.cancel()
+                    raise
+                except Exception as e:
+                    for m in batch:
+                        if not m.future.done():
+                            m.future.set_exception(e)
+                else:
+                    self.__sent += 1
+                    for m in batch:
+                        if not m.future.done():
+                            m.future.set_result(sent)
+                    if len(batch) > 1:
+                        self.__logger.debug("Coalesced %d messages into one. channel=%d", len(batch), channel.id)
+        finally:
+            # 中断された場合は、残りのメッセージを捨てる
+            for _, _, m in queue.heap:
+                m.future.cancel()
+            self.__depth -= len(queue.heap)
+            queue.heap.clear()
+            del self.__queues[channel.id]
+            if not self.__queues:
+                self.__getIdle().set()
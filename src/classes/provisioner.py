@@ -0,0 +1,117 @@
+import asyncio
+import logging
+import time
+
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+
+class ProvisioningError(Exception):
+    """ Provisioner.stage()で、いずれかの作成に失敗した場合の例外
+    """
+
+    def __init__(self, stage: str, errors: Dict[str, BaseException]):
+        super().__init__("Failed to provision {} in stage '{}': {}".format(
+            ", ".join(errors.keys()), stage, "; ".join("{}: {}".format(type(e).__name__, e) for e in errors.values())))
+        self.stage: str = stage
+        self.errors: Dict[str, BaseException] = errors
+
+
+class Provisioner:
+    """ Discordのリソース（ロール、チャンネルなど）を段階ごとに並行して作成し、失敗したときは作成済みのものを削除する
+
+    同じ段階のリソースは互いに依存しないものとして並行に作成し、段階は登録順に1つずつ進める。
+    同時に送るリクエストの数は、レート制限に掛かりにくいようにセマフォで制限する。
+    """
+
+    def __init__(self, concurrency: int = 4, logger: Optional[logging.Logger] = None):
+        """ Provisionerを初期化する
+
+        Args:
+            concurrency (int): 同時に実行する作成・削除の最大数
+            logger (Optional[logging.Logger]): 各段階の所要時間を出力するロガー
+        """
+        assert concurrency > 0
+        self.__semaphore: asyncio.Semaphore = asyncio.Semaphore(concurrency)
+        self.__logger: logging.Logger = logger if logger is not None else logging.getLogger("Provisioner")
+        self.__undos: List[Tuple[str, Callable[[], Awaitable]]] = []
+        self.__timings: List[Tuple[str, float]] = []
+
+    @property
+    def timings(self) -> List[Tuple[str, float]]:
+        """ 作成・削除の処理名と所要時間（秒）の組. 段階全体の所要時間は "stage:<名前>" で記録される
+        """
+        return list(self.__timings)
+
+    def addUndo(self, name: str, undo: Callable[[], Awaitable]):
+        """ rollback()で実行する取り消し処理を登録する. ニックネームの変更など、削除では戻せない操作に使う
+        """
+        self.__undos.append((name, undo))
+
+    async def stage(self, stage_name: str, creators: Dict[str, Callable[[], Awaitable[Any]]]) -> Dict[str, Any]:
+        """ 1つの段階のリソースを並行して作成する
+
+        作成できたリソースは、delete()で取り消せるものとしてrollback()の対象に登録する。
+
+        Args:
+            stage_name (str): 段階の名前
+            creators (Dict[str, Callable[[], Awaitable[Any]]]): リソース名と、リソースを作成する関数
+
+        Exceptions:
+            ProvisioningError: いずれかの作成に失敗した場合. 他の作成が全て終わってから送出する
+
+        Returns:
+            Dict[str, Any]: リソース名と作成したリソース
+        """
+        begin = time.perf_counter()
+        names = list(creators.keys())
+        results = await asyncio.gather(*[self.__create(name, creators[name]) for name in names],
+                                       return_exceptions=True)
+        elapsed = time.perf_counter() - begin
+        self.__timings.append(("stage:" + stage_name, elapsed))
+        self.__logger.info("- Provisioned stage '%s' (%d items) in %.1f ms", stage_name, len(names), elapsed * 1000)
+
+        errors: Dict[str, BaseException] = {}
+        for name, result in zip(names, results):
+            if isinstance(result, BaseException):
+                errors[name] = result
+        if errors:
+            raise ProvisioningError(stage_name, errors)
+        return dict(zip(names, results))
+
+    async def rollback(self) -> List[str]:
+        """ 作成したリソースを、後から作成したものから順に削除する
+
+        削除は作成と同じく同時実行数を制限して並行に行う。削除に失敗したものはログに出力して続行する。
+
+        Returns:
+            List[str]: 取り消しに失敗したリソース名
+        """
+        failed: List[str] = []
+        undos, self.__undos = self.__undos, []
+        begin = time.perf_counter()
+        results = await asyncio.gather(*[self.__undo(name, undo) for name, undo in reversed(undos)],
+                                       return_exceptions=True)
+        for (name, _), result in zip(reversed(undos), results):
+            if isinstance(result, BaseException):
+                self.__logger.error("Failed to roll back %s. %s: %s", name, type(result), result)
+                failed.append(name)
+        elapsed = time.perf_counter() - begin
+        self.__timings.append(("rollback", elapsed))
+        self.__logger.info("- Rolled back %d items in %.1f ms", len(undos) - len(failed), elapsed * 1000)
+        return failed
+
+    async def __create(self, name: str, creator: Callable[[], Awaitable[Any]]) -> Any:
+        async with self.__semaphore:
+            begin = time.perf_counter()
+            resource = await creator()
+            elapsed = time.perf_counter() - begin
+        self.__timings.append((name, elapsed))
+        self.__logger.debug("-- Created %s in %.1f ms", name, elapsed * 1000)
+        if resource is not None and hasattr(resource, "delete"):
+            self.__undos.append((name, resource.delete))
+        return resource
+
+    async def __undo(self, name: str, undo: Callable[[], Awaitable]):
+        async with self.__semaphore:
+            await undo()
+        self.__logger.debug("-- Rolled back %s", name)
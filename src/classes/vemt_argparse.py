@@ -1,20 +1,33 @@
 import argparse
+import re
+
 import exception
 
 _replace_map = {
     "usage:": "使い方:",
     "positional arguments:": "引数:",
     "optional arguments:": "省略可能な引数:",
+    "options:": "省略可能な引数:",
     "show this help message and exit": "このヘルプを表示します"
 }
+_replace_pattern = re.compile("|".join(re.escape(k) for k in _replace_map.keys()))
+
+
+def localize(message: str) -> str:
+    """ argparseが出力する英語の定型句を日本語に置き換える
+    """
+    return _replace_pattern.sub(lambda m: _replace_map[m.group(0)], message)
 
 
 class VemtArgumentParser(argparse.ArgumentParser):
     def error(self, message):
         raise exception.ArgError(message)
 
+    def formatLocalizedHelp(self) -> str:
+        """ 日本語化したヘルプを取得する
+        """
+        return localize(self.format_help())
+
     def _print_message(self, message: str, file=None):
         if message:
-            for k, v in _replace_map.items():
-                message = message.replace(k, v)
-            raise exception.ShowHelp(message)
+            raise exception.ShowHelp(localize(message))
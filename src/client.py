@@ -2,13 +2,19 @@ from db.api import registry
 import asyncio
 import discord
 import logging
-import shlex
+import sqlite3
+import time
+
+from typing import Dict, Optional
 
 import datetime
 
 import exception
 import bot_loader
-from classes import VemtArgumentParser
+import metrics
+from classes import VemtArgumentParser, CommandRouter, CommandRoute, CommandScheduler, Outbox, GuildSnapshot, \
+    EntryAdmission, CommandProfiler, LoopWatchdog
+from db import schema, database
 
 
 class VemtClient(discord.Client):
@@ -22,6 +28,7 @@ class VemtClient(discord.Client):
         add_help=False)
     __subparser = None
     __processor_parsers: dict = {}
+    __router: CommandRouter = CommandRouter(__parser)
 
     @classmethod
     def addProcessor(cls, bot_module, dev: bool = False):
@@ -29,64 +36,233 @@ class VemtClient(discord.Client):
         if not cls.__subparser:
             cls.__subparser = cls.__parser.add_subparsers(parser_class=VemtArgumentParser)
 
+        registered = set(cls.__subparser.choices.keys())
         parser = bot_module.setup(subparser=cls.__subparser, dev=dev)
         if parser is not None:
             parser.set_defaults(handler=bot_module)
             cls.__processor_parsers[bot_module.__name__] = parser
+            # 別名も含め、このモジュールが登録したコマンド名をルーターに登録する
+            for name, subparser in cls.__subparser.choices.items():
+                if name not in registered:
+                    cls.__router.add(name, subparser, bot_module)
             logger.debug("add bot processor: %s", bot_module.__name__)
 
-    def __init__(self, args, loop=None, **options):
+    @classmethod
+    def invalidateHelp(cls, bot_module=None):
+        """ キャッシュしたヘルプを破棄する. Noneの場合は全てのコマンドのヘルプを破棄する
+        """
+        cls.__router.invalidateHelp(bot_module)
+
+    def __init__(self, args, loop=None, scheduler: Optional[CommandScheduler] = None,
+                 admission: Optional[EntryAdmission] = None, outbox: Optional[Outbox] = None,
+                 profiler: Optional[CommandProfiler] = None, watchdog: Optional[LoopWatchdog] = None, **options):
         super().__init__(loop=loop, **options)
         self.__system_args = args
+        self.__scheduler: CommandScheduler = scheduler if scheduler is not None else CommandScheduler()
+        self.__outbox: Outbox = outbox if outbox is not None else Outbox()
+        self.__admission: EntryAdmission = admission if admission is not None else EntryAdmission(self.__outbox)
+        self.__profiler: CommandProfiler = profiler if profiler is not None else CommandProfiler()
+        self.__watchdog: LoopWatchdog = watchdog if watchdog is not None else LoopWatchdog()
+        # 初期化されていないギルドはNoneを記録し、データベースを読みなおさない
+        self.__snapshots: Dict[int, Optional[GuildSnapshot]] = {}
+        # REST APIの呼び出しは全てHTTPClient.request()を通るので、ここで所要時間を計測する
+        self.__request = self.http.request
+        self.http.request = self.__timedRequest
+
+    async def __timedRequest(self, route: discord.http.Route, **kwargs):
+        """ HTTPClient.request()を呼び出し、レート制限の待ち時間を含めた所要時間をメトリクスに記録する
+        """
+        begin = time.perf_counter()
+        status = "ok"
+        try:
+            return await self.__request(route, **kwargs)
+        except discord.HTTPException as e:
+            status = str(e.status)
+            raise
+        except Exception:
+            status = "error"
+            raise
+        finally:
+            metrics.DISCORD_REST_SECONDS.observe(time.perf_counter() - begin, route.method, route.path, status)
+
+    @property
+    def scheduler(self) -> CommandScheduler:
+        return self.__scheduler
+
+    @property
+    def outbox(self) -> Outbox:
+        """ メッセージの送信待ち行列. コマンドの処理からのメッセージは、channel.send()ではなくこちらから送る
+        """
+        return self.__outbox
+
+    @property
+    def admission(self) -> EntryAdmission:
+        """ +entryの受付待ち行列
+        """
+        return self.__admission
+
+    @property
+    def profiler(self) -> CommandProfiler:
+        """ コマンドのプロファイラー. 記録中はbot moduleのrun()をコマンドとギルドごとに記録する
+        """
+        return self.__profiler
+
+    @property
+    def watchdog(self) -> LoopWatchdog:
+        """ イベントループの遅れの監視. on_ready()で開始する
+        """
+        return self.__watchdog
+
+    async def close(self):
+        self.__watchdog.stop()
+        await self.__scheduler.cancel()
+        await self.__outbox.cancel()
+        await super().close()
+
+    def getSnapshot(self, guild_id: int) -> Optional[GuildSnapshot]:
+        """ キャッシュしたギルドのスナップショットを取得する. 初期化されていないか、まだ読み込んでいない場合はNone
+        """
+        return self.__snapshots.get(guild_id)
+
+    async def guildSnapshot(self, guild: discord.Guild) -> Optional[GuildSnapshot]:
+        """ ギルドのスナップショットを取得する. まだ読み込んでいない場合はデータベースから読み込む
+
+        Returns:
+            Optional[GuildSnapshot]: スナップショット. ギルドが初期化されていない場合はNone
+        """
+        if guild.id in self.__snapshots:
+            return self.__snapshots[guild.id]
+        return await self.refreshSnapshot(guild)
+
+    async def refreshSnapshot(self, guild: discord.Guild) -> Optional[GuildSnapshot]:
+        """ ギルドのIDをデータベースから読みなおし、スナップショットを作りなおす. +initの後などに呼ぶ
+
+        Returns:
+            Optional[GuildSnapshot]: スナップショット. ギルドが初期化されていない場合はNone
+        """
+        snapshot: Optional[GuildSnapshot] = None
+        try:
+            if database.guildDatabaseExists(guild.id) and await registry.isServerInitializedAsync(guild.id):
+                snapshot = GuildSnapshot(guild, await registry.getGuildIdsAsync(guild.id))
+        except sqlite3.OperationalError:
+            # DBが作成されていない
+            pass
+        self.__snapshots[guild.id] = snapshot
+        return snapshot
+
+    def dropSnapshot(self, guild_id: int):
+        """ ギルドのスナップショットを初期化されていない状態にする. +resetの後などに呼ぶ
+        """
+        self.__snapshots[guild_id] = None
+
+    def __rebuildSnapshot(self, guild: discord.Guild):
+        """ ギルドの構成が変わったときに、データベースを読まずにオブジェクトを解決しなおす
+        """
+        snapshot = self.__snapshots.get(guild.id)
+        if snapshot is not None:
+            self.__snapshots[guild.id] = snapshot.rebuild(guild)
 
     async def on_message(self, message: discord.Message):
         logger = logging.getLogger()
 
         if not message.author.bot and message.content.startswith("+"):
-            logger.debug('Message from {0.author} ({0.author.id}): {0.content}'.format(message))
-            logger.debug('Guild: {0.guild.id}'.format(message))
-            try:
-                args = VemtClient.__parser.parse_args(shlex.split(message.content))
-                logger.debug("arguments : %s", args)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug('Message from {0.author} ({0.author.id}): {0.content}'.format(message))
+                logger.debug('Guild: {0.guild.id}'.format(message))
+            await self.__handleCommandError(message, self.__dispatch(message))
 
-                if hasattr(args, "handler") and args.handler.__name__ in VemtClient.__processor_parsers:
-                    bot_module = args.handler
+    async def __dispatch(self, message: discord.Message):
+        """ コマンドを解析し、スケジューラーの待ち行列に追加する
+        """
+        logger = logging.getLogger()
+        route, argv = VemtClient.__router.resolve(message.content)
+        args = route.parse(argv)
+        logger.debug("arguments : %s", args)
 
-                    if self.__system_args.dev:
-                        bot_loader.reloadBotProcessor(bot_module)
+        if route.handler.__name__ not in VemtClient.__processor_parsers:
+            raise exception.CommandNotFoundError("そのようなコマンドは存在しません")
 
-                    await bot_module.authenticate(args, self, message)
+        submitted = time.perf_counter()
+        self.__scheduler.submit(
+            guild_id=message.guild.id if message.guild else None,
+            user_id=message.author.id,
+            scope=getattr(route.handler, "COMMAND_SCOPE", CommandScheduler.SCOPE_USER),
+            job=lambda: self.__handleCommandError(message, self.__measure(route, args, message, submitted)))
 
-                    if hasattr(args, "help") and args.help:
-                        await message.channel.send(VemtClient.__processor_parsers[bot_module.__name__].format_help())
-                    else:
-                        if hasattr(args, "show_help") and not args.help_on_help:
-                            VemtClient.__parser.print_help()
-                        else:
-                            await bot_module.run(args, self, message)
-                else:
-                    raise exception.CommandNotFoundError("そのようなコマンドは存在しません")
+    async def __measure(self, route: CommandRoute, args, message: discord.Message, submitted: float):
+        """ コマンドを実行し、スケジューラーでの待ち時間と処理時間をメトリクスに記録する
+        """
+        module = route.handler.__name__
+        begin = time.perf_counter()
+        metrics.COMMAND_WAIT_SECONDS.observe(begin - submitted, module)
+        outcome = "ok"
+        try:
+            await self.__process(route, args, message)
+        except BaseException:
+            outcome = "error"
+            raise
+        finally:
+            metrics.COMMAND_SECONDS.observe(time.perf_counter() - begin, module, outcome)
+
+    async def __process(self, route: CommandRoute, args, message: discord.Message):
+        """ スケジューラーの順番が来たコマンドを実行する
+        """
+        bot_module = route.handler
+
+        if self.__system_args.dev:
+            bot_loader.reloadBotProcessor(bot_module)
+
+        await bot_module.authenticate(args, self, message)
+
+        if hasattr(args, "help") and args.help:
+            await self.__outbox.send(message.channel, route.help)
+        else:
+            if hasattr(args, "show_help") and not args.help_on_help:
+                raise exception.ShowHelp(VemtClient.__router.help)
+            else:
+                await self.__profiler.profile(bot_module.run(args, self, message),
+                                              command=bot_module.__name__.split(".")[-1],
+                                              guild_id=message.guild.id if message.guild else None)
+
+    async def __handleCommandError(self, message: discord.Message, coro):
+        """ コマンドの処理を実行し、コマンドのエラーをメッセージで返信する
+        """
+        logger = logging.getLogger()
+        try:
+            await coro
 
-            except exception.ShowHelp as e:
-                # コマンドのヘルプ
-                await message.channel.send(e.help_str)
+        except exception.ShowHelp as e:
+            # コマンドのヘルプ
+            await self.__outbox.send(message.channel, e.help_str)
 
-            except exception.ArgError as e:
-                await message.channel.send(":x: " + str(e))
+        except exception.ArgError as e:
+            await self.__outbox.send(message.channel, ":x: " + str(e))
 
-            except SystemExit:
-                logger.debug("stopped to exit system.")
+        except SystemExit:
+            logger.debug("stopped to exit system.")
 
-            except exception.PermissionDeniedError:
-                await message.channel.send(":x: **失敗** このコマンドを実行する権限がありません")
+        except exception.PermissionDeniedError:
+            await self.__outbox.send(message.channel, ":x: **失敗** このコマンドを実行する権限がありません")
 
-            except exception.VemtCommandError as e:
-                await message.channel.send(":x: **失敗** " + str(e))
+        except exception.VemtCommandError as e:
+            await self.__outbox.send(message.channel, ":x: **失敗** " + str(e))
 
     async def on_ready(self):
         logger = logging.getLogger()
         logger.info('Logged on as {0}!'.format(self.user))
 
+        # 再接続でも呼ばれるので、開始済みの場合は何もしない
+        self.__watchdog.start()
+
+        # 既に作成済みのギルドDBを最新のスキーマに更新する
+        versions = await schema.upgradeGuilds([guild.id for guild in self.guilds])
+        logger.info("Database schema is up to date. (%d databases, version %s)",
+                    len(versions), ",".join(sorted(set(str(v) for v in versions))))
+
+        # 各ギルドのロールとチャンネルを解決しておく
+        snapshots = await asyncio.gather(*[self.refreshSnapshot(guild) for guild in self.guilds])
+        logger.info("Loaded snapshots of %d initialized guilds.", sum(1 for s in snapshots if s is not None))
+
         """
         ids = registry.getGuildIds(627563965089579017)
         guild: discord.Guild = self.get_guild(627563965089579017)
@@ -98,3 +274,30 @@ class VemtClient(discord.Client):
             await channel.send(f"タイマー！！ {count * 5}s")
             logger.info("TIMER!!!")
             """
+
+    async def on_guild_join(self, guild: discord.Guild):
+        await self.refreshSnapshot(guild)
+
+    async def on_guild_remove(self, guild: discord.Guild):
+        self.__snapshots.pop(guild.id, None)
+
+    async def on_guild_available(self, guild: discord.Guild):
+        self.__rebuildSnapshot(guild)
+
+    async def on_guild_channel_create(self, channel: discord.abc.GuildChannel):
+        self.__rebuildSnapshot(channel.guild)
+
+    async def on_guild_channel_delete(self, channel: discord.abc.GuildChannel):
+        self.__rebuildSnapshot(channel.guild)
+
+    async def on_guild_channel_update(self, before: discord.abc.GuildChannel, after: discord.abc.GuildChannel):
+        self.__rebuildSnapshot(after.guild)
+
+    async def on_guild_role_create(self, role: discord.Role):
+        self.__rebuildSnapshot(role.guild)
+
+    async def on_guild_role_delete(self, role: discord.Role):
+        self.__rebuildSnapshot(role.guild)
+
+    async def on_guild_role_update(self, before: discord.Role, after: discord.Role):
+        self.__rebuildSnapshot(after.guild)
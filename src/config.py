@@ -76,11 +76,221 @@ class RoleName:
         return self.__manager
 
 
+class StorageConfig:
+    def __init__(self, **args):
+        self.__journal_mode: str = ConfigTypeError.checkAndGet(args, "journal_mode", "WAL")
+        self.__synchronous: str = ConfigTypeError.checkAndGet(args, "synchronous", "NORMAL")
+        self.__cache_size: int = ConfigTypeError.checkAndGet(args, "cache_size", -8000, int)
+        self.__mmap_size: int = ConfigTypeError.checkAndGet(args, "mmap_size", 0, int)
+        self.__busy_timeout: int = ConfigTypeError.checkAndGet(args, "busy_timeout", 5000, int)
+        self.__temp_store: str = ConfigTypeError.checkAndGet(args, "temp_store", "MEMORY")
+        self.__foreign_keys: bool = ConfigTypeError.checkAndGet(args, "foreign_keys", True, bool)
+
+    @property
+    def journalMode(self) -> str:
+        return self.__journal_mode
+
+    @property
+    def synchronous(self) -> str:
+        return self.__synchronous
+
+    @property
+    def cacheSize(self) -> int:
+        return self.__cache_size
+
+    @property
+    def mmapSize(self) -> int:
+        return self.__mmap_size
+
+    @property
+    def busyTimeout(self) -> int:
+        return self.__busy_timeout
+
+    @property
+    def tempStore(self) -> str:
+        return self.__temp_store
+
+    @property
+    def foreignKeys(self) -> bool:
+        return self.__foreign_keys
+
+
+class DatabaseConfig:
+    def __init__(self, **args):
+        self.__backend: str = ConfigTypeError.checkAndGet(args, "backend", "per_guild", str)
+        self.__consolidated_path: str = ConfigTypeError.checkAndGet(args, "consolidated_path", "vemt.db", str)
+        self.__pool_max_databases: int = ConfigTypeError.checkAndGet(args, "pool_max_databases", 64, int)
+        self.__pool_max_connections: int = ConfigTypeError.checkAndGet(args, "pool_max_connections", 4, int)
+        self.__pool_health_check_interval: int = ConfigTypeError.checkAndGet(
+            args, "pool_health_check_interval", 30, int)
+        self.__statement_cache_size: int = ConfigTypeError.checkAndGet(args, "statement_cache_size", 128, int)
+        self.__sql_cache_size: int = ConfigTypeError.checkAndGet(args, "sql_cache_size", 256, int)
+        self.__executor_max_workers: int = ConfigTypeError.checkAndGet(args, "executor_max_workers", 4, int)
+        self.__registry_cache_ttl: int = ConfigTypeError.checkAndGet(args, "registry_cache_ttl", 300, int)
+        self.__storage: StorageConfig = StorageConfig(**ConfigTypeError.checkAndGet(args, "storage", {}, dict))
+
+    @property
+    def backend(self) -> str:
+        return self.__backend
+
+    @property
+    def consolidatedPath(self) -> str:
+        return self.__consolidated_path
+
+    @property
+    def poolMaxDatabases(self) -> int:
+        return self.__pool_max_databases
+
+    @property
+    def poolMaxConnections(self) -> int:
+        return self.__pool_max_connections
+
+    @property
+    def poolHealthCheckInterval(self) -> int:
+        return self.__pool_health_check_interval
+
+    @property
+    def statementCacheSize(self) -> int:
+        return self.__statement_cache_size
+
+    @property
+    def sqlCacheSize(self) -> int:
+        return self.__sql_cache_size
+
+    @property
+    def executorMaxWorkers(self) -> int:
+        return self.__executor_max_workers
+
+    @property
+    def registryCacheTtl(self) -> int:
+        return self.__registry_cache_ttl
+
+    @property
+    def storage(self) -> StorageConfig:
+        return self.__storage
+
+
+class SchedulerConfig:
+    def __init__(self, **args):
+        self.__max_pending_per_lane: int = ConfigTypeError.checkAndGet(args, "max_pending_per_lane", 4, int)
+        self.__max_pending: int = ConfigTypeError.checkAndGet(args, "max_pending", 1024, int)
+        self.__max_concurrent: int = ConfigTypeError.checkAndGet(args, "max_concurrent", 32, int)
+
+    @property
+    def maxPendingPerLane(self) -> int:
+        return self.__max_pending_per_lane
+
+    @property
+    def maxPending(self) -> int:
+        return self.__max_pending
+
+    @property
+    def maxConcurrent(self) -> int:
+        return self.__max_concurrent
+
+
+class RestConfig:
+    def __init__(self, **args):
+        self.__provision_concurrency: int = ConfigTypeError.checkAndGet(args, "provision_concurrency", 4, int)
+        self.__teardown_concurrency: int = ConfigTypeError.checkAndGet(args, "teardown_concurrency", 8, int)
+
+    @property
+    def provisionConcurrency(self) -> int:
+        return self.__provision_concurrency
+
+    @property
+    def teardownConcurrency(self) -> int:
+        return self.__teardown_concurrency
+
+
+class AdmissionConfig:
+    def __init__(self, **args):
+        self.__batch_size: int = ConfigTypeError.checkAndGet(args, "batch_size", 50, int)
+        self.__batch_interval_ms: int = ConfigTypeError.checkAndGet(args, "batch_interval_ms", 500, int)
+        self.__concurrency: int = ConfigTypeError.checkAndGet(args, "concurrency", 4, int)
+        self.__request_interval_ms: int = ConfigTypeError.checkAndGet(args, "request_interval_ms", 200, int)
+
+    @property
+    def batchSize(self) -> int:
+        return self.__batch_size
+
+    @property
+    def batchIntervalMs(self) -> int:
+        return self.__batch_interval_ms
+
+    @property
+    def concurrency(self) -> int:
+        return self.__concurrency
+
+    @property
+    def requestIntervalMs(self) -> int:
+        return self.__request_interval_ms
+
+
+class WatchdogConfig:
+    def __init__(self, **args):
+        self.__interval_ms: int = ConfigTypeError.checkAndGet(args, "interval_ms", 250, int)
+        self.__slow_callback_ms: int = ConfigTypeError.checkAndGet(args, "slow_callback_ms", 100, int)
+        self.__report_interval: int = ConfigTypeError.checkAndGet(args, "report_interval", 60, int)
+
+    @property
+    def intervalMs(self) -> int:
+        return self.__interval_ms
+
+    @property
+    def slowCallbackMs(self) -> int:
+        return self.__slow_callback_ms
+
+    @property
+    def reportInterval(self) -> int:
+        return self.__report_interval
+
+
+class MetricsConfig:
+    def __init__(self, **args):
+        self.__textfile_path: str = ConfigTypeError.checkAndGet(args, "textfile_path", "", str)
+        self.__http_host: str = ConfigTypeError.checkAndGet(args, "http_host", "127.0.0.1", str)
+        self.__http_port: int = ConfigTypeError.checkAndGet(args, "http_port", 0, int)
+        self.__interval: int = ConfigTypeError.checkAndGet(args, "interval", 15, int)
+
+    @property
+    def textfilePath(self) -> str:
+        """ Prometheusのテキスト形式で書き出すファイルパス. 空の場合は書き出さない
+        """
+        return self.__textfile_path
+
+    @property
+    def httpHost(self) -> str:
+        return self.__http_host
+
+    @property
+    def httpPort(self) -> int:
+        """ /metricsを公開するポート. 0の場合は公開しない
+        """
+        return self.__http_port
+
+    @property
+    def interval(self) -> int:
+        return self.__interval
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.__textfile_path) or self.__http_port > 0
+
+
 class Config:
     def __init__(self, **args):
         self.__category_name: CategoryName = CategoryName(**ConfigTypeError.checkAndGet(args, "categories", {}, dict))
         self.__channel_name: ChannelName = ChannelName(**ConfigTypeError.checkAndGet(args, "channels", {}, dict))
         self.__role_name: RoleName = RoleName(**ConfigTypeError.checkAndGet(args, "roles", {}, dict))
+        self.__database: DatabaseConfig = DatabaseConfig(**ConfigTypeError.checkAndGet(args, "database", {}, dict))
+        self.__scheduler: SchedulerConfig = SchedulerConfig(
+            **ConfigTypeError.checkAndGet(args, "scheduler", {}, dict))
+        self.__rest: RestConfig = RestConfig(**ConfigTypeError.checkAndGet(args, "rest", {}, dict))
+        self.__admission: AdmissionConfig = AdmissionConfig(
+            **ConfigTypeError.checkAndGet(args, "admission", {}, dict))
+        self.__metrics: MetricsConfig = MetricsConfig(**ConfigTypeError.checkAndGet(args, "metrics", {}, dict))
+        self.__watchdog: WatchdogConfig = WatchdogConfig(**ConfigTypeError.checkAndGet(args, "watchdog", {}, dict))
 
     @property
     def categoryName(self) -> CategoryName:
@@ -94,6 +304,30 @@ class Config:
     def roleName(self) -> RoleName:
         return self.__role_name
 
+    @property
+    def database(self) -> DatabaseConfig:
+        return self.__database
+
+    @property
+    def scheduler(self) -> SchedulerConfig:
+        return self.__scheduler
+
+    @property
+    def rest(self) -> RestConfig:
+        return self.__rest
+
+    @property
+    def admission(self) -> AdmissionConfig:
+        return self.__admission
+
+    @property
+    def metrics(self) -> MetricsConfig:
+        return self.__metrics
+
+    @property
+    def watchdog(self) -> WatchdogConfig:
+        return self.__watchdog
+
 
 _configInstance = None
 
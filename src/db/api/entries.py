@@ -1,52 +1,206 @@
 import datetime
-from typing import Optional, List
-from db.database import Database, toDBFilepath
+import sqlite3
+from typing import Optional, List, Tuple, Iterable
+from db.database import Database, guildDatabase
+from db.async_database import asyncGuildDatabase
 
 
 class Entry:
-    def __init__(self, result: dict):
-        super().__init__()
-        self.__data: dict = result
+    """ entriesテーブルの1行
+
+    大量のエントリーを保持しても軽いように、必要な値だけを__slots__に持つ。
+    """
+    __slots__ = ("__entry_id", "__discord_user_id", "__contact_channel_id", "__created_at", "__updated_at")
+
+    def __init__(self, result: sqlite3.Row):
+        self.__entry_id: int = result["id"]
+        self.__discord_user_id: int = result["discord_user_id"]
+        self.__contact_channel_id: int = result["contact_channel_id"]
+        self.__created_at: datetime.datetime = result["created_at"]
+        self.__updated_at: datetime.datetime = result["updated_at"]
 
     @property
     def entryId(self) -> int:
-        return self.__data["id"]
+        return self.__entry_id
 
     @property
     def discordUserId(self) -> int:
-        return self.__data["discord_user_id"]
+        return self.__discord_user_id
 
     @property
     def contactChannelId(self) -> int:
-        return self.__data["contact_channel_id"]
+        return self.__contact_channel_id
 
     @property
     def created(self) -> datetime.datetime:
-        raise NotImplementedError("時刻のフォーマットが分からん" + str(self.__data["created_at"]))
+        return self.__created_at
 
     @property
     def updated(self) -> datetime.datetime:
-        raise NotImplementedError("時刻のフォーマットが分からん" + str(self.__data["updated_at"]))
+        return self.__updated_at
+
+
+# Entryが使うカラム
+ENTRY_COLUMNS: List[str] = ["id", "discord_user_id", "contact_channel_id", "created_at", "updated_at"]
 
 
 def getAll(guild_id: int) -> List[Entry]:
-    with Database(toDBFilepath(guild_id=guild_id)) as db:
-        return [Entry(result) for result in db.select("entries")]
+    with guildDatabase(guild_id) as db:
+        return [Entry(result) for result in db.select("entries", columns=ENTRY_COLUMNS)]
+
+
+async def getAllAsync(guild_id: int) -> List[Entry]:
+    return [Entry(result) for result in await asyncGuildDatabase(guild_id).select("entries", columns=ENTRY_COLUMNS)]
 
 
 def getFromDiscordId(guild_id: int, discord_user_id: int) -> List[Entry]:
-    with Database(toDBFilepath(guild_id=guild_id)) as db:
+    with guildDatabase(guild_id) as db:
         return [Entry(result)
                 for result in db.select(
                     table="entries",
+                    columns=ENTRY_COLUMNS,
                     condition={"discord_user_id": discord_user_id})]
 
 
+async def getFromDiscordIdAsync(guild_id: int, discord_user_id: int) -> List[Entry]:
+    return [Entry(result)
+            for result in await asyncGuildDatabase(guild_id).select(
+                table="entries",
+                columns=ENTRY_COLUMNS,
+                condition={"discord_user_id": discord_user_id})]
+
+
+def getByDiscordIds(guild_id: int, discord_user_ids: Iterable[int]) -> List[Entry]:
+    """ DiscordのユーザーIDのいずれかに一致するエントリーを取得する
+
+    Args:
+        guild_id (int): ギルドID
+        discord_user_ids (Iterable[int]): DiscordのユーザーID. エントリーしていないユーザーが含まれていてもよい
+
+    Returns:
+        List[Entry]: 一致したエントリー
+    """
+    with guildDatabase(guild_id) as db:
+        return [Entry(result)
+                for result in db.selectIn(
+                    table="entries",
+                    column="discord_user_id",
+                    values=list(discord_user_ids),
+                    columns=ENTRY_COLUMNS)]
+
+
+async def getByDiscordIdsAsync(guild_id: int, discord_user_ids: Iterable[int]) -> List[Entry]:
+    return [Entry(result)
+            for result in await asyncGuildDatabase(guild_id).selectIn(
+                table="entries",
+                column="discord_user_id",
+                values=list(discord_user_ids),
+                columns=ENTRY_COLUMNS)]
+
+
+def getByChannelIds(guild_id: int, channel_ids: Iterable[int]) -> List[Entry]:
+    """ コンタクトチャンネルIDのいずれかに一致するエントリーを取得する
+
+    Args:
+        guild_id (int): ギルドID
+        channel_ids (Iterable[int]): コンタクトチャンネルID. エントリーと関係のないチャンネルIDが含まれていてもよい
+
+    Returns:
+        List[Entry]: 一致したエントリー
+    """
+    with guildDatabase(guild_id) as db:
+        return [Entry(result)
+                for result in db.selectIn(
+                    table="entries",
+                    column="contact_channel_id",
+                    values=list(channel_ids),
+                    columns=ENTRY_COLUMNS)]
+
+
+async def getByChannelIdsAsync(guild_id: int, channel_ids: Iterable[int]) -> List[Entry]:
+    return [Entry(result)
+            for result in await asyncGuildDatabase(guild_id).selectIn(
+                table="entries",
+                column="contact_channel_id",
+                values=list(channel_ids),
+                columns=ENTRY_COLUMNS)]
+
+
+def _deleteByChannelIds(db: Database, channel_ids: List[int]) -> int:
+    entry_ids = [row["id"] for row in db.selectIn("entries", "contact_channel_id", channel_ids, columns=["id"])]
+    if entry_ids:
+        # 外部キーの参照元から順に削除する
+        submission_ids = [row["id"] for row in db.selectIn("submissions", "entry_id", entry_ids, columns=["id"])]
+        db.deleteIn("results", "submission_id", submission_ids)
+        db.deleteIn("submissions", "entry_id", entry_ids)
+        db.deleteIn("answers", "entry_id", entry_ids)
+        db.deleteIn("questionary_message_ids", "entry_id", entry_ids)
+        db.deleteIn("entries", "id", entry_ids)
+    db.commit()
+    return len(entry_ids)
+
+
+def deleteByChannelIds(guild_id: int, channel_ids: Iterable[int]) -> int:
+    """ コンタクトチャンネルIDのいずれかに一致するエントリーを、提出物や回答ごと削除する
+
+    Args:
+        guild_id (int): ギルドID
+        channel_ids (Iterable[int]): コンタクトチャンネルID
+
+    Returns:
+        int: 削除したエントリーの数
+    """
+    with guildDatabase(guild_id, isolation_level="EXCLUSIVE") as db:
+        return _deleteByChannelIds(db, list(channel_ids))
+
+
+async def deleteByChannelIdsAsync(guild_id: int, channel_ids: Iterable[int]) -> int:
+    return await asyncGuildDatabase(guild_id, isolation_level="EXCLUSIVE").transaction(
+        _deleteByChannelIds, list(channel_ids))
+
+
+def _entry(db: Database, discord_user_id: int, channel_id: int) -> Entry:
+    entry_id = db.insert(table="entries",
+                         candidate={"discord_user_id": discord_user_id,
+                                    "contact_channel_id": channel_id})
+    db.commit()
+
+    return Entry(db.select(table="entries", columns=ENTRY_COLUMNS, condition={"id": entry_id})[0])
+
+
 def entry(guild_id: int, discord_user_id: int, channel_id: int) -> Entry:
-    with Database(toDBFilepath(guild_id=guild_id), isolation_level="EXCLUSIVE") as db:
-        db.insert(table="entries",
-                  candidate={"discord_user_id": discord_user_id,
-                             "contact_channel_id": channel_id})
-        db.commit()
+    with guildDatabase(guild_id, isolation_level="EXCLUSIVE") as db:
+        return _entry(db, discord_user_id, channel_id)
+
+
+async def entryAsync(guild_id: int, discord_user_id: int, channel_id: int) -> Entry:
+    return await asyncGuildDatabase(guild_id, isolation_level="EXCLUSIVE").transaction(
+        _entry, discord_user_id, channel_id)
+
+
+def _entryMany(db: Database, candidates: List[Tuple[int, int]]) -> List[int]:
+    ids = db.insertMany(table="entries",
+                        rows=[{"discord_user_id": discord_user_id, "contact_channel_id": channel_id}
+                              for discord_user_id, channel_id in candidates],
+                        request_ids=True)
+    db.commit()
+    return ids
+
+
+def entryMany(guild_id: int, candidates: List[Tuple[int, int]]) -> List[int]:
+    """ 複数のエントリーを1つのトランザクションでまとめて登録する
+
+    Args:
+        guild_id (int): ギルドID
+        candidates (List[Tuple[int, int]]): DiscordのユーザーIDとコンタクトチャンネルIDの組
+
+    Returns:
+        List[int]: 登録したエントリーのID. candidatesと同じ順序
+    """
+    with guildDatabase(guild_id, isolation_level="EXCLUSIVE") as db:
+        return _entryMany(db, candidates)
+
 
-        return getFromDiscordId(guild_id, discord_user_id)[0]
+async def entryManyAsync(guild_id: int, candidates: List[Tuple[int, int]]) -> List[int]:
+    return await asyncGuildDatabase(guild_id, isolation_level="EXCLUSIVE").transaction(
+        _entryMany, candidates)
@@ -1,27 +1,149 @@
 import datetime
-from typing import Optional, Tuple
-from db.database import Database, toDBFilepath
+from typing import Optional, Tuple, Dict, List, Iterable, Any
+from db.database import Database, guildDatabase
+from db.async_database import runInExecutor
+from db.api.registry_cache import GuildRegistry, getRegistryCache
+
+
+def _fetchRegistry(db: Database,
+                   keys: Optional[Iterable[str]] = None) -> Tuple[Dict[str, int], Dict[str, datetime.datetime]]:
+    """ registry_intとregistry_datetimeを1回のクエリでまとめて取得する
+
+    Args:
+        db (Database): withブロック内のデータベース
+        keys (Optional[Iterable[str]]): 取得するキー. Noneの場合は全て取得する
+
+    Returns:
+        Tuple[Dict[str, int], Dict[str, datetime.datetime]]: 整数値と日時のそれぞれのキーと値の辞書
+    """
+    # UNIONの列の型は先頭のSELECTで決まるため、日時は別の列に分け、列名で型を指定して変換させる
+    sql: List[str] = ["SELECT title, itemvalue AS int_value, NULL AS \"datetime_value [DATETIME]\" FROM registry_int",
+                      "UNION ALL",
+                      "SELECT title, NULL, itemvalue FROM registry_datetime"]
+    conditions: List[str] = []
+    values: List[Any] = []
+    if db.guildScope is not None:
+        conditions.append("guild_id = ?")
+        values.append(db.guildScope)
+    if keys is not None:
+        key_list = list(set(keys))
+        if not key_list:
+            return ({}, {})
+        conditions.append("title IN ({})".format(", ".join("?" * len(key_list))))
+        values.extend(key_list)
+    bindee: Optional[List[Any]] = None
+    if conditions:
+        where = "WHERE " + " AND ".join(conditions)
+        sql.insert(1, where)
+        sql.append(where)
+        bindee = values + values
+
+    ints: Dict[str, int] = {}
+    datetimes: Dict[str, datetime.datetime] = {}
+    for r in db.execute(" ".join(sql), bindee):
+        if r["datetime_value"] is not None:
+            datetimes[r["title"]] = r["datetime_value"]
+        else:
+            ints[r["title"]] = r["int_value"]
+    return (ints, datetimes)
+
+
+def _loadRegistry(guild_id: int) -> GuildRegistry:
+    cache = getRegistryCache()
+    generation = cache.generation
+    with guildDatabase(guild_id) as db:
+        registry = GuildRegistry(*_fetchRegistry(db))
+    cache.put(guild_id, registry, generation)
+    return registry
+
+
+def _getRegistry(guild_id: int) -> GuildRegistry:
+    registry = getRegistryCache().get(guild_id)
+    if registry is None:
+        registry = _loadRegistry(guild_id)
+    return registry
+
+
+async def _getRegistryAsync(guild_id: int) -> GuildRegistry:
+    # キャッシュ済みであればスレッドプールを経由しない
+    registry = getRegistryCache().get(guild_id)
+    if registry is None:
+        registry = await runInExecutor(_loadRegistry, guild_id)
+    return registry
+
+
+def invalidateCache(guild_id: Optional[int] = None):
+    """ レジストリのキャッシュを破棄する. スキーマを作り直した時などに呼ぶ
+
+    Args:
+        guild_id (Optional[int]): 破棄するギルドID. Noneの場合は全て破棄する
+    """
+    getRegistryCache().invalidate(guild_id)
+
+
+def getMany(guild_id: int, keys: Iterable[str]) -> Dict[str, Any]:
+    """ 複数のキーの値をまとめて取得する
+
+    キャッシュが無い場合は、ギルドのレジストリ全体を1回のクエリで読み込んでキャッシュする。
+
+    Args:
+        guild_id (int): ギルドID
+        keys (Iterable[str]): 取得するキー. registry_intとregistry_datetimeのキーを混在させてよい
+
+    Returns:
+        Dict[str, Any]: 見つかったキーと値の辞書
+    """
+    return _pick(_getRegistry(guild_id), keys)
+
+
+async def getManyAsync(guild_id: int, keys: Iterable[str]) -> Dict[str, Any]:
+    return _pick(await _getRegistryAsync(guild_id), keys)
+
+
+def fetchMany(guild_id: int, keys: Iterable[str]) -> Dict[str, Any]:
+    """ キャッシュを使わずに、複数のキーの値を1回のクエリで取得する
+
+    Args:
+        guild_id (int): ギルドID
+        keys (Iterable[str]): 取得するキー. registry_intとregistry_datetimeのキーを混在させてよい
+
+    Returns:
+        Dict[str, Any]: 見つかったキーと値の辞書
+    """
+    with guildDatabase(guild_id) as db:
+        ints, datetimes = _fetchRegistry(db, keys)
+    ret: Dict[str, Any] = dict(ints)
+    ret.update(datetimes)
+    return ret
+
+
+def _pick(registry: GuildRegistry, keys: Iterable[str]) -> Dict[str, Any]:
+    ret: Dict[str, Any] = {}
+    for key in keys:
+        if key in registry.ints:
+            ret[key] = registry.ints[key]
+        elif key in registry.datetimes:
+            ret[key] = registry.datetimes[key]
+    return ret
 
 
 def getInt(guild_id: int, key: str, default_value: int = None) -> Optional[int]:
-    with Database(database=toDBFilepath(guild_id)) as db:
-        ret = db.select("registry_int", columns=["itemvalue"], condition={"title": key})
-        if ret:
-            return ret[0]["itemvalue"]
-        return default_value
+    return _getRegistry(guild_id).ints.get(key, default_value)
 
 
 def setInt(guild_id: int, key: str, value: int):
-    with Database(database=toDBFilepath(guild_id)) as db:
+    with guildDatabase(guild_id) as db:
         db.insert("registry_int", candidate={"title": key, "itemvalue": value})
+    getRegistryCache().setInt(guild_id, key, value)
 
 
 def getDatetime(guild_id: int, key: str, default_value: datetime.datetime = None) -> Optional[datetime.datetime]:
-    with Database(database=toDBFilepath(guild_id)) as db:
-        ret = db.select("registry_datetime", columns=["itemvalue"], condition={"title": key})
-        if ret:
-            return ret[0]["itemvalue"]
-        return default_value
+    return _getRegistry(guild_id).datetimes.get(key, default_value)
+
+
+async def getDatetimeAsync(guild_id: int, key: str,
+                           default_value: datetime.datetime = None) -> Optional[datetime.datetime]:
+    return (await _getRegistryAsync(guild_id)).datetimes.get(key, default_value)
 
 
 def isServerInitialized(guild_id: int) -> bool:
@@ -29,6 +151,11 @@ def isServerInitialized(guild_id: int) -> bool:
     return ret is not None
 
 
+async def isServerInitializedAsync(guild_id: int) -> bool:
+    ret = await getDatetimeAsync(guild_id, "guild.setup", None)
+    return ret is not None
+
+
 def setupGuildIds(guild_id: int,
                   category_bot_id: int,
                   category_contact_id: int,
@@ -41,28 +168,76 @@ def setupGuildIds(guild_id: int,
                   role_pre_exhibitor_id: int,
                   role_manager_id: int):
 
-    with Database(database=toDBFilepath(guild_id), isolation_level="EXCLUSIVE") as db:
-        db.insert("registry_int", candidate={"title": "guild.id", "itemvalue": guild_id})
-        db.insert("registry_int", candidate={"title": "category.bot.id", "itemvalue": category_bot_id})
-        db.insert("registry_int", candidate={"title": "category.contact.id", "itemvalue": category_contact_id})
-        db.insert("registry_int", candidate={"title": "channel.bot-control.id", "itemvalue": channel_bot_control_id})
-        db.insert("registry_int", candidate={"title": "channel.entry.id", "itemvalue": channel_entry_id})
-        db.insert("registry_int", candidate={"title": "channel.status.id", "itemvalue": channel_status_id})
-        db.insert("registry_int", candidate={"title": "channel.query.id", "itemvalue": channel_query_id})
-        db.insert("registry_int", candidate={"title": "role.bot-admin.id", "itemvalue": role_bot_admin_id})
-        db.insert("registry_int", candidate={"title": "role.pre-exhibitor.id", "itemvalue": role_pre_exhibitor_id})
-        db.insert("registry_int", candidate={"title": "role.exhibitor.id", "itemvalue": role_exhibitor_id})
-        db.insert("registry_int", candidate={"title": "role.manager.id", "itemvalue": role_manager_id})
-        db.insert("registry_datetime", candidate={"title": "guild.setup", "itemvalue": datetime.datetime.now()})
+    setup_at = datetime.datetime.now()
+    ids = {
+        "guild.id": guild_id,
+        "category.bot.id": category_bot_id,
+        "category.contact.id": category_contact_id,
+        "channel.bot-control.id": channel_bot_control_id,
+        "channel.entry.id": channel_entry_id,
+        "channel.status.id": channel_status_id,
+        "channel.query.id": channel_query_id,
+        "role.bot-admin.id": role_bot_admin_id,
+        "role.pre-exhibitor.id": role_pre_exhibitor_id,
+        "role.exhibitor.id": role_exhibitor_id,
+        "role.manager.id": role_manager_id
+    }
+
+    with guildDatabase(guild_id, isolation_level="EXCLUSIVE") as db:
+        db.insertMany("registry_int", [{"title": key, "itemvalue": value} for key, value in ids.items()])
+        db.insert("registry_datetime", candidate={"title": "guild.setup", "itemvalue": setup_at})
 
         db.commit()
 
+    cache = getRegistryCache()
+    for key, value in ids.items():
+        cache.setInt(guild_id, key, value)
+    cache.setDatetime(guild_id, "guild.setup", setup_at)
+
+
+async def setupGuildIdsAsync(guild_id: int,
+                             category_bot_id: int,
+                             category_contact_id: int,
+                             channel_bot_control_id: int,
+                             channel_entry_id: int,
+                             channel_status_id: int,
+                             channel_query_id: int,
+                             role_bot_admin_id: int,
+                             role_exhibitor_id: int,
+                             role_pre_exhibitor_id: int,
+                             role_manager_id: int):
+    await runInExecutor(setupGuildIds,
+                        guild_id=guild_id,
+                        category_bot_id=category_bot_id,
+                        category_contact_id=category_contact_id,
+                        channel_bot_control_id=channel_bot_control_id,
+                        channel_entry_id=channel_entry_id,
+                        channel_status_id=channel_status_id,
+                        channel_query_id=channel_query_id,
+                        role_bot_admin_id=role_bot_admin_id,
+                        role_exhibitor_id=role_exhibitor_id,
+                        role_pre_exhibitor_id=role_pre_exhibitor_id,
+                        role_manager_id=role_manager_id)
+
 
 class Ids:
+    KEYS: List[str] = [
+        "category.bot.id",
+        "category.contact.id",
+        "channel.bot-control.id",
+        "channel.entry.id",
+        "channel.status.id",
+        "channel.query.id",
+        "role.bot-admin.id",
+        "role.pre-exhibitor.id",
+        "role.exhibitor.id",
+        "role.manager.id"
+    ]
+
     def __init__(self, kwargs):
         self.categoryBot = kwargs["category.bot.id"]
         self.categoryContact = kwargs["category.contact.id"]
-        self.channelBotControl = kwargs["category.bot.id"]
+        self.channelBotControl = kwargs["channel.bot-control.id"]
         self.channelEntry = kwargs["channel.entry.id"]
         self.channelStatus = kwargs["channel.status.id"]
         self.channelQuery = kwargs["channel.query.id"]
@@ -73,23 +248,32 @@ class Ids:
 
 
 def getGuildIds(guild_id) -> Ids:
-    with Database(database=toDBFilepath(guild_id)) as db:
-        results = db.search(table="registry_int",
-                            columns=["title", "itemvalue"],
-                            condition={"title": "%.id"})
+    return Ids(getMany(guild_id, Ids.KEYS))
+
+
+async def getGuildIdsAsync(guild_id) -> Ids:
+    return Ids(await getManyAsync(guild_id, Ids.KEYS))
 
-        ret = Ids({r["title"]: r["itemvalue"] for r in results})
-        return ret
+
+def _toPeriod(values: Dict[str, Any], key: str) -> Optional[Tuple[datetime.datetime, datetime.datetime]]:
+    since = values.get(f"{key}.since")
+    until = values.get(f"{key}.until")
+    if since and until:
+        return (since, until)
+    return None
 
 
 def getPeriod(guild_id: int, key: str) -> Optional[Tuple[datetime.datetime, datetime.datetime]]:
-    with Database(database=toDBFilepath(guild_id)) as db:
-        ret_since = db.select("registry_datetime", columns=["itemvalue"], condition={"title": f"{key}.since"})
-        ret_until = db.select("registry_datetime", columns=["itemvalue"], condition={"title": f"{key}.until"})
-        if ret_since and ret_until:
-            return (ret_since[0], ret_until[0])
-        return None
+    return _toPeriod(getMany(guild_id, [f"{key}.since", f"{key}.until"]), key)
 
 
 def getEntryPeriod(guild_id: int) -> Optional[Tuple[datetime.datetime, datetime.datetime]]:
     return getPeriod(guild_id=guild_id, key="schedule.limitation.entry")
+
+
+async def getPeriodAsync(guild_id: int, key: str) -> Optional[Tuple[datetime.datetime, datetime.datetime]]:
+    return _toPeriod(await getManyAsync(guild_id, [f"{key}.since", f"{key}.until"]), key)
+
+
+async def getEntryPeriodAsync(guild_id: int) -> Optional[Tuple[datetime.datetime, datetime.datetime]]:
+    return await getPeriodAsync(guild_id=guild_id, key="schedule.limitation.entry")
@@ -0,0 +1,133 @@
+import datetime
+import threading
+import time
+
+from typing import Optional, Dict
+
+
+class GuildRegistry:
+    """ 1つのギルドのレジストリ（registry_int / registry_datetime）のスナップショット
+    """
+
+    def __init__(self, ints: Dict[str, int], datetimes: Dict[str, datetime.datetime]):
+        self.ints: Dict[str, int] = ints
+        self.datetimes: Dict[str, datetime.datetime] = datetimes
+        self.loaded_at: float = time.monotonic()
+
+
+class RegistryCache:
+    """ ギルドごとのレジストリをメモリ上に保持するキャッシュ
+
+    初回アクセス時にテーブル全体を読み込み、以降はTTLが切れるか明示的に破棄されるまで再利用する。
+    書き込みはDBへのコミット後にキャッシュへも反映する（ライトスルー）。
+    """
+
+    def __init__(self, ttl: int = 300):
+        """ キャッシュを初期化する
+
+        Args:
+            ttl (int): キャッシュの有効秒数. 0以下で無期限
+        """
+        self.__ttl: int = ttl
+        self.__registries: Dict[int, GuildRegistry] = {}
+        self.__generation: int = 0
+        self.__hits: int = 0
+        self.__misses: int = 0
+        self.__lock: threading.Lock = threading.Lock()
+
+    @property
+    def hits(self) -> int:
+        return self.__hits
+
+    @property
+    def misses(self) -> int:
+        return self.__misses
+
+    @property
+    def generation(self) -> int:
+        """ キャッシュの世代を取得する. invalidate()と書き込みの反映のたびに進む
+
+        読み込み開始前に取得しておき、put()に渡すことで、読み込み中に破棄・更新されたキャッシュが古い内容で置き換わるのを防ぐ。
+        """
+        return self.__generation
+
+    def get(self, guild_id: int) -> Optional[GuildRegistry]:
+        """ キャッシュされたレジストリを取得する
+
+        Returns:
+            Optional[GuildRegistry]: キャッシュが存在しない、または期限切れの場合はNone
+        """
+        with self.__lock:
+            registry = self.__registries.get(guild_id)
+            if registry is not None and self.__ttl > 0 and time.monotonic() - registry.loaded_at >= self.__ttl:
+                del self.__registries[guild_id]
+                registry = None
+            if registry is None:
+                self.__misses += 1
+            else:
+                self.__hits += 1
+            return registry
+
+    def put(self, guild_id: int, registry: GuildRegistry, generation: int):
+        """ 読み込んだレジストリをキャッシュする
+
+        Args:
+            guild_id (int): ギルドID
+            registry (GuildRegistry): 読み込んだレジストリ
+            generation (int): 読み込み開始前に取得した世代
+        """
+        with self.__lock:
+            if self.__generation == generation:
+                self.__registries[guild_id] = registry
+
+    def setInt(self, guild_id: int, key: str, value: int):
+        """ キャッシュ済みのレジストリに整数値を反映する
+
+        未キャッシュの場合も世代を進め、書き込み前にデータベースを読んだ読み込みがput()で古い内容をキャッシュしないようにする。
+        """
+        with self.__lock:
+            registry = self.__registries.get(guild_id)
+            if registry is not None:
+                registry.ints[key] = value
+            self.__generation += 1
+
+    def setDatetime(self, guild_id: int, key: str, value: datetime.datetime):
+        """ キャッシュ済みのレジストリに日時を反映する. 世代の扱いはsetInt()と同じ
+        """
+        with self.__lock:
+            registry = self.__registries.get(guild_id)
+            if registry is not None:
+                registry.datetimes[key] = value
+            self.__generation += 1
+
+    def invalidate(self, guild_id: Optional[int] = None):
+        """ キャッシュを破棄する
+
+        Args:
+            guild_id (Optional[int]): 破棄するギルドID. Noneの場合は全て破棄する
+        """
+        with self.__lock:
+            if guild_id is None:
+                self.__registries.clear()
+            else:
+                self.__registries.pop(guild_id, None)
+            self.__generation += 1
+
+
+_cacheInstance: Optional[RegistryCache] = None
+
+
+def setupRegistryCache(ttl: int = 300):
+    """ 共有レジストリキャッシュを作成しなおす
+    """
+    global _cacheInstance
+    _cacheInstance = RegistryCache(ttl=ttl)
+
+
+def getRegistryCache() -> RegistryCache:
+    """ 共有レジストリキャッシュを取得する. 未作成の場合はデフォルト設定で作成する
+    """
+    global _cacheInstance
+    if _cacheInstance is None:
+        _cacheInstance = RegistryCache()
+    return _cacheInstance
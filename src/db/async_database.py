@@ -0,0 +1,169 @@
+import asyncio
+import contextvars
+import functools
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List, Callable, Type
+
+from easy_logging import easy_logging
+from db.database import Database, guildDatabasePath, guildScopeOf
+
+
+_executorInstance: Optional[ThreadPoolExecutor] = None
+
+
+def setupExecutor(max_workers: int = 4, executor_class: Type[ThreadPoolExecutor] = ThreadPoolExecutor):
+    """ データベース操作専用のスレッドプールを作成しなおす
+
+    Args:
+        max_workers (int): ワーカースレッドの最大数
+        executor_class (Type[ThreadPoolExecutor]): スレッドプールのクラス. ベンチマークで処理時間を計測する場合などに差し替える
+    """
+    global _executorInstance
+    shutdownExecutor()
+    _executorInstance = executor_class(max_workers=max_workers, thread_name_prefix="vemt-db")
+
+
+def getExecutor() -> ThreadPoolExecutor:
+    """ データベース操作専用のスレッドプールを取得する. 未作成の場合はデフォルト設定で作成する
+    """
+    global _executorInstance
+    if _executorInstance is None:
+        _executorInstance = ThreadPoolExecutor(thread_name_prefix="vemt-db")
+    return _executorInstance
+
+
+def shutdownExecutor(wait: bool = True):
+    """ データベース操作専用のスレッドプールを終了する
+    """
+    global _executorInstance
+    if _executorInstance is not None:
+        _executorInstance.shutdown(wait=wait)
+        _executorInstance = None
+
+
+async def runInExecutor(func: Callable, *args, **kwargs) -> Any:
+    """ 同期関数をデータベース操作専用のスレッドプールで実行し、完了を待つ
+
+    呼び出し元のコンテキスト変数はワーカースレッドに引き継がれる。
+
+    Args:
+        func (Callable): 実行する関数
+    """
+    loop = asyncio.get_event_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(getExecutor(), functools.partial(context.run, func, *args, **kwargs))
+
+
+@easy_logging(function_trace=True, function_sample_rate=0.1)
+class AsyncDatabase:
+    """ イベントループを止めずにデータベースを操作するためのファサード
+
+    各操作はデータベース専用のスレッドプール上で、それぞれ1つのwithブロック（=1トランザクション）として実行される。
+    """
+
+    def __init__(self, database: str, isolation_level: Optional[str] = None, guild_scope: Optional[int] = None):
+        """ データベースオブジェクトを初期化する。
+
+        Args:
+            database (str): データベースのファイルアドレス
+            isolation_level (str): トランザクションを構築するか. DEFERRED / IMMEDIATE / EXCLUSIVE / None
+            guild_scope (Optional[int]): 基礎関数に自動で付与するギルドID. Database()を参照
+        """
+        assert database != ""
+        self.__database: str = database
+        self.__isolation_level: Optional[str] = isolation_level
+        self.__guild_scope: Optional[int] = guild_scope
+
+    @property
+    def database(self) -> str:
+        """ データベースのファイルパスを取得する
+        """
+        return self.__database
+
+    def __run(self, func: Callable, *args, **kwargs) -> Any:
+        with Database(self.__database, isolation_level=self.__isolation_level, guild_scope=self.__guild_scope) as db:
+            ret = func(db, *args, **kwargs)
+            db.commit()
+            return ret
+
+    async def transaction(self, func: Callable, *args, **kwargs) -> Any:
+        """ 1つのトランザクション内で関数を実行する
+
+        funcの第1引数にはwithブロック内のDatabaseが渡される。正常に終了した場合はコミットされる。
+
+        Args:
+            func (Callable): 実行する関数. func(db, *args, **kwargs)
+
+        Returns:
+            Any: funcの戻り値
+        """
+        return await runInExecutor(self.__run, func, *args, **kwargs)
+
+    async def select(self, table: str, columns: List[str] = ["*"], condition: Dict[str, Any] = {}) -> list:
+        """ Database.select()の非同期版
+        """
+        return await self.transaction(lambda db: db.select(table, columns=columns, condition=condition))
+
+    async def selectIn(self,
+                       table: str,
+                       column: str,
+                       values: List[Any],
+                       columns: List[str] = ["*"],
+                       condition: Dict[str, Any] = {}) -> list:
+        """ Database.selectIn()の非同期版
+        """
+        return await self.transaction(
+            lambda db: db.selectIn(table, column, values, columns=columns, condition=condition))
+
+    async def search(self, table: str, columns: List[str] = ["*"], condition: Dict[str, Any] = {}) -> list:
+        """ Database.search()の非同期版
+        """
+        return await self.transaction(lambda db: db.search(table, columns=columns, condition=condition))
+
+    async def insert(self, table: str, candidate: Dict[str, Any]) -> Optional[int]:
+        """ Database.insert()の非同期版
+        """
+        return await self.transaction(lambda db: db.insert(table, candidate=candidate))
+
+    async def insertMany(self, table: str, rows: List[Dict[str, Any]], request_ids: bool = False) -> List[int]:
+        """ Database.insertMany()の非同期版
+        """
+        return await self.transaction(lambda db: db.insertMany(table, rows=rows, request_ids=request_ids))
+
+    async def upsertMany(self, table: str, rows: List[Dict[str, Any]], request_ids: bool = False) -> List[int]:
+        """ Database.upsertMany()の非同期版
+        """
+        return await self.transaction(lambda db: db.upsertMany(table, rows=rows, request_ids=request_ids))
+
+    async def update(self, table: str, candidate: Dict[str, Any], condition: Dict[str, Any] = {}) -> list:
+        """ Database.update()の非同期版
+        """
+        return await self.transaction(lambda db: db.update(table, candidate=candidate, condition=condition))
+
+    async def insertOrReplace(self, table: str, candidate: Dict[str, Any]) -> list:
+        """ Database.insertOrReplace()の非同期版
+        """
+        return await self.transaction(lambda db: db.insertOrReplace(table, candidate=candidate))
+
+    async def delete(self, table: str, condition: Dict[str, Any] = {}) -> list:
+        """ Database.delete()の非同期版
+        """
+        return await self.transaction(lambda db: db.delete(table, condition=condition))
+
+    async def deleteIn(self, table: str, column: str, values: List[Any], condition: Dict[str, Any] = {}) -> list:
+        """ Database.deleteIn()の非同期版
+        """
+        return await self.transaction(lambda db: db.deleteIn(table, column, values, condition=condition))
+
+
+def asyncGuildDatabase(guild_id: int, isolation_level: Optional[str] = None) -> AsyncDatabase:
+    """ 現在の構成に合わせて、ギルドのデータを扱うAsyncDatabaseを作成する
+
+    Args:
+        guild_id (int): ギルドID
+        isolation_level (str): トランザクションを構築するか. DEFERRED / IMMEDIATE / EXCLUSIVE / None
+    """
+    return AsyncDatabase(guildDatabasePath(guild_id),
+                         isolation_level=isolation_level,
+                         guild_scope=guildScopeOf(guild_id))
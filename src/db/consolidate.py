@@ -0,0 +1,146 @@
+""" per_guild構成（db_<guild_id>.db）のデータベース群を、consolidated構成の1ファイルに移行するツール
+
+IDは移行先で振り直し、他のテーブルのIDを参照する列も新しいIDに付け替える。
+per_guild構成では外部キーを検査していなかったため、参照先が存在しない行はコピーせず、ギルドごとに件数を報告する。
+移行先に既にデータがあるギルドはスキップする。
+
+使い方 (リポジトリのルートで実行):
+    PYTHONPATH=src python -m db.consolidate --source-dir . --dest vemt.db
+"""
+import argparse
+import contextlib
+import logging
+import os
+import re
+import sqlite3
+import sys
+
+from typing import Dict, List, Tuple
+
+from db import schema
+from db.database import Database
+
+
+# 他のテーブルのIDを参照する列. 移行時に新しいIDへ付け替える
+FOREIGN_KEYS: Dict[str, Dict[str, str]] = {
+    "submissions": {"entry_id": "entries"},
+    "results": {"submission_id": "submissions"},
+    "question_choices": {"question_item_id": "question_items"},
+    "questionary_message_ids": {"entry_id": "entries", "question_id": "question_items"},
+    "answers": {"entry_id": "entries", "question_item_id": "question_items"},
+}
+
+_guild_filename = re.compile(r"^db_(\d+)\.db$")
+
+
+def findGuildDatabases(directory: str) -> List[Tuple[int, str]]:
+    """ ディレクトリ内のper_guild構成のデータベースファイルを探す
+
+    Returns:
+        List[Tuple[int, str]]: ギルドIDとファイルパスの組. ギルドIDの昇順
+    """
+    ret: List[Tuple[int, str]] = []
+    for filename in os.listdir(directory):
+        match = _guild_filename.match(filename)
+        if match:
+            ret.append((int(match.group(1)), os.path.join(directory, filename)))
+    ret.sort()
+    return ret
+
+
+def consolidateGuild(dest: Database, source_path: str) -> Tuple[Dict[str, int], Dict[str, int]]:
+    """ 1つのギルドのデータベースの内容を、移行先にコピーする
+
+    参照先が存在しない行（と、その行を参照する行）はコピーせずに数える。
+
+    Args:
+        dest (Database): withブロック内の移行先データベース. 移行するギルドのスコープを指定しておくこと
+        source_path (str): 移行元のデータベースファイルパス
+
+    Returns:
+        Tuple[Dict[str, int], Dict[str, int]]: テーブルごとのコピーした行数と、参照先が無いためコピーしなかった行数
+    """
+    assert dest.guildScope is not None
+    logger: logging.Logger = logging.getLogger("Consolidate")
+    id_maps: Dict[str, Dict[int, int]] = {}
+    counts: Dict[str, int] = {}
+    orphans: Dict[str, int] = {}
+    # 移行元は読むだけなので、コネクションプールを通さずに読み取り専用で開く
+    # （プールで開くとStorageProfileがジャーナルモードをWALに書き換えてしまう）
+    with contextlib.closing(sqlite3.connect("file:{}?mode=ro".format(source_path), uri=True)) as source:
+        source.row_factory = sqlite3.Row
+        # 参照先から順にコピーする
+        for table in reversed(schema.GUILD_TABLES):
+            id_maps[table] = {}
+            counts[table] = 0
+            for row in source.execute("SELECT * FROM {}".format(table)):
+                data = {k: row[k] for k in row.keys()}
+                old_id = data.pop("id", None)
+                missing = None
+                for column, referred_table in FOREIGN_KEYS.get(table, {}).items():
+                    if data[column] is None:
+                        continue
+                    new_ref = id_maps[referred_table].get(data[column])
+                    if new_ref is None:
+                        missing = (column, referred_table)
+                        break
+                    data[column] = new_ref
+                if missing is not None:
+                    logger.warning("Skip orphaned row %s.id=%s : %s=%s is not in %s",
+                                   table, old_id, missing[0], data[missing[0]], missing[1])
+                    orphans[table] = orphans.get(table, 0) + 1
+                    continue
+                new_id = dest.insert(table, candidate=data)
+                if old_id is not None:
+                    id_maps[table][old_id] = new_id
+                counts[table] += 1
+    return counts, orphans
+
+
+def consolidate(sources: List[Tuple[int, str]], dest_path: str) -> Dict[int, Dict[str, int]]:
+    """ per_guild構成のデータベース群を、consolidated構成の1ファイルに移行する
+
+    Args:
+        sources (List[Tuple[int, str]]): ギルドIDと移行元のファイルパスの組
+        dest_path (str): 移行先のファイルパス. 存在しない場合は作成する
+
+    Returns:
+        Dict[int, Dict[str, int]]: ギルドごと、テーブルごとのコピーした行数. スキップしたギルドは含まない.
+            参照先が無いためコピーしなかった行はログに出力する
+    """
+    logger: logging.Logger = logging.getLogger("Consolidate")
+    schema.migrate(dest_path, consolidated=True)
+
+    ret: Dict[int, Dict[str, int]] = {}
+    for guild_id, source_path in sources:
+        with Database(dest_path, isolation_level="EXCLUSIVE", guild_scope=guild_id) as dest:
+            if dest.select("registry_int", columns=["id"]):
+                logger.warning("Skip guild %d : already exists in %s", guild_id, dest_path)
+                continue
+            ret[guild_id], orphans = consolidateGuild(dest, source_path)
+            dest.commit()
+        logger.info("Consolidated guild %d : %s", guild_id,
+                    ", ".join("{}={}".format(k, v) for k, v in ret[guild_id].items() if v))
+        if orphans:
+            logger.warning("Guild %d : skipped %d orphaned rows (%s)", guild_id, sum(orphans.values()),
+                           ", ".join("{}={}".format(k, v) for k, v in orphans.items()))
+    return ret
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move per-guild databases (db_<guild_id>.db) into one database.")
+    parser.add_argument("--source-dir", default=".", type=str, help="directory containing db_<guild_id>.db files")
+    parser.add_argument("--dest", default="vemt.db", type=str, help="filepath of the consolidated database")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="[%(levelname)-7s] %(message)s")
+    sources = findGuildDatabases(args.source_dir)
+    if not sources:
+        print("No guild database found in " + args.source_dir, file=sys.stderr)
+        exit(1)
+    result = consolidate(sources, args.dest)
+    print("Consolidated {} of {} guild databases into {}".format(len(result), len(sources), args.dest))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,122 @@
+import os
+import re
+import time
 import sqlite3
 import logging
+import threading
 
-from typing import Optional, Dict, Any, List
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List, Tuple, Callable
+
+import metrics
+from easy_logging import easy_logging
+from db.pool import ConnectionPool, getConnectionPool
+
+sqlite3.dbapi2.converters['DATETIME'] = sqlite3.dbapi2.converters['TIMESTAMP']
+
+
+class SqlCache:
+    """ 組み立て済みのSQL文を、クエリの形（操作, テーブル, カラム, 条件キー）ごとに保持するLRUキャッシュ
+
+    同じ形のクエリは同じSQL文字列になるため、sqlite3側のステートメントキャッシュも効くようになる。
+    """
+
+    def __init__(self, max_size: int = 256):
+        """ キャッシュを初期化する
+
+        Args:
+            max_size (int): 保持するSQL文の最大数. 0以下でキャッシュしない
+        """
+        self.__max_size: int = max_size
+        self.__sqls: "OrderedDict[Tuple, str]" = OrderedDict()
+        self.__lock: threading.Lock = threading.Lock()
+
+    def get(self, key: Tuple, builder: Callable[[], str]) -> str:
+        """ キャッシュからSQL文を取得する. 無い場合はbuilderで組み立ててキャッシュする
+
+        Args:
+            key (Tuple): クエリの形を表すキー
+            builder (Callable[[], str]): SQL文を組み立てる関数
+        """
+        with self.__lock:
+            sql = self.__sqls.get(key)
+            if sql is not None:
+                self.__sqls.move_to_end(key)
+                return sql
+        sql = builder()
+        if self.__max_size > 0:
+            with self.__lock:
+                self.__sqls[key] = sql
+                while len(self.__sqls) > self.__max_size:
+                    self.__sqls.popitem(last=False)
+        return sql
+
+    def clear(self):
+        with self.__lock:
+            self.__sqls.clear()
+
+    def __len__(self) -> int:
+        return len(self.__sqls)
+
+
+_sqlCache: SqlCache = SqlCache()
+
+
+def setupSqlCache(max_size: int = 256):
+    """ 共有SQLキャッシュを作成しなおす
+    """
+    global _sqlCache
+    _sqlCache = SqlCache(max_size=max_size)
+
+
+def getSqlCache() -> SqlCache:
+    """ 共有SQLキャッシュを取得する
+    """
+    return _sqlCache
+
+
+def _where(keys: Tuple[str, ...], fmt: str) -> str:
+    """ Internal Use.
+    条件キーからWHERE句を組み立てる. キーが無い場合は空文字列
+    """
+    if not keys:
+        return ""
+    return " WHERE " + " AND ".join(fmt.format(k) for k in keys)
+
+
+def _whereIn(keys: Tuple[str, ...], column: str) -> str:
+    """ Internal Use.
+    条件キーと、SELECT_IN_CHUNK個の値を取るIN句からWHERE句を組み立てる
+    """
+    return (_where(keys, "{}=?") + " AND " if keys else " WHERE ") \
+        + "{} IN ({})".format(column, ", ".join("?" * SELECT_IN_CHUNK))
+
+
+_statementOperation = re.compile(r"^\s*(\w+)(\s+OR\s+REPLACE)?", re.IGNORECASE)
+_statementTable = re.compile(r"\b(?:FROM|INTO|UPDATE)\s+['\"`]?(\w+)", re.IGNORECASE)
+_statementLabels: Dict[str, Tuple[str, str]] = {}
+_STATEMENT_LABELS_MAX: int = 1024
+
+
+def _labelsOf(sql_text: str) -> Tuple[str, str]:
+    """ Internal Use.
+    メトリクス用に、SQL文から操作とテーブル名を取り出す. 基礎関数のSQL文は種類が限られるため結果を保持する
+    """
+    labels = _statementLabels.get(sql_text)
+    if labels is None:
+        op = _statementOperation.match(sql_text)
+        table = _statementTable.search(sql_text)
+        operation = op.group(1).lower() if op else "unknown"
+        if op and op.group(2):
+            operation = "insertOrReplace"
+        labels = (operation, table.group(1) if table else "")
+        if len(_statementLabels) < _STATEMENT_LABELS_MAX:
+            _statementLabels[sql_text] = labels
+    return labels
+
+
+# selectIn() / deleteIn()で1度に問い合わせる値の数. SQLiteのバインド変数の上限（古い版では999）より小さくする
+SELECT_IN_CHUNK: int = 500
 
 
 class DatabaseError(Exception):
@@ -9,39 +124,97 @@ class DatabaseError(Exception):
 
 
 def toDBFilepath(guild_id: int) -> str:
+    """ ギルドごとにファイルを分ける構成での、ギルドのデータベースファイルパスを取得する
+    """
     assert type(guild_id)
     return "db_" + str(guild_id) + ".db"
 
 
+BACKEND_PER_GUILD: str = "per_guild"
+BACKEND_CONSOLIDATED: str = "consolidated"
+
+_backend: str = BACKEND_PER_GUILD
+_consolidatedFilepath: str = "vemt.db"
+
+
+def setupBackend(backend: str = BACKEND_PER_GUILD, consolidated_filepath: str = "vemt.db"):
+    """ データベースの構成を設定する
+
+    Args:
+        backend (str): per_guild（ギルドごとにファイルを分ける） / consolidated（全ギルドを1ファイルにまとめる）
+        consolidated_filepath (str): consolidated構成でのデータベースファイルパス
+    """
+    global _backend, _consolidatedFilepath
+    if backend not in (BACKEND_PER_GUILD, BACKEND_CONSOLIDATED):
+        raise ValueError("Invalid database backend '{}'. Choose from {}, {}".format(
+            backend, BACKEND_PER_GUILD, BACKEND_CONSOLIDATED))
+    _backend = backend
+    _consolidatedFilepath = consolidated_filepath
+
+
+def isConsolidated() -> bool:
+    """ 全ギルドを1ファイルにまとめる構成かを取得する
+    """
+    return _backend == BACKEND_CONSOLIDATED
+
+
+def getConsolidatedFilepath() -> str:
+    """ consolidated構成でのデータベースファイルパスを取得する
+    """
+    return _consolidatedFilepath
+
+
+def guildDatabasePath(guild_id: int) -> str:
+    """ 現在の構成で、ギルドのデータが格納されているデータベースファイルパスを取得する
+    """
+    return _consolidatedFilepath if isConsolidated() else toDBFilepath(guild_id)
+
+
+def guildDatabaseExists(guild_id: int) -> bool:
+    """ ギルドのデータベースファイルが存在するかを取得する. 接続するとファイルが作られるため、存在しないギルドを確認するときに使う
+    """
+    return os.path.exists(guildDatabasePath(guild_id))
+
+
+def guildScopeOf(guild_id: int) -> Optional[int]:
+    """ 現在の構成で、Databaseに指定するギルドスコープを取得する. per_guild構成ではNone
+    """
+    return guild_id if isConsolidated() else None
+
+
+@easy_logging(function_trace=True, function_sample_rate=0.1)
 class Database:
 
-    def __init__(self, database: str, isolation_level: Optional[str] = None):
+    def __init__(self, database: str, isolation_level: Optional[str] = None, pool: Optional[ConnectionPool] = None,
+                 guild_scope: Optional[int] = None):
         """ データベースオブジェクトを初期化する。
 
         Args:
             database (str): データベースのファイルアドレス
             isolation_level (str): トランザクションを構築するか. DEFERRED / IMMEDIATE / EXCLUSIVE / None
+            pool (ConnectionPool): コネクションの取得元. Noneの場合は共有プールを使う
+            guild_scope (Optional[int]): 指定した場合、基礎関数の条件と挿入データに guild_id を自動で付与する.
+                consolidated構成で使う. execute()などの任意のSQLには付与されない
         """
         assert type(database), "invalid argument type, database=" + database
         assert database != ""
         self.__database: str = database
         self.__isolation_level: Optional[str] = isolation_level
+        self.__pool: ConnectionPool = pool if pool is not None else getConnectionPool()
+        self.__guild_scope: Optional[int] = guild_scope
         self.__connection: Optional[sqlite3.Connection] = None
         self.__logger: logging.Logger = logging.getLogger(self.__class__.__name__)
 
     def __enter__(self):
-        self.__connection = sqlite3.connect(
-            self.__database,
-            isolation_level=self.__isolation_level,
-            detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES)
-        self.__connection.row_factory = sqlite3.Row
-        sqlite3.dbapi2.converters['DATETIME'] = sqlite3.dbapi2.converters['TIMESTAMP']
+        self.__connection = self.__pool.acquire(self.__database, isolation_level=self.__isolation_level)
         return self
 
     def __exit__(self, exception_type, exception_value, traceback):
-        if exception_value:
-            self.__connection.rollback()
-        self.__connection.close()
+        # 未コミットの変更は返却時にロールバックされる
+        # 制約違反やロック待ち以外のsqliteエラーの場合は、念のためコネクションを破棄する
+        discard = isinstance(exception_value, sqlite3.Error) \
+            and not isinstance(exception_value, (sqlite3.IntegrityError, sqlite3.OperationalError))
+        self.__pool.release(self.__database, self.__connection, discard=discard)
         self.__connection = None
 
     def commit(self):
@@ -69,13 +242,32 @@ class Database:
     def connection(self) -> Optional[sqlite3.Connection]:
         """ データベースコネクションを取得する
 
-        データベースコネクションは、コンストラクタにて取得される
+        データベースコネクションは、withブロックに入った時にプールから取得される
 
         Returns:
             sqlite3.Connection: データベースへのコネクション
         """
         return self.__connection
 
+    @property
+    def guildScope(self) -> Optional[int]:
+        """ ギルドスコープを取得する
+
+        Returns:
+            Optional[int]: 自動で付与するギルドID. スコープなしの場合はNone
+        """
+        return self.__guild_scope
+
+    def __scoped(self, values: Dict[str, Any]) -> Dict[str, Any]:
+        """ Internal Use.
+        ギルドスコープが指定されている場合、guild_idを先頭に付与した辞書を返す
+        """
+        if self.__guild_scope is None:
+            return values
+        ret: Dict[str, Any] = {"guild_id": self.__guild_scope}
+        ret.update(values)
+        return ret
+
     def __execute(self, sql_text: str, bindee: Optional[list] = None, request_last_id: bool = False) -> list:
         """ データベースに対してsqlを実行する
 
@@ -94,15 +286,19 @@ class Database:
         assert len(bindee) > 0 if bindee is not None else True
 
         ret: list = []
+        begin = time.perf_counter()
         try:
             if self.connection is None:
                 raise DatabaseError("No Connection.")
             c = self.connection.cursor()
+            is_debug = self.logger.isEnabledFor(logging.DEBUG)
             if bindee is not None:
-                self.logger.debug("Execute < %s [values=%s]", sql_text, ",".join([str(d) for d in bindee]))
-                c.execute(sql_text, tuple(bindee))
+                if is_debug:
+                    self.logger.debug("Execute < %s [values=%s]", sql_text, ",".join([str(d) for d in bindee]))
+                c.execute(sql_text, bindee)
             else:
-                self.logger.debug("Execute < %s [With no value]", sql_text)
+                if is_debug:
+                    self.logger.debug("Execute < %s [With no value]", sql_text)
                 c.execute(sql_text)
 
             ret = c.fetchall()  # Result Fetch
@@ -114,10 +310,50 @@ class Database:
             c.close()
 
         except sqlite3.Error as e:
+            metrics.DB_ERRORS.inc(*_labelsOf(sql_text))
             self.logger.warning("Failed  > Error has occured. {}: {}".format(type(e), e))
             raise e  # Re-throw
+        metrics.DB_EXECUTE_SECONDS.observe(time.perf_counter() - begin, *_labelsOf(sql_text))
         return ret
 
+    def execute(self, sql_text: str, bindee: Optional[list] = None) -> list:
+        """ 任意のSQLを実行する
+
+        select()などの基礎関数で表現できない、UNIONなどを含むクエリに使う。
+
+        Args:
+            sql_text (str): SQLクエリ
+            bindee (Optional[list]): バインドする値. 空リストはAssertionError
+
+        Exceptions:
+            sqlite3.Error: データベースオペレーションでエラーがあった場合
+
+        Returns:
+            list: 取得結果が格納されたリスト
+        """
+        return self.__execute(sql_text, bindee)
+
+    def executeScript(self, sql_script: str):
+        """ 複数のSQL文からなるスクリプトを実行する
+
+        実行前に未コミットのトランザクションはコミットされる（sqlite3.Connection.executescriptの仕様）。
+
+        Args:
+            sql_script (str): SQLスクリプト
+
+        Exceptions:
+            sqlite3.Error: データベースオペレーションでエラーがあった場合
+        """
+        assert type(sql_script) is str
+        if self.connection is None:
+            raise DatabaseError("No Connection.")
+        self.logger.debug("Execute < (script, %d chars)", len(sql_script))
+        try:
+            self.connection.executescript(sql_script)
+        except sqlite3.Error as e:
+            self.logger.warning("Failed  > Error has occured. {}: {}".format(type(e), e))
+            raise e  # Re-throw
+
     def select(self, table: str, columns: List[str] = ["*"], condition: Dict[str, Any] = {}) -> list:
         """ データベースからデータを取得する基礎関数
 
@@ -136,19 +372,59 @@ class Database:
         assert type(condition) is dict
         assert table != ""
 
-        sql: List[str] = ["SELECT"] + [", ".join(columns)] + ["FROM", table]
-        bindee: Optional[List[Any]] = None
+        condition = self.__scoped(condition)
+        keys = tuple(condition.keys())
+        sql = _sqlCache.get(
+            ("select", table, tuple(columns), keys),
+            lambda: "SELECT {} FROM {}".format(", ".join(columns), table) + _where(keys, "{}=?"))
+        return self.__execute(sql, list(condition.values()) if condition else None)
+
+    def selectIn(self,
+                 table: str,
+                 column: str,
+                 values: List[Any],
+                 columns: List[str] = ["*"],
+                 condition: Dict[str, Any] = {}) -> list:
+        """ 指定したカラムの値が、いずれかの値に一致するデータを取得する基礎関数
+
+        値はSELECT_IN_CHUNK個ずつのIN句に分けて問い合わせる。
+        SQL文の形を揃えるため、最後のまとまりは末尾の値を繰り返して埋める。
 
-        if condition:
-            bindee = []
-            sql.append("WHERE")
-            for cond_k, cond_v in condition.items():
-                sql.append("{}=?".format(cond_k))
-                bindee.append(cond_v)
-                sql.append("AND")
-            sql.pop()  # 一番最後のANDを削除
+        Args:
+            table(str): テーブル名
+            column(str): 値を照合するカラム名
+            values(List[Any]): 照合する値. 重複は取り除かれる
+            columns(List[str]): 取得したいカラム名
+            condition(Dict[str, Any]): 追加の条件
 
-        return self.__execute(" ".join(sql), bindee)
+        Exceptions:
+            sqlite3.Error: データベースオペレーションでエラーがあった場合
+
+        Returns:
+            list: 取得結果が格納されたリスト
+        """
+        assert type(table) is str, table
+        assert type(condition) is dict
+        assert table != ""
+
+        condition = self.__scoped(condition)
+        keys = tuple(condition.keys())
+        sql = _sqlCache.get(
+            ("selectIn", table, tuple(columns), keys, column),
+            lambda: "SELECT {} FROM {}".format(", ".join(columns), table) + _whereIn(keys, column))
+        return self.__executeIn(sql, list(condition.values()), values)
+
+    def __executeIn(self, sql_text: str, bindee: list, values: List[Any]) -> list:
+        """ Internal Use.
+        IN句を持つSQLを、値をSELECT_IN_CHUNK個ずつに分けて実行する
+        """
+        values = list(dict.fromkeys(values))
+        ret: list = []
+        for begin in range(0, len(values), SELECT_IN_CHUNK):
+            chunk = values[begin:begin + SELECT_IN_CHUNK]
+            chunk += [chunk[-1]] * (SELECT_IN_CHUNK - len(chunk))
+            ret += self.__execute(sql_text, bindee + chunk)
+        return ret
 
     def search(self, table: str, columns: List[str] = ["*"], condition: Dict[str, Any] = {}) -> list:
         """ データベースからデータを検索する基礎関数
@@ -168,19 +444,12 @@ class Database:
         assert type(condition) is dict
         assert table != ""
 
-        sql: List[str] = ["SELECT"] + [", ".join(columns)] + ["FROM", table]
-        bindee: Optional[List[Any]] = None
-
-        if condition:
-            bindee = []
-            sql.append("WHERE")
-            for cond_k, cond_v in condition.items():
-                sql.append("{} like ?".format(cond_k))
-                bindee.append(cond_v)
-                sql.append("AND")
-            sql.pop()  # 一番最後のANDを削除
-
-        return self.__execute(" ".join(sql), bindee)
+        condition = self.__scoped(condition)
+        keys = tuple(condition.keys())
+        sql = _sqlCache.get(
+            ("search", table, tuple(columns), keys),
+            lambda: "SELECT {} FROM {}".format(", ".join(columns), table) + _where(keys, "{} like ?"))
+        return self.__execute(sql, list(condition.values()) if condition else None)
 
     def insert(self, table: str, candidate: Dict[str, Any]) -> Optional[int]:
         """ データベースにデータを挿入する基礎関数
@@ -197,17 +466,126 @@ class Database:
         assert type(candidate) is dict
         assert len(candidate) > 0
 
-        sql = ["INSERT", "INTO"]
-        # sql = "INSERT INTO " + table + "("
-        cols = []
-        vals = []
-        for cand_k, cand_v in candidate.items():
-            cols.append(cand_k)
-            vals.append(cand_v)
+        candidate = self.__scoped(candidate)
+        cols = tuple(candidate.keys())
+        sql = _sqlCache.get(
+            ("insert", table, cols),
+            lambda: "INSERT INTO {}({}) VALUES({})".format(table, ", ".join(cols), ", ".join("?" * len(cols))))
+        return self.__execute(sql, list(candidate.values()), request_last_id=True)[0]
+
+    def __executeMany(self, sql_text: str, bindees: List[list], request_ids: bool = False) -> List[int]:
+        """ 複数の値の組に対して、同じSQLを1つのトランザクション内で実行する
+
+        自動コミットモード（isolation_level=None）でトランザクション外の場合は、ここでトランザクションを張ってコミットする。
+        それ以外の場合のコミットは、通常どおり呼び出し元が行う。
+
+        Args:
+            sql_text (str): SQLクエリ
+            bindees (List[list]): 行ごとのバインドする値
+            request_ids (bool): 挿入した行のIDを取得するか. Trueの場合はexecutemanyを使わず1行ずつ実行する
+
+        Exceptions:
+            sqlite3.Error: データベースオペレーションでエラーがあった場合
+
+        Returns:
+            List[int]: 挿入した行のID. request_ids=Falseの場合は空リスト
+        """
+        assert type(sql_text) is str
+        assert type(bindees) is list
+
+        if self.connection is None:
+            raise DatabaseError("No Connection.")
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("Execute < %s [%d rows]", sql_text, len(bindees))
+
+        ret: List[int] = []
+        operation, table = _labelsOf(sql_text)
+        operation += "Many"
+        begin = time.perf_counter()
+        own_transaction = self.connection.isolation_level is None and not self.connection.in_transaction
+        c = self.connection.cursor()
+        try:
+            if own_transaction:
+                c.execute("BEGIN")
+            if request_ids:
+                for bindee in bindees:
+                    c.execute(sql_text, bindee)
+                    ret.append(c.lastrowid)
+            else:
+                c.executemany(sql_text, bindees)
+            if own_transaction:
+                c.execute("COMMIT")
+
+        except sqlite3.Error as e:
+            if own_transaction and self.connection.in_transaction:
+                self.connection.rollback()
+            metrics.DB_ERRORS.inc(operation, table)
+            self.logger.warning("Failed  > Error has occured. {}: {}".format(type(e), e))
+            raise e  # Re-throw
+
+        finally:
+            c.close()
+        metrics.DB_EXECUTE_SECONDS.observe(time.perf_counter() - begin, operation, table)
+        return ret
+
+    def insertMany(self, table: str, rows: List[Dict[str, Any]], request_ids: bool = False) -> List[int]:
+        """ データベースに複数のデータをまとめて挿入する基礎関数
 
-        sql.append("{}({})".format(table, ", ".join(cols)))
-        sql.append("VALUES({})".format(", ".join("?" * len(vals))))
-        return self.__execute(" ".join(sql), vals, request_last_id=True)[0]
+        Args:
+            table(str): テーブル名
+            rows(List[Dict[str, Any]]): カラム名とデータのペア. 全ての行で同じカラムを指定すること
+            request_ids(bool): 挿入した行のIDを取得するか
+
+        Exceptions:
+            sqlite3.Error: データベースオペレーションでエラーがあった場合
+
+        Returns:
+            List[int]: 挿入した行のID. request_ids=Falseの場合は空リスト
+        """
+        assert type(table) is str
+        assert table != ""
+        assert type(rows) is list
+        if not rows:
+            return []
+
+        rows = [self.__scoped(row) for row in rows]
+        cols = tuple(rows[0].keys())
+        assert all(tuple(row.keys()) == cols for row in rows), "all rows must have the same columns"
+        sql = _sqlCache.get(
+            ("insert", table, cols),
+            lambda: "INSERT INTO {}({}) VALUES({})".format(table, ", ".join(cols), ", ".join("?" * len(cols))))
+        return self.__executeMany(sql, [list(row.values()) for row in rows], request_ids=request_ids)
+
+    def upsertMany(self, table: str, rows: List[Dict[str, Any]], request_ids: bool = False) -> List[int]:
+        """ データベースへ複数のデータをまとめて挿入・更新する基礎関数
+
+        insertOrReplace()の複数行版。
+
+        Args:
+            table(str): テーブル名
+            rows(List[Dict[str, Any]]): カラム名とデータのペア. 全ての行で同じカラムを指定すること
+            request_ids(bool): 挿入した行のIDを取得するか
+
+        Exceptions:
+            sqlite3.Error: データベースオペレーションでエラーがあった場合
+
+        Returns:
+            List[int]: 挿入した行のID. request_ids=Falseの場合は空リスト
+        """
+        assert type(table) is str
+        assert table != ""
+        assert type(rows) is list
+        if not rows:
+            return []
+
+        rows = [self.__scoped(row) for row in rows]
+        cols = tuple(rows[0].keys())
+        assert all(tuple(row.keys()) == cols for row in rows), "all rows must have the same columns"
+        sql = _sqlCache.get(
+            ("insertOrReplace", table, cols),
+            lambda: "INSERT OR REPLACE INTO {}({}) VALUES({})".format(
+                table, ", ".join("'{}'".format(c) for c in cols), ", ".join("?" * len(cols))))
+        return self.__executeMany(sql, [list(row.values()) for row in rows], request_ids=request_ids)
 
     def update(self, table: str, candidate: Dict[str, Any], condition: Dict[str, Any] = {}) -> list:
         """ データベースを更新する基礎関数
@@ -229,24 +607,13 @@ class Database:
         assert len(candidate) > 0
         assert type(condition) is dict
 
-        sql = ["UPDATE", table, "SET"]
-
-        cols = []
-        vals = []
-        for cand_k, cand_v in candidate.items():
-            cols.append(cand_k + "=?")
-            vals.append(cand_v)
-        sql.append(", ".join(cols))
-
-        if condition:
-            sql.append("WHERE")
-            for cond_k, cond_v in condition.items():
-                sql.append("`{}`=?".format(cond_k))
-                vals.append(cond_v)
-                sql.append("AND")
-            sql.pop()  # 一番最後のANDを削除
-
-        return self.__execute(" ".join(sql), vals)
+        condition = self.__scoped(condition)
+        cols = tuple(candidate.keys())
+        keys = tuple(condition.keys())
+        sql = _sqlCache.get(
+            ("update", table, cols, keys),
+            lambda: "UPDATE {} SET {}".format(table, ", ".join(c + "=?" for c in cols)) + _where(keys, "`{}`=?"))
+        return self.__execute(sql, list(candidate.values()) + list(condition.values()))
 
     def insertOrReplace(self, table: str, candidate: Dict[str, Any]) -> list:
         """ データベースへ挿入・更新する基礎関数
@@ -269,16 +636,13 @@ class Database:
         assert type(candidate) is dict
         assert len(candidate) > 0
 
-        sql = ["INSERT", "OR", "REPLACE", "INTO"]
-        cols = []
-        vals = []
-        for cand_k, cand_v in candidate.items():
-            cols.append("'{}'".format(cand_k))
-            vals.append(cand_v)
-
-        sql.append("{}({})".format(table, ", ".join(cols)))
-        sql.append("VALUES({})".format(", ".join("?" * len(vals))))
-        return self.__execute(" ".join(sql), vals, request_last_id=True)
+        candidate = self.__scoped(candidate)
+        cols = tuple(candidate.keys())
+        sql = _sqlCache.get(
+            ("insertOrReplace", table, cols),
+            lambda: "INSERT OR REPLACE INTO {}({}) VALUES({})".format(
+                table, ", ".join("'{}'".format(c) for c in cols), ", ".join("?" * len(cols))))
+        return self.__execute(sql, list(candidate.values()), request_last_id=True)
 
     def delete(self, table: str, condition: Dict[str, Any] = {}):
         """ データベースからデータを削除する基礎関数
@@ -293,19 +657,33 @@ class Database:
         Returns:
             list: 取得結果が格納されたリスト
         """
-        sql = ["DELETE", "FROM", table]
-        bindee: Optional[list] = None
+        condition = self.__scoped(condition)
+        keys = tuple(condition.keys())
+        sql = _sqlCache.get(("delete", table, keys), lambda: "DELETE FROM {}".format(table) + _where(keys, "`{}`=?"))
+        return self.__execute(sql, list(condition.values()) if condition else None)
+
+    def deleteIn(self, table: str, column: str, values: List[Any], condition: Dict[str, Any] = {}):
+        """ 指定したカラムの値が、いずれかの値に一致するデータを削除する基礎関数
+
+        Args:
+            table(str): テーブル名
+            column(str): 値を照合するカラム名
+            values(List[Any]): 照合する値. selectIn()と同じく分けて実行する
+            condition(Dict[str, Any]): 追加の条件
 
-        if condition:
-            bindee = []
-            sql.append("WHERE")
-            for cond_k, cond_v in condition.items():
-                sql.append("`{}`=?".format(cond_k))
-                bindee.append(cond_v)
-                sql.append("AND")
-            sql.pop()  # 一番最後のANDを削除
+        Exceptions:
+            sqlite3.Error: データベースオペレーションでエラーがあった場合
+        """
+        assert type(table) is str, table
+        assert type(condition) is dict
+        assert table != ""
 
-        return self.__execute(" ".join(sql), bindee)
+        condition = self.__scoped(condition)
+        keys = tuple(condition.keys())
+        sql = _sqlCache.get(
+            ("deleteIn", table, keys, column),
+            lambda: "DELETE FROM {}".format(table) + _whereIn(keys, column))
+        return self.__executeIn(sql, list(condition.values()), values)
 
     def getLastInsertedId(self) -> int:
         """ 直前に操作したレコードのIDを取得
@@ -316,3 +694,13 @@ class Database:
         if self.__cursor is not None:
             self.__cursor.close()
             self.__cursor = None
+
+
+def guildDatabase(guild_id: int, isolation_level: Optional[str] = None) -> Database:
+    """ 現在の構成に合わせて、ギルドのデータを扱うDatabaseを作成する
+
+    Args:
+        guild_id (int): ギルドID
+        isolation_level (str): トランザクションを構築するか. DEFERRED / IMMEDIATE / EXCLUSIVE / None
+    """
+    return Database(guildDatabasePath(guild_id), isolation_level=isolation_level, guild_scope=guildScopeOf(guild_id))
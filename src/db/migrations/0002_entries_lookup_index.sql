@@ -0,0 +1,4 @@
+-- エントリーをDiscordのユーザーIDとコンタクトチャンネルIDで引くためのインデックス
+
+CREATE INDEX IF NOT EXISTS index_entries_discord_user_id ON entries (discord_user_id);
+CREATE INDEX IF NOT EXISTS index_entries_contact_channel_id ON entries (contact_channel_id);
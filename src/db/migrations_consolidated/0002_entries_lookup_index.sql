@@ -0,0 +1,4 @@
+-- エントリーをDiscordのユーザーIDとコンタクトチャンネルIDで引くためのインデックス
+
+CREATE INDEX IF NOT EXISTS index_entries_guild_id_discord_user_id ON entries (guild_id, discord_user_id);
+CREATE INDEX IF NOT EXISTS index_entries_guild_id_contact_channel_id ON entries (guild_id, contact_channel_id);
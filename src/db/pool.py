@@ -0,0 +1,292 @@
+import sqlite3
+import logging
+import threading
+import time
+
+from collections import OrderedDict
+from typing import Optional, Dict, List
+
+
+class StorageProfile:
+    """ コネクションごとに設定するsqliteのPRAGMA群
+    """
+
+    JOURNAL_MODES = ("DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF")
+    SYNCHRONOUS_LEVELS = ("OFF", "NORMAL", "FULL", "EXTRA")
+    TEMP_STORES = ("DEFAULT", "FILE", "MEMORY")
+
+    def __init__(self,
+                 journal_mode: str = "WAL",
+                 synchronous: str = "NORMAL",
+                 cache_size: int = -8000,
+                 mmap_size: int = 0,
+                 busy_timeout: int = 5000,
+                 temp_store: str = "MEMORY",
+                 foreign_keys: bool = True):
+        """ ストレージ設定を初期化する
+
+        Args:
+            journal_mode (str): ジャーナルモード. WALの場合、書き込み中でも読み込みがブロックされない
+            synchronous (str): ディスクへの同期レベル. OFF / NORMAL / FULL / EXTRA
+            cache_size (int): ページキャッシュの大きさ. 正の値はページ数、負の値はKiB単位
+            mmap_size (int): メモリマップドI/Oに使う最大バイト数. 0で無効
+            busy_timeout (int): ロック待ちの最大ミリ秒
+            temp_store (str): 一時テーブルの格納先. DEFAULT / FILE / MEMORY
+            foreign_keys (bool): 外部キー制約を検査するか. 全てのコネクションで同じ設定にする
+        """
+        # PRAGMAには値をバインドできないため、ここで検証する
+        for name, value, candidates in (("journal_mode", journal_mode, StorageProfile.JOURNAL_MODES),
+                                        ("synchronous", synchronous, StorageProfile.SYNCHRONOUS_LEVELS),
+                                        ("temp_store", temp_store, StorageProfile.TEMP_STORES)):
+            if value.upper() not in candidates:
+                raise ValueError("Invalid {} '{}'. Choose from {}".format(name, value, ", ".join(candidates)))
+        self.journal_mode: str = journal_mode.upper()
+        self.synchronous: str = synchronous.upper()
+        self.cache_size: int = int(cache_size)
+        self.mmap_size: int = int(mmap_size)
+        self.busy_timeout: int = int(busy_timeout)
+        self.temp_store: str = temp_store.upper()
+        self.foreign_keys: bool = bool(foreign_keys)
+
+    def apply(self, connection: sqlite3.Connection):
+        """ コネクションにPRAGMAを設定する
+        """
+        connection.execute("PRAGMA busy_timeout = {}".format(self.busy_timeout))
+        connection.execute("PRAGMA journal_mode = {}".format(self.journal_mode)).fetchall()
+        connection.execute("PRAGMA synchronous = {}".format(self.synchronous))
+        connection.execute("PRAGMA cache_size = {}".format(self.cache_size))
+        connection.execute("PRAGMA mmap_size = {}".format(self.mmap_size)).fetchall()
+        connection.execute("PRAGMA temp_store = {}".format(self.temp_store))
+        connection.execute("PRAGMA foreign_keys = {}".format("ON" if self.foreign_keys else "OFF"))
+
+    def __repr__(self) -> str:
+        return "StorageProfile(journal_mode={}, synchronous={}, cache_size={}, mmap_size={}, busy_timeout={}, " \
+            "temp_store={}, foreign_keys={})".format(self.journal_mode, self.synchronous, self.cache_size,
+                                                     self.mmap_size, self.busy_timeout, self.temp_store,
+                                                     self.foreign_keys)
+
+
+class _PooledDatabase:
+    """ Internal Use.
+    1つのデータベースファイルに対する待機中コネクションの集合
+    """
+
+    def __init__(self):
+        self.idle: List[sqlite3.Connection] = []
+        self.last_used: Dict[int, float] = {}
+        self.in_use: int = 0
+
+
+class ConnectionPool:
+    """ データベースファイルごとにコネクションを保持し、再利用するプール
+
+    データベースファイル（=ギルド）単位で待機中のコネクションを保持する。
+    保持するデータベース数が上限を超えた場合は、最も長く使われていないものから破棄する（LRU）。
+    """
+
+    def __init__(self,
+                 max_databases: int = 64,
+                 max_connections: int = 4,
+                 health_check_interval: int = 30,
+                 statement_cache_size: int = 128,
+                 storage_profile: Optional[StorageProfile] = None):
+        """ コネクションプールを初期化する
+
+        Args:
+            max_databases (int): コネクションを保持するデータベースの最大数
+            max_connections (int): 1つのデータベースにつき保持する待機中コネクションの最大数
+            health_check_interval (int): この秒数以上使われていないコネクションは、再利用前に疎通確認を行う
+            statement_cache_size (int): コネクションごとにsqlite3が保持するプリペアドステートメントの数
+            storage_profile (StorageProfile): 接続時に設定するPRAGMA. Noneの場合はデフォルト設定
+        """
+        assert max_databases > 0
+        assert max_connections > 0
+        self.__max_databases: int = max_databases
+        self.__max_connections: int = max_connections
+        self.__health_check_interval: int = health_check_interval
+        self.__statement_cache_size: int = statement_cache_size
+        self.__storage_profile: StorageProfile = storage_profile if storage_profile is not None else StorageProfile()
+        self.__databases: "OrderedDict[str, _PooledDatabase]" = OrderedDict()
+        self.__lock: threading.Lock = threading.Lock()
+        self.__logger: logging.Logger = logging.getLogger(self.__class__.__name__)
+
+    @property
+    def logger(self) -> logging.Logger:
+        return self.__logger
+
+    def __connect(self, database: str) -> sqlite3.Connection:
+        connection = sqlite3.connect(
+            database,
+            detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES,
+            cached_statements=self.__statement_cache_size,
+            check_same_thread=False)
+        connection.row_factory = sqlite3.Row
+        try:
+            self.__storage_profile.apply(connection)
+        except sqlite3.Error:
+            connection.close()
+            raise
+        self.logger.debug("Connected > %s", database)
+        return connection
+
+    def __isHealthy(self, connection: sqlite3.Connection) -> bool:
+        try:
+            connection.execute("SELECT 1").fetchall()
+            return True
+        except sqlite3.Error as e:
+            self.logger.warning("Health check failed. {}: {}".format(type(e), e))
+            return False
+
+    def __evict(self):
+        """ Internal Use.
+        上限を超えたデータベースを、使用中でないものから古い順に破棄する。ロック取得済みであること
+        """
+        for database in list(self.__databases.keys()):
+            if len(self.__databases) <= self.__max_databases:
+                break
+            pooled = self.__databases[database]
+            if pooled.in_use > 0:
+                continue
+            for connection in pooled.idle:
+                connection.close()
+            del self.__databases[database]
+            self.logger.debug("Evicted > %s", database)
+
+    def acquire(self, database: str, isolation_level: Optional[str] = None) -> sqlite3.Connection:
+        """ コネクションを取得する
+
+        待機中のコネクションがあれば再利用し、なければ新規に接続する。
+
+        Args:
+            database (str): データベースのファイルアドレス
+            isolation_level (str): トランザクションを構築するか. DEFERRED / IMMEDIATE / EXCLUSIVE / None
+
+        Returns:
+            sqlite3.Connection: データベースへのコネクション
+        """
+        connection: Optional[sqlite3.Connection] = None
+        last_used: float = 0.0
+        with self.__lock:
+            pooled = self.__databases.get(database)
+            if pooled is None:
+                pooled = _PooledDatabase()
+                self.__databases[database] = pooled
+            self.__databases.move_to_end(database)
+            if pooled.idle:
+                connection = pooled.idle.pop()
+                last_used = pooled.last_used.pop(id(connection), 0.0)
+            pooled.in_use += 1
+            self.__evict()
+
+        try:
+            if connection is not None and time.monotonic() - last_used >= self.__health_check_interval:
+                if not self.__isHealthy(connection):
+                    connection.close()
+                    connection = None
+            if connection is None:
+                connection = self.__connect(database)
+            connection.isolation_level = isolation_level
+        except Exception:
+            with self.__lock:
+                pooled.in_use -= 1
+            raise
+        return connection
+
+    def release(self, database: str, connection: sqlite3.Connection, discard: bool = False):
+        """ 取得したコネクションをプールに返却する
+
+        未コミットのトランザクションはロールバックされる。
+
+        Args:
+            database (str): データベースのファイルアドレス
+            connection (sqlite3.Connection): acquire()で取得したコネクション
+            discard (bool): Trueの場合、プールに戻さずに切断する
+        """
+        if not discard:
+            try:
+                if connection.in_transaction:
+                    connection.rollback()
+            except sqlite3.Error as e:
+                self.logger.warning("Failed to rollback. {}: {}".format(type(e), e))
+                discard = True
+
+        with self.__lock:
+            pooled = self.__databases.get(database)
+            if pooled is not None:
+                pooled.in_use -= 1
+                if not discard and len(pooled.idle) < self.__max_connections:
+                    pooled.idle.append(connection)
+                    pooled.last_used[id(connection)] = time.monotonic()
+                    return
+        connection.close()
+
+    def invalidate(self, database: str):
+        """ 指定したデータベースの待機中コネクションを全て切断する
+
+        Args:
+            database (str): データベースのファイルアドレス
+        """
+        with self.__lock:
+            pooled = self.__databases.get(database)
+            if pooled is None:
+                return
+            for connection in pooled.idle:
+                connection.close()
+            pooled.idle.clear()
+            pooled.last_used.clear()
+            if pooled.in_use == 0:
+                del self.__databases[database]
+
+    def closeAll(self):
+        """ 待機中のコネクションを全て切断する
+        """
+        with self.__lock:
+            for pooled in self.__databases.values():
+                for connection in pooled.idle:
+                    connection.close()
+                pooled.idle.clear()
+                pooled.last_used.clear()
+            self.__databases = OrderedDict(
+                (database, pooled) for database, pooled in self.__databases.items() if pooled.in_use > 0)
+
+    @property
+    def storageProfile(self) -> StorageProfile:
+        return self.__storage_profile
+
+    @property
+    def databases(self) -> List[str]:
+        """ コネクションを保持しているデータベースの一覧を、使われた順（古い順）に取得する
+        """
+        with self.__lock:
+            return list(self.__databases.keys())
+
+
+_poolInstance: Optional[ConnectionPool] = None
+
+
+def setupConnectionPool(max_databases: int = 64,
+                        max_connections: int = 4,
+                        health_check_interval: int = 30,
+                        statement_cache_size: int = 128,
+                        storage_profile: Optional[StorageProfile] = None):
+    """ 共有コネクションプールを作成しなおす
+
+    既存のプールが保持していたコネクションは切断される。
+    """
+    global _poolInstance
+    if _poolInstance is not None:
+        _poolInstance.closeAll()
+    _poolInstance = ConnectionPool(max_databases=max_databases,
+                                   max_connections=max_connections,
+                                   health_check_interval=health_check_interval,
+                                   statement_cache_size=statement_cache_size,
+                                   storage_profile=storage_profile)
+
+
+def getConnectionPool() -> ConnectionPool:
+    """ 共有コネクションプールを取得する. 未作成の場合はデフォルト設定で作成する
+    """
+    global _poolInstance
+    if _poolInstance is None:
+        _poolInstance = ConnectionPool()
+    return _poolInstance
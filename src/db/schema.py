@@ -0,0 +1,180 @@
+import asyncio
+import logging
+import os
+import re
+
+from typing import List, Tuple, Iterable, Optional
+
+from db.database import Database, toDBFilepath, isConsolidated, getConsolidatedFilepath
+from db.async_database import runInExecutor
+from db.pool import ConnectionPool
+
+
+# バージョン1（基準スキーマ）. 既存のテーブルを全て削除して作り直す
+BASE_SCHEME_PATH: str = os.path.join(os.path.dirname(__file__), "scheme.sql")
+
+# バージョン2以降の差分. "0002_add_something.sql" のように、先頭の数字がバージョンになる
+# 基準スキーマからの作り直しで再実行されるため、CREATE文には IF NOT EXISTS を付けること
+# 各ファイルはバージョンの更新と同じトランザクションで実行するため、BEGIN / COMMITやPRAGMA foreign_keysは書かないこと
+MIGRATION_DIR: str = os.path.join(os.path.dirname(__file__), "migrations")
+
+# consolidated構成（全ギルドを1ファイルにまとめる）の基準スキーマと差分
+CONSOLIDATED_SCHEME_PATH: str = os.path.join(os.path.dirname(__file__), "scheme_consolidated.sql")
+CONSOLIDATED_MIGRATION_DIR: str = os.path.join(os.path.dirname(__file__), "migrations_consolidated")
+
+# ギルドのデータを持つテーブル. 外部キーの参照元から順に並べる（この順で削除できる）
+GUILD_TABLES: List[str] = [
+    "answers",
+    "questionary_message_ids",
+    "question_choices",
+    "results",
+    "submissions",
+    "question_items",
+    "entries",
+    "registry_datetime",
+    "registry_string",
+    "registry_int"
+]
+
+_migration_filename = re.compile(r"^(\d+)_[\w\-]+\.sql$")
+
+
+def getMigrations(consolidated: bool = False) -> List[Tuple[int, str]]:
+    """ 適用するマイグレーションの一覧を取得する
+
+    Args:
+        consolidated (bool): consolidated構成のマイグレーションを取得するか
+
+    Returns:
+        List[Tuple[int, str]]: バージョンとSQLファイルパスの組. バージョンの昇順
+    """
+    base_path = CONSOLIDATED_SCHEME_PATH if consolidated else BASE_SCHEME_PATH
+    migration_dir = CONSOLIDATED_MIGRATION_DIR if consolidated else MIGRATION_DIR
+
+    ret: List[Tuple[int, str]] = [(1, base_path)]
+    if os.path.isdir(migration_dir):
+        for filename in os.listdir(migration_dir):
+            match = _migration_filename.match(filename)
+            if match and int(match.group(1)) > 1:
+                ret.append((int(match.group(1)), os.path.join(migration_dir, filename)))
+    ret.sort()
+    assert len(set(v for v, _ in ret)) == len(ret), "duplicated migration version"
+    return ret
+
+
+def getLatestVersion(consolidated: bool = False) -> int:
+    """ 最新のスキーマバージョンを取得する
+    """
+    return getMigrations(consolidated)[-1][0]
+
+
+def getVersion(db: Database) -> int:
+    """ データベースのスキーマバージョンを取得する
+
+    user_versionが未設定でもテーブルが存在する場合は、sqlite3コマンドで作成された旧来のデータベースとみなし、バージョン1とする。
+
+    Args:
+        db (Database): withブロック内のデータベース
+    """
+    version: int = db.execute("PRAGMA user_version")[0][0]
+    if version == 0 and db.select("sqlite_master", columns=["name"], condition={"type": "table", "name": "entries"}):
+        version = 1
+    return version
+
+
+def migrate(database: str,
+            recreate: bool = False,
+            pool: Optional[ConnectionPool] = None,
+            consolidated: bool = False) -> int:
+    """ データベースのスキーマを最新バージョンまで更新する
+
+    Args:
+        database (str): データベースのファイルアドレス
+        recreate (bool): Trueの場合、既存のテーブルを削除して基準スキーマから作り直す
+        pool (ConnectionPool): コネクションの取得元. Noneの場合は共有プールを使う
+        consolidated (bool): consolidated構成のデータベースか. 全ギルドのデータを持つため、recreateはできない
+
+    Exceptions:
+        sqlite3.Error: データベースオペレーションでエラーがあった場合
+
+    Returns:
+        int: 更新後のスキーマバージョン
+    """
+    assert not (recreate and consolidated), "consolidated database cannot be recreated"
+    logger: logging.Logger = logging.getLogger("Schema")
+    with Database(database=database, pool=pool) as db:
+        version = 0 if recreate else getVersion(db)
+        for migration_version, path in getMigrations(consolidated):
+            if migration_version <= version:
+                continue
+            logger.info("Migrate %s : version %d -> %d", database, version, migration_version)
+            with open(path, mode="r", encoding="utf-8") as f:
+                script = f.read()
+            # 途中で失敗してもスキーマが中途半端にならないよう、バージョンの更新まで1つのトランザクションで実行する.
+            # テーブルを作り直す間は外部キーの検査をコミットまで遅らせる（トランザクションの終了で元に戻る）
+            db.executeScript("BEGIN;\nPRAGMA defer_foreign_keys = ON;\n{}\nPRAGMA user_version = {};\nCOMMIT;".format(
+                script, migration_version))
+            version = migration_version
+    return version
+
+
+async def migrateAsync(database: str, recreate: bool = False, consolidated: bool = False) -> int:
+    """ migrate()の非同期版. データベース専用のスレッドプールで実行する
+    """
+    return await runInExecutor(migrate, database, recreate, None, consolidated)
+
+
+async def provisionAll(databases: Iterable[str], recreate: bool = False) -> List[int]:
+    """ 複数のデータベースのスキーマを並行して最新バージョンまで更新する
+
+    Args:
+        databases (Iterable[str]): データベースのファイルアドレス
+        recreate (bool): Trueの場合、既存のテーブルを削除して基準スキーマから作り直す
+
+    Returns:
+        List[int]: それぞれの更新後のスキーマバージョン
+    """
+    return await asyncio.gather(*[migrateAsync(database, recreate) for database in databases])
+
+
+def setupGuild(guild_id: int) -> int:
+    """ 現在の構成に合わせて、ギルドのデータベースを空の初期状態にする
+
+    per_guild構成ではファイルごと基準スキーマから作り直し、consolidated構成ではギルドの行だけを削除する。
+
+    Args:
+        guild_id (int): ギルドID
+
+    Returns:
+        int: スキーマバージョン
+    """
+    if not isConsolidated():
+        return migrate(toDBFilepath(guild_id), recreate=True)
+
+    version = migrate(getConsolidatedFilepath(), consolidated=True)
+    with Database(getConsolidatedFilepath(), isolation_level="EXCLUSIVE", guild_scope=guild_id) as db:
+        for table in GUILD_TABLES:
+            db.delete(table)
+        db.commit()
+    return version
+
+
+async def setupGuildAsync(guild_id: int) -> int:
+    """ setupGuild()の非同期版. データベース専用のスレッドプールで実行する
+    """
+    return await runInExecutor(setupGuild, guild_id)
+
+
+async def upgradeGuilds(guild_ids: Iterable[int]) -> List[int]:
+    """ 現在の構成に合わせて、作成済みのデータベースを最新のスキーマに更新する
+
+    Args:
+        guild_ids (Iterable[int]): ギルドID. per_guild構成では、データベースファイルが存在するものだけを更新する
+
+    Returns:
+        List[int]: 更新したデータベースごとのスキーマバージョン
+    """
+    if isConsolidated():
+        return [await migrateAsync(getConsolidatedFilepath(), consolidated=True)]
+    return await provisionAll([toDBFilepath(guild_id) for guild_id in guild_ids
+                               if os.path.exists(toDBFilepath(guild_id))])
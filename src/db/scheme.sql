@@ -1,4 +1,3 @@
-PRAGMA foreign_keys = OFF;
 DROP TABLE IF EXISTS answers;
 DROP TABLE IF EXISTS question_choices;
 DROP TABLE IF EXISTS question_items;
@@ -10,8 +9,6 @@ DROP TABLE IF EXISTS registry_string;
 DROP TABLE IF EXISTS registry_datetime;
 DROP TABLE IF EXISTS questionary_message_ids;
 
-PRAGMA foreign_keys = ON;
-
 CREATE TABLE registry_int (
         id INTEGER NOT NULL,
         title TEXT UNIQUE NOT NULL,
@@ -149,7 +146,6 @@ CREATE TRIGGER trigger_answers_updated_at AFTER UPDATE ON answers BEGIN
         UPDATE answers SET updated_at = DATETIME('NOW', 'LOCALTIME') WHERE rowid == NEW.rowid;
 END;
 
-BEGIN;
 
 --INSERT INTO entries (id, discord_user_id, current_phase_id, contact_channel_id, questionary_message_id)
 --VALUES
@@ -176,4 +172,3 @@ BEGIN;
 --        (1, 1, "hermitttttt"),
 --        (1, 2, "4 x 8 x 5")
 --;
-COMMIT;
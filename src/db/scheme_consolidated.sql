@@ -0,0 +1,161 @@
+-- 全ギルドを1つのデータベースにまとめる構成のスキーマ
+-- 全てのテーブルは guild_id で分割され、ギルド単位の検索には guild_id を先頭にした複合インデックスを使う
+
+CREATE TABLE IF NOT EXISTS registry_int (
+        id INTEGER NOT NULL,
+        guild_id INTEGER NOT NULL,
+        title TEXT NOT NULL,
+        itemvalue INTEGER NULL,
+        created_at DATETIME NOT NULL DEFAULT (DATETIME('NOW', 'LOCALTIME')),
+        updated_at DATETIME NOT NULL DEFAULT (DATETIME('NOW', 'LOCALTIME')),
+        PRIMARY KEY (id),
+        UNIQUE (guild_id, title)
+);
+CREATE TRIGGER IF NOT EXISTS trigger_registry_int_updated_at AFTER UPDATE ON registry_int BEGIN
+        UPDATE registry_int SET updated_at = DATETIME('NOW', 'LOCALTIME') WHERE rowid == NEW.rowid;
+END;
+
+CREATE TABLE IF NOT EXISTS registry_string (
+        id INTEGER NOT NULL,
+        guild_id INTEGER NOT NULL,
+        title TEXT NOT NULL,
+        itemvalue TEXT NULL,
+        created_at DATETIME NOT NULL DEFAULT (DATETIME('NOW', 'LOCALTIME')),
+        updated_at DATETIME NOT NULL DEFAULT (DATETIME('NOW', 'LOCALTIME')),
+        PRIMARY KEY (id),
+        UNIQUE (guild_id, title)
+);
+CREATE TRIGGER IF NOT EXISTS trigger_registry_string_updated_at AFTER UPDATE ON registry_string BEGIN
+        UPDATE registry_string SET updated_at = DATETIME('NOW', 'LOCALTIME') WHERE rowid == NEW.rowid;
+END;
+
+CREATE TABLE IF NOT EXISTS registry_datetime (
+        id INTEGER NOT NULL,
+        guild_id INTEGER NOT NULL,
+        title TEXT NOT NULL,
+        itemvalue DATETIME NULL,
+        created_at DATETIME NOT NULL DEFAULT (DATETIME('NOW', 'LOCALTIME')),
+        updated_at DATETIME NOT NULL DEFAULT (DATETIME('NOW', 'LOCALTIME')),
+        PRIMARY KEY (id),
+        UNIQUE (guild_id, title)
+);
+CREATE TRIGGER IF NOT EXISTS trigger_registry_datetime_updated_at AFTER UPDATE ON registry_datetime BEGIN
+        UPDATE registry_datetime SET updated_at = DATETIME('NOW', 'LOCALTIME') WHERE rowid == NEW.rowid;
+END;
+
+-- entries
+
+CREATE TABLE IF NOT EXISTS entries (
+        id INTEGER NOT NULL,
+        guild_id INTEGER NOT NULL,
+        discord_user_id INTEGER NOT NULL,
+        current_phase_id INTEGER NOT NULL DEFAULT 1,
+        contact_channel_id INTEGER NOT NULL,
+        is_on_progress INTEGER NOT NULL DEFAULT 0,
+        created_at DATETIME NOT NULL DEFAULT (DATETIME('NOW', 'LOCALTIME')),
+        updated_at DATETIME NOT NULL DEFAULT (DATETIME('NOW', 'LOCALTIME')),
+        PRIMARY KEY (id),
+        CHECK (is_on_progress IN (0, 1))
+);
+CREATE INDEX IF NOT EXISTS index_entries_guild_id ON entries (guild_id, id);
+CREATE TRIGGER IF NOT EXISTS trigger_entries_updated_at AFTER UPDATE ON entries BEGIN
+        UPDATE entries SET updated_at = DATETIME('NOW', 'LOCALTIME') WHERE rowid == NEW.rowid;
+END;
+
+CREATE TABLE IF NOT EXISTS submissions (
+        id INTEGER NOT NULL,
+        guild_id INTEGER NOT NULL,
+        entry_id INTEGER NOT NULL,
+        package_url TEXT NOT NULL,
+        current_phase INTEGER NOT NULL,
+        created_at DATETIME NOT NULL DEFAULT (DATETIME('NOW', 'LOCALTIME')),
+        updated_at DATETIME NOT NULL DEFAULT (DATETIME('NOW', 'LOCALTIME')),
+        PRIMARY KEY (id),
+        FOREIGN KEY (entry_id) REFERENCES entries (id) ON UPDATE RESTRICT ON DELETE RESTRICT
+);
+CREATE INDEX IF NOT EXISTS index_submissions_guild_id_entry_id ON submissions (guild_id, entry_id);
+CREATE TRIGGER IF NOT EXISTS trigger_submissions_updated_at AFTER UPDATE ON submissions BEGIN
+        UPDATE submissions SET updated_at = DATETIME('NOW', 'LOCALTIME') WHERE rowid == NEW.rowid;
+END;
+
+CREATE TABLE IF NOT EXISTS results (
+        id INTEGER NOT NULL,
+        guild_id INTEGER NOT NULL,
+        submission_id INTEGER NOT NULL,
+        as_phase INTEGER NOT NULL,
+        is_passed BOOLEAN NOT NULL,
+        log_text TEXT NOT NULL,
+        created_at DATETIME NOT NULL DEFAULT (DATETIME('NOW', 'LOCALTIME')),
+        PRIMARY KEY (id),
+        FOREIGN KEY (submission_id) REFERENCES submissions (id)  ON UPDATE RESTRICT ON DELETE RESTRICT,
+        CHECK (is_passed IN (0, 1))
+);
+CREATE INDEX IF NOT EXISTS index_results_guild_id_submission_id ON results (guild_id, submission_id);
+
+CREATE TABLE IF NOT EXISTS question_items (
+        id INTEGER NOT NULL,
+        guild_id INTEGER NOT NULL,
+        header_jp TEXT NOT NULL,
+        header_en TEXT NULL,
+        header_ko TEXT NULL,
+        detail_jp TEXT NOT NULL,
+        detail_en TEXT NULL,
+        detail_ko TEXT NULL,
+        nargs_string TEXT NULL,
+        valid_type INT NOT NULL,
+        regex TEXT NOT NULL,
+        max_length INTEGER NOT NULL,
+        required_when_phase INTEGER NULL,
+        allow_multiline BOOLEAN NOT NULL,
+        is_required BOOLEAN NOT NULL,
+        key_string TEXT NULL,
+        min_numeric FLOAT NULL,
+        max_numeric FLOAT NULL,
+        created_at DATETIME NOT NULL DEFAULT (DATETIME('NOW', 'LOCALTIME')),
+        PRIMARY KEY (id),
+        CHECK (allow_multiline IN (0, 1)),
+        CHECK (is_required IN (0, 1))
+);
+CREATE INDEX IF NOT EXISTS index_question_items_guild_id ON question_items (guild_id, id);
+
+CREATE TABLE IF NOT EXISTS question_choices (
+        id INTEGER NOT NULL,
+        guild_id INTEGER NOT NULL,
+        question_item_id INTEGER NOT NULL,
+        itemvalue TEXT NOT NULL,
+        created_at DATETIME NOT NULL DEFAULT (DATETIME('NOW', 'LOCALTIME')),
+        PRIMARY KEY (id),
+        FOREIGN KEY (question_item_id) REFERENCES question_items (id)  ON UPDATE RESTRICT ON DELETE RESTRICT
+);
+CREATE INDEX IF NOT EXISTS index_question_choices_guild_id_question_item_id
+        ON question_choices (guild_id, question_item_id);
+
+CREATE TABLE IF NOT EXISTS questionary_message_ids (
+        message_id INTEGER NOT NULL,
+        guild_id INTEGER NOT NULL,
+        entry_id INTEGER NOT NULL,
+        question_id INTEGER NOT NULL,
+        PRIMARY KEY (message_id),
+        FOREIGN KEY (entry_id) REFERENCES entries (id) ON UPDATE RESTRICT ON DELETE RESTRICT,
+        FOREIGN KEY (question_id) REFERENCES question_items (id) ON UPDATE RESTRICT ON DELETE RESTRICT
+);
+CREATE INDEX IF NOT EXISTS index_questionary_message_ids_guild_id_entry_id
+        ON questionary_message_ids (guild_id, entry_id);
+
+CREATE TABLE IF NOT EXISTS answers (
+        id INTEGER NOT NULL,
+        guild_id INTEGER NOT NULL,
+        entry_id INTEGER NOT NULL,
+        question_item_id INTEGER NOT NULL,
+        item_value TEXT NULL DEFAULT NULL,
+        message_id INTEGER NOT NULL,
+        created_at DATETIME NOT NULL DEFAULT (DATETIME('NOW', 'LOCALTIME')),
+        updated_at DATETIME NOT NULL DEFAULT (DATETIME('NOW', 'LOCALTIME')),
+        PRIMARY KEY (id),
+        FOREIGN KEY (entry_id) REFERENCES entries (id) ON UPDATE RESTRICT ON DELETE RESTRICT,
+        FOREIGN KEY (question_item_id) REFERENCES question_items (id) ON UPDATE RESTRICT ON DELETE RESTRICT
+);
+CREATE INDEX IF NOT EXISTS index_answers_guild_id_entry_id ON answers (guild_id, entry_id);
+CREATE TRIGGER IF NOT EXISTS trigger_answers_updated_at AFTER UPDATE ON answers BEGIN
+        UPDATE answers SET updated_at = DATETIME('NOW', 'LOCALTIME') WHERE rowid == NEW.rowid;
+END;
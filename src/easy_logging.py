@@ -1,8 +1,16 @@
+import os
 import sys
+import time
+import queue
+import atexit
+import asyncio
 import logging
+import logging.handlers
 import tempfile
-from datetime import datetime
-from typing import Optional
+import functools
+import itertools
+import threading
+from typing import Dict, List, Optional, Tuple
 
 
 def __to_print_string_value(value) -> str:
@@ -20,35 +28,181 @@ def __to_print_string_value(value) -> str:
     return str(value)[:200]
 
 
-def __func_logging(cls_, func):
+def __format_args(func, args, kwargs) -> str:
+    """ Internal Use.
+    ログ出力用に引数を文字列にする関数
+    """
+    arg_dict = {func.__code__.co_varnames[i]: args[i] for i in range(min(len(args), func.__code__.co_argcount))}
+    arg_dict.update(kwargs)
+    if func.__name__ == "__init__":
+        if "self" in arg_dict:
+            arg_dict["self"] = "<self>"
+        elif "cls" in arg_dict:
+            arg_dict["cls"] = "<cls>"
+
+    return ", ".join(["{}={}".format(k, __to_print_string_value(arg_dict[k]))
+                      for k in func.__code__.co_varnames[:func.__code__.co_argcount]
+                      if k in arg_dict])
+
+
+class TraceStats:
+    """ トレースしたメンバ関数の呼び出し回数と所要時間
+
+    callsは全ての呼び出し回数, sampled以降はサンプリングした呼び出しだけを計測した値.
+    """
+    __slots__ = ("calls", "sampled", "total", "max")
+
+    def __init__(self):
+        self.calls: int = 0
+        self.sampled: int = 0
+        self.total: float = 0.0
+        self.max: float = 0.0
+
+    @property
+    def mean(self) -> float:
+        """ サンプリングした呼び出しの平均所要時間（秒）
+        """
+        return self.total / self.sampled if self.sampled else 0.0
+
+    @property
+    def estimatedTotal(self) -> float:
+        """ 全ての呼び出しの所要時間の合計の推定値（秒）
+        """
+        return self.mean * self.calls
+
+
+_trace_stats: Dict[str, TraceStats] = {}
+_trace_stats_lock: threading.Lock = threading.Lock()
+
+
+def __func_logging(cls_, func, log_level: int, sample_interval: int):
     """ Internal Use.
     メンバ関数をラップするロギング関数
+
+    sample_interval回に1回だけ所要時間を計測し, ログレベルが有効な場合は開始と終了をログに出力する.
+    引数の文字列化は, ログに出力する場合にだけ行う.
     """
+    logger = cls_.logger
+    if not isinstance(logger, logging.Logger):
+        # loggerをプロパティで定義しているクラス
+        logger = logging.getLogger(cls_.__name__)
+    with _trace_stats_lock:
+        stats = _trace_stats.setdefault(func.__qualname__, TraceStats())
+    counter = itertools.count()
+
+    def count():
+        # 複数のスレッドから呼ばれるため、他の値と同じくロックの中で数える
+        with _trace_stats_lock:
+            stats.calls += 1
+
+    def record(elapsed: float):
+        with _trace_stats_lock:
+            stats.sampled += 1
+            stats.total += elapsed
+            if elapsed > stats.max:
+                stats.max = elapsed
+
+    if asyncio.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            count()
+            if next(counter) % sample_interval:
+                return await func(*args, **kwargs)
+
+            log = logger.isEnabledFor(log_level)
+            if log:
+                logger.log(log_level, "START  %s(%s)", func.__qualname__, __format_args(func, args, kwargs))
+            begin = time.perf_counter()
+            try:
+                retval = await func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - begin
+                record(elapsed)
+            if log:
+                logger.log(log_level, "FINISH %s(...) -> %s (%.3f ms)", func.__qualname__, retval, elapsed * 1000)
+            return retval
+        return async_wrapper
+
+    @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        arg_dict = {func.__code__.co_varnames[i]: args[i] for i in range(len(args))}
-        arg_dict.update(kwargs)
-        if func.__name__ == "__init__":
-            if "self" in arg_dict:
-                arg_dict["self"] = "<self>"
-            elif "cls" in arg_dict:
-                arg_dict["cls"] = "<cls>"
-
-        args_str = ", ".join(["{}={}".format(k, __to_print_string_value(arg_dict[k]))
-                              for k in func.__code__.co_varnames[:func.__code__.co_argcount]
-                              if k in arg_dict])
-
-        cls_.logger.log(cls_.__function_log_level,
-                        "START  {}({})".format(func.__qualname__, args_str))
-
-        retval = func(*args, **kwargs)
-
-        args_str = ""
-        cls_.logger.log(cls_.__function_log_level,
-                        "FINISH {}(...) -> {}".format(func.__qualname__, retval))
+        count()
+        if next(counter) % sample_interval:
+            return func(*args, **kwargs)
+
+        log = logger.isEnabledFor(log_level)
+        if log:
+            logger.log(log_level, "START  %s(%s)", func.__qualname__, __format_args(func, args, kwargs))
+        begin = time.perf_counter()
+        try:
+            retval = func(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - begin
+            record(elapsed)
+        if log:
+            logger.log(log_level, "FINISH %s(...) -> %s (%.3f ms)", func.__qualname__, retval, elapsed * 1000)
         return retval
     return wrapper
 
 
+def getTraceStats() -> Dict[str, TraceStats]:
+    """ トレースしたメンバ関数ごとの呼び出し回数と所要時間を取得する
+
+    Returns:
+        Dict[str, TraceStats]: 関数の修飾名と、その時点の値のコピー
+    """
+    ret: Dict[str, TraceStats] = {}
+    with _trace_stats_lock:
+        for name, stats in _trace_stats.items():
+            copied = TraceStats()
+            copied.calls, copied.sampled, copied.total, copied.max = stats.calls, stats.sampled, stats.total, stats.max
+            ret[name] = copied
+    return ret
+
+
+def resetTraceStats():
+    """ トレースした呼び出し回数と所要時間を0に戻す
+    """
+    with _trace_stats_lock:
+        for stats in _trace_stats.values():
+            stats.calls, stats.sampled, stats.total, stats.max = 0, 0, 0.0, 0.0
+
+
+TRACE_SORT_KEYS: Tuple[str, ...] = ("total", "calls", "mean", "max")
+
+
+def dumpTraceStats(sort_by: str = "total", limit: Optional[int] = None) -> str:
+    """ トレースした呼び出し回数と所要時間を表にする
+
+    Arguments:
+        sort_by (str):
+            並べ替えるキー. TRACE_SORT_KEYSのいずれか. totalは推定の合計所要時間.
+        limit (int):
+            出力する関数の最大数. None指定で全て.
+
+    Returns:
+        str:
+            表の文字列. 呼び出されていない関数は含めない.
+    """
+    assert sort_by in TRACE_SORT_KEYS, 'Invalid Argument: sort_by'
+    keys = {
+        "total": lambda item: item[1].estimatedTotal,
+        "calls": lambda item: item[1].calls,
+        "mean": lambda item: item[1].mean,
+        "max": lambda item: item[1].max,
+    }
+    items = sorted([item for item in getTraceStats().items() if item[1].calls > 0], key=keys[sort_by], reverse=True)
+    if limit is not None:
+        items = items[:limit]
+
+    lines = ["{:<48} {:>9} {:>9} {:>12} {:>10} {:>10}".format(
+        "function", "calls", "sampled", "total(ms)", "mean(us)", "max(ms)")]
+    for name, stats in items:
+        lines.append("{:<48} {:>9d} {:>9d} {:>12.1f} {:>10.1f} {:>10.2f}".format(
+            name[-48:], stats.calls, stats.sampled, stats.estimatedTotal * 1000, stats.mean * 1000000,
+            stats.max * 1000))
+    return "\n".join(lines)
+
+
 def __handle_exception(exc_type, exc_value, exc_traceback):
     if issubclass(exc_type, KeyboardInterrupt):
         sys.__excepthook__(exc_type, exc_value, exc_traceback)
@@ -56,21 +210,117 @@ def __handle_exception(exc_type, exc_value, exc_traceback):
     logging.getLogger().exception("Exception has occured.", exc_info=(exc_type, exc_value, exc_traceback))
 
 
+#######################################################################################################################
+# Queue Logging
+#######################################################################################################################
+
+DROP_NEW: str = "drop_new"  # キューが一杯のとき、新しいレコードを捨てる
+DROP_OLD: str = "drop_old"  # キューが一杯のとき、最も古いレコードを捨てて新しいレコードを入れる
+BLOCK: str = "block"        # キューが一杯のとき、空くまで待つ（呼び出し元のスレッドが止まる）
+
+
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """ 上限付きのキューにレコードを入れるハンドラ
+
+    キューが一杯のときは、drop_policyに従ってレコードを捨てるか待つ。捨てた数はdroppedで取得できる。
+    """
+
+    def __init__(self, record_queue: queue.Queue, drop_policy: str = DROP_NEW):
+        assert drop_policy in (DROP_NEW, DROP_OLD, BLOCK), 'Invalid Argument: drop_policy'
+        super().__init__(record_queue)
+        self.drop_policy: str = drop_policy
+        self.__dropped: int = 0
+        self.__dropped_lock: threading.Lock = threading.Lock()
+
+    @property
+    def dropped(self) -> int:
+        """ キューが一杯で捨てたレコードの数
+        """
+        return self.__dropped
+
+    def enqueue(self, record: logging.LogRecord):
+        if self.drop_policy == BLOCK:
+            self.queue.put(record)
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            if self.drop_policy == DROP_OLD:
+                try:
+                    self.queue.get_nowait()
+                    self.queue.put_nowait(record)
+                except (queue.Empty, queue.Full):
+                    pass
+            with self.__dropped_lock:
+                self.__dropped += 1
+
+
+class _DrainingQueueListener(logging.handlers.QueueListener):
+    """ 停止時に、キューが一杯でも空くのを待って終了の合図を入れるリスナー
+    """
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+
+_queue_handler: Optional[BoundedQueueHandler] = None
+_queue_listener: Optional[_DrainingQueueListener] = None
+_target_logger: logging.Logger = logging.getLogger()
+_output_handlers: List[logging.Handler] = []
+
+
+def shutdownLogger():
+    """ キューに残ったレコードを全て書き出してから、ロガーのハンドラを閉じる
+
+    setupLogger()で設定したハンドラが対象. 終了時にも自動で呼ばれる.
+    """
+    global _queue_handler, _queue_listener
+    if _queue_handler is not None:
+        _target_logger.removeHandler(_queue_handler)
+    if _queue_listener is not None:
+        # stop()はキューが空になるまで書き出してから戻る
+        _queue_listener.stop()
+        _queue_listener = None
+    if _queue_handler is not None:
+        if _queue_handler.dropped > 0:
+            print(':: {} log records were dropped because the log queue was full.'.format(_queue_handler.dropped),
+                  file=sys.stderr)
+        _queue_handler.close()
+        _queue_handler = None
+    for handler in _output_handlers:
+        _target_logger.removeHandler(handler)
+        handler.flush()
+        handler.close()
+    _output_handlers.clear()
+
+
+atexit.register(shutdownLogger)
+
+
 #######################################################################################################################
 # Easy Logging
 #######################################################################################################################
 
 
-def easy_logging(cls_=None, *, function_trace: bool = False, function_log_level: int = logging.DEBUG):
+def easy_logging(cls_=None, *,
+                 function_trace: bool = False,
+                 function_log_level: int = logging.DEBUG,
+                 function_sample_rate: float = 1.0):
     """ ログ出力を簡単に行えるようにするためのデコレータ
 
     Parameters:
         function_trace (bool):
             メンバ関数に対して開始と終了にログ出力を行うか.
-            呼び出しが頻繁に起こる関数が存在するとパフォーマンスに影響が出ます.
+            呼び出し回数と所要時間はdumpTraceStats()で確認できます.
         function_log_level (int):
             メンバ関数に対するログ出力レベル
+        function_sample_rate (float):
+            トレースする呼び出しの割合. 0.01の場合は100回に1回だけ所要時間を計測し, ログに出力します.
+            呼び出しが頻繁に起こるクラスでは小さくしてください.
     """
+    assert 0.0 < function_sample_rate <= 1.0, 'Invalid Argument: function_sample_rate'
+    sample_interval = max(1, int(round(1.0 / function_sample_rate)))
+
     def wrapper(cls__):
         assert hasattr(cls__, "__name__")  # USE FOR CLASS ONLY
         if not hasattr(cls__, "logger"):
@@ -84,7 +334,8 @@ def easy_logging(cls_=None, *, function_trace: bool = False, function_log_level:
 
                 if callable(getattr(cls__, func)) and hasattr(getattr(cls__, func), "__module__"):
                     if cls__.__module__ == getattr(cls__, func).__module__:
-                        setattr(cls__, func, __func_logging(cls__, getattr(cls__, func)))
+                        setattr(cls__, func,
+                                __func_logging(cls__, getattr(cls__, func), function_log_level, sample_interval))
         return cls__
 
     if cls_ is None:
@@ -100,7 +351,14 @@ def setupLogger(file_prefix: str,
                 latest_logfile_level: int = logging.INFO,
                 is_hook_exception: bool = True,
                 format_str: str = '[%(levelname)-7s] %(asctime)s::<%(name)-20s> | %(message)s',
-                target_logger_instance: logging.Logger = logging.getLogger()
+                target_logger_instance: logging.Logger = logging.getLogger(),
+                logfile_dir: Optional[str] = None,
+                logfile_max_bytes: int = 10 * 1024 * 1024,
+                logfile_rotate_when: Optional[str] = None,
+                logfile_backup_count: int = 5,
+                use_queue: bool = False,
+                queue_size: int = 10000,
+                queue_drop_policy: str = DROP_NEW
                 ) -> logging.Logger:
     """ ロガーの書式を設定する
 
@@ -123,38 +381,78 @@ def setupLogger(file_prefix: str,
             フォーマット書式文字列
         target_logger_instance (logging.Logger)
             設定を行うロガーインスタンス. デフォルトはルート（全体）.
+        logfile_dir (str):
+            ログファイル（<file_prefix>.log）を置くディレクトリ. None指定でテンポラリディレクトリ.
+        logfile_max_bytes (int):
+            ログファイルがこのサイズを超えたらローテーションする. logfile_rotate_when指定時は無視.
+        logfile_rotate_when (str):
+            ログファイルを時間でローテーションする単位. TimedRotatingFileHandlerのwhen（'midnight', 'H'など）.
+        logfile_backup_count (int):
+            ローテーションしたログファイルを残す数.
+        use_queue (bool):
+            ログをキューに入れ、バックグラウンドのスレッドから書き出すか.
+            ログを出力したスレッド（asyncioのイベントループなど）でファイルやコンソールへの書き込みを行わない.
+        queue_size (int):
+            キューに溜めるレコードの最大数.
+        queue_drop_policy (str):
+            キューが一杯のときの動作. DROP_NEW / DROP_OLD / BLOCK
 
     Returns:
         logging.Logger:
             設定を施したロガーインスタンス
     """
+    global _queue_handler, _queue_listener, _target_logger
     assert file_prefix, 'Invalid Argument: file_prefix'
+    assert queue_size > 0, 'Invalid Argument: queue_size'
+
+    # 設定しなおす場合は、前回のキューを書き出してからハンドラを閉じる
+    if _output_handlers:
+        shutdownLogger()
 
     logger = target_logger_instance
     logger.setLevel(logging.DEBUG)
     formatter = logging.Formatter(format_str)
+    handlers: List[logging.Handler] = []
 
     # stdout
     stdout_handler = logging.StreamHandler(console_dest_stream)
     stdout_handler.setLevel(console_level)
     stdout_handler.setFormatter(formatter)
-    logger.addHandler(stdout_handler)
+    handlers.append(stdout_handler)
 
     # file
-    strnow = datetime.now().strftime("%Y%m%d%H%M%S")
-    fname = tempfile.mktemp('.log', file_prefix + strnow + '-')
+    fname = os.path.join(logfile_dir if logfile_dir is not None else tempfile.gettempdir(), file_prefix + '.log')
+    os.makedirs(os.path.dirname(os.path.abspath(fname)), exist_ok=True)
     print(':: Logging to ' + fname, file=sys.stderr)
-    file_handler = logging.FileHandler(filename=fname, mode='w', encoding='utf-8')
+    if logfile_rotate_when is not None:
+        file_handler: logging.Handler = logging.handlers.TimedRotatingFileHandler(
+            filename=fname, when=logfile_rotate_when, backupCount=logfile_backup_count, encoding='utf-8')
+    else:
+        file_handler = logging.handlers.RotatingFileHandler(
+            filename=fname, maxBytes=logfile_max_bytes, backupCount=logfile_backup_count, encoding='utf-8')
     file_handler.setLevel(temp_logfile_level)
     file_handler.setFormatter(formatter)
-    logger.addHandler(file_handler)
+    handlers.append(file_handler)
 
     # Overwrite
     if latest_logfile_path is not None:
         ovr_file_handler = logging.FileHandler(filename=latest_logfile_path, mode='w', encoding='utf-8')
         ovr_file_handler.setLevel(latest_logfile_level)
         ovr_file_handler.setFormatter(formatter)
-        logger.addHandler(ovr_file_handler)
+        handlers.append(ovr_file_handler)
+
+    _output_handlers.extend(handlers)
+    _target_logger = logger
+    if use_queue:
+        # ハンドラはリスナーのスレッドで呼ぶ. ロガーにはキューに入れるハンドラだけを付ける
+        record_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        _queue_handler = BoundedQueueHandler(record_queue, drop_policy=queue_drop_policy)
+        _queue_listener = _DrainingQueueListener(record_queue, *handlers, respect_handler_level=True)
+        _queue_listener.start()
+        logger.addHandler(_queue_handler)
+    else:
+        for handler in handlers:
+            logger.addHandler(handler)
 
     # exception hook
     if is_hook_exception:
@@ -1,4 +1,5 @@
 import logging
+import re
 
 
 class VemtCommandError(Exception):
@@ -6,7 +7,7 @@ class VemtCommandError(Exception):
         super().__init__(message)
         logger: logging.Logger = logging.getLogger(self.__class__.__name__)
         logger.warning(f"コマンドエラー: {message}")
-        for k, v in kwargs:
+        for k, v in kwargs.items():
             try:
                 logger.warning(" --- {} = {}".format(k, str(v).replace("\n", "\\n")))
             except Exception as e:
@@ -23,9 +24,10 @@ class ArgError(VemtCommandError):
         "the following arguments are required:": "次の引数は必ず指定してください:"
     }
 
+    __pattern = re.compile("|".join(re.escape(k) for k in __translate.keys()))
+
     def __init__(self, message):
-        for k, v in ArgError.__translate.items():
-            message = message.replace(k, v)
+        message = ArgError.__pattern.sub(lambda m: ArgError.__translate[m.group(0)], message)
         super().__init__(message)
 
 # これだけ例外でException継承
@@ -55,3 +57,7 @@ class PermissionDeniedError(VemtCommandError):
 
 class InvalidChannelError(VemtCommandError):
     pass
+
+
+class CommandBusyError(VemtCommandError):
+    pass
@@ -2,10 +2,16 @@ import os
 import argparse
 import logging
 
-from easy_logging import setupLogger
+from easy_logging import setupLogger, shutdownLogger
+from metrics import MetricsExporter
 import bot_loader
 import client
+from classes import CommandScheduler, Outbox, EntryAdmission, CommandProfiler, LoopWatchdog
 import config as server_config
+from db import pool as db_pool
+from db import database
+from db import async_database
+from db.api import registry_cache
 
 
 if __name__ == '__main__':
@@ -15,13 +21,21 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument("--token", default="config/discord_token.txt", type=str, help="Filepath of token file.")
     parser.add_argument("--dev", action="store_true", help="enable developing mode.")
+    parser.add_argument("--log-dir", default=None, type=str, help="Directory of rotated log files. (default: temp dir)")
+    parser.add_argument("--sync-logging", action="store_true",
+                        help="write logs on the calling thread instead of a background thread.")
+    parser.add_argument("--profile", action="store_true",
+                        help="profile commands and sample the event loop from start to exit.")
+    parser.add_argument("--profile-dir", default="profiles", type=str, help="Directory of profile output files.")
     args = parser.parse_args()
 
     # setup logger
     logger = setupLogger(file_prefix="vemt",
                          console_level=logging.DEBUG if args.dev else logging.INFO,
                          temp_logfile_level=logging.DEBUG,
-                         latest_logfile_path="latest.log")
+                         latest_logfile_path="latest.log",
+                         logfile_dir=args.log_dir,
+                         use_queue=not args.sync_logging)
 
     # suppress logger
     for logger_name in (
@@ -38,6 +52,26 @@ if __name__ == '__main__':
         # load config
         server_config.loadConfig()
 
+        # setup database
+        db_config = server_config.getConfig().database
+        storage_profile = db_pool.StorageProfile(journal_mode=db_config.storage.journalMode,
+                                                 synchronous=db_config.storage.synchronous,
+                                                 cache_size=db_config.storage.cacheSize,
+                                                 mmap_size=db_config.storage.mmapSize,
+                                                 busy_timeout=db_config.storage.busyTimeout,
+                                                 temp_store=db_config.storage.tempStore,
+                                                 foreign_keys=db_config.storage.foreignKeys)
+        logger.info("Database storage profile: %s", storage_profile)
+        database.setupBackend(backend=db_config.backend, consolidated_filepath=db_config.consolidatedPath)
+        db_pool.setupConnectionPool(max_databases=db_config.poolMaxDatabases,
+                                    max_connections=db_config.poolMaxConnections,
+                                    health_check_interval=db_config.poolHealthCheckInterval,
+                                    statement_cache_size=db_config.statementCacheSize,
+                                    storage_profile=storage_profile)
+        database.setupSqlCache(max_size=db_config.sqlCacheSize)
+        async_database.setupExecutor(max_workers=db_config.executorMaxWorkers)
+        registry_cache.setupRegistryCache(ttl=db_config.registryCacheTtl)
+
         # setup processor
         modules = bot_loader.loadBotProcessors()
         for module in modules:
@@ -53,5 +87,45 @@ if __name__ == '__main__':
         token_str = token_f.readline().strip()
 
     # client instance
-    vemt_client = client.VemtClient(args)
-    vemt_client.run(token_str)
+    scheduler_config = server_config.getConfig().scheduler
+    admission_config = server_config.getConfig().admission
+    watchdog_config = server_config.getConfig().watchdog
+    outbox = Outbox()
+    profiler = CommandProfiler(output_dir=args.profile_dir)
+    vemt_client = client.VemtClient(args, scheduler=CommandScheduler(
+        max_pending_per_lane=scheduler_config.maxPendingPerLane,
+        max_pending=scheduler_config.maxPending,
+        max_concurrent=scheduler_config.maxConcurrent),
+        outbox=outbox,
+        admission=EntryAdmission(
+            outbox,
+            batch_size=admission_config.batchSize,
+            batch_interval=admission_config.batchIntervalMs / 1000,
+            concurrency=admission_config.concurrency,
+            request_interval=admission_config.requestIntervalMs / 1000),
+        profiler=profiler,
+        watchdog=LoopWatchdog(interval=watchdog_config.intervalMs / 1000,
+                              slow_callback=watchdog_config.slowCallbackMs / 1000,
+                              report_interval=watchdog_config.reportInterval))
+
+    # metrics
+    metrics_config = server_config.getConfig().metrics
+    if metrics_config.enabled:
+        exporter = MetricsExporter(textfile_path=metrics_config.textfilePath or None,
+                                   interval=metrics_config.interval,
+                                   http_host=metrics_config.httpHost,
+                                   http_port=metrics_config.httpPort or None)
+        vemt_client.loop.create_task(exporter.run())
+    # client.run()はこのスレッドでイベントループを回すので、ここで開始してよい
+    if args.profile:
+        profiler.start()
+    try:
+        vemt_client.run(token_str)
+    finally:
+        if profiler.running:
+            snapshot = profiler.stop()
+            snapshot.write()
+            logger.info("Wrote profiles to %s", snapshot.directory)
+        async_database.shutdownExecutor()
+        db_pool.getConnectionPool().closeAll()
+        shutdownLogger()
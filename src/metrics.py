@@ -0,0 +1,307 @@
+import asyncio
+import bisect
+import logging
+import os
+import re
+import threading
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+# 秒単位のヒストグラムのデフォルトのバケット
+DEFAULT_BUCKETS: Tuple[float, ...] = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                                      1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace("\"", "\\\"")
+
+
+def _formatLabels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = ["{}=\"{}\"".format(n, _escape(v)) for n, v in zip(names, values)]
+    if extra is not None:
+        pairs.append("{}=\"{}\"".format(extra[0], _escape(extra[1])))
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _formatValue(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    TYPE: str = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        assert re.match(r"^[a-zA-Z_:][a-zA-Z0-9_:]*$", name), name
+        self.name: str = name
+        self.documentation: str = documentation
+        self.labelnames: Tuple[str, ...] = tuple(labelnames)
+        self._lock: threading.Lock = threading.Lock()
+
+    def _key(self, labels: Sequence[str]) -> Tuple[str, ...]:
+        assert len(labels) == len(self.labelnames), "{} expects labels {}".format(self.name, self.labelnames)
+        return tuple(str(v) for v in labels)
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError()
+
+    def render(self) -> List[str]:
+        return ["# HELP {} {}".format(self.name, self.documentation),
+                "# TYPE {} {}".format(self.name, self.TYPE)] + self._samples()
+
+
+class Counter(_Metric):
+    """ 増えるだけの値. リクエスト数など
+    """
+    TYPE = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.__values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        key = self._key(labels)
+        with self._lock:
+            self.__values[key] = self.__values.get(key, 0.0) + amount
+
+    def get(self, *labels: str) -> float:
+        return self.__values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self.__values.items())
+        return ["{}{} {}".format(self.name, _formatLabels(self.labelnames, key), _formatValue(value))
+                for key, value in items]
+
+
+class Gauge(_Metric):
+    """ 増減する値. 待ち行列の長さなど
+    """
+    TYPE = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.__values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, *labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self.__values[key] = value
+
+    def get(self, *labels: str) -> float:
+        return self.__values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self.__values.items())
+        return ["{}{} {}".format(self.name, _formatLabels(self.labelnames, key), _formatValue(value))
+                for key, value in items]
+
+
+class _HistogramValue:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self, buckets: int):
+        self.counts: List[int] = [0] * buckets
+        self.sum: float = 0.0
+        self.count: int = 0
+
+
+class Histogram(_Metric):
+    """ 値の分布. 所要時間など. バケットは上限値の昇順で指定する
+    """
+    TYPE = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        assert list(buckets) == sorted(buckets) and buckets, "buckets must be sorted"
+        self.buckets: Tuple[float, ...] = tuple(buckets)
+        self.__values: Dict[Tuple[str, ...], _HistogramValue] = {}
+
+    def observe(self, value: float, *labels: str):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            v = self.__values.get(key)
+            if v is None:
+                v = self.__values[key] = _HistogramValue(len(self.buckets))
+            if index < len(self.buckets):
+                v.counts[index] += 1
+            v.sum += value
+            v.count += 1
+
+    def count(self, *labels: str) -> int:
+        v = self.__values.get(self._key(labels))
+        return v.count if v is not None else 0
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, (list(v.counts), v.sum, v.count)) for key, v in self.__values.items())
+        lines: List[str] = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, c in zip(self.buckets, counts):
+                cumulative += c
+                lines.append("{}_bucket{} {}".format(
+                    self.name, _formatLabels(self.labelnames, key, ("le", _formatValue(bound))), cumulative))
+            lines.append("{}_bucket{} {}".format(
+                self.name, _formatLabels(self.labelnames, key, ("le", "+Inf")), count))
+            lines.append("{}_sum{} {}".format(self.name, _formatLabels(self.labelnames, key), repr(total)))
+            lines.append("{}_count{} {}".format(self.name, _formatLabels(self.labelnames, key), count))
+        return lines
+
+
+class MetricsRegistry:
+    """ メトリクスの一覧. Prometheusのテキスト形式で書き出す
+    """
+
+    def __init__(self):
+        self.__metrics: Dict[str, _Metric] = {}
+        self.__lock: threading.Lock = threading.Lock()
+
+    def __register(self, metric: _Metric) -> _Metric:
+        with self.__lock:
+            existing = self.__metrics.get(metric.name)
+            if existing is not None:
+                # モジュールの再読み込みなどで同じ名前が登録された場合は、既存のものを使う
+                assert type(existing) is type(metric) and existing.labelnames == metric.labelnames, metric.name
+                return existing
+            self.__metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.__register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.__register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.__register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """ Prometheusのテキスト形式（version 0.0.4）で全てのメトリクスを書き出す
+        """
+        with self.__lock:
+            metrics = sorted(self.__metrics.values(), key=lambda m: m.name)
+        lines: List[str] = []
+        for metric in metrics:
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+
+_registryInstance: MetricsRegistry = MetricsRegistry()
+
+
+def getRegistry() -> MetricsRegistry:
+    """ 共有のメトリクスの一覧を取得する
+    """
+    return _registryInstance
+
+
+# 共通のメトリクス
+COMMAND_SECONDS: Histogram = getRegistry().histogram(
+    "vemt_command_seconds", "Time to run a bot command handler (authenticate and run).", ["module", "outcome"])
+COMMAND_WAIT_SECONDS: Histogram = getRegistry().histogram(
+    "vemt_command_wait_seconds", "Time a command waited in the scheduler before running.", ["module"])
+DB_EXECUTE_SECONDS: Histogram = getRegistry().histogram(
+    "vemt_db_execute_seconds", "Time to execute one SQL statement in Database.", ["operation", "table"])
+DB_ERRORS: Counter = getRegistry().counter(
+    "vemt_db_errors_total", "SQL statements that raised sqlite3.Error.", ["operation", "table"])
+DISCORD_REST_SECONDS: Histogram = getRegistry().histogram(
+    "vemt_discord_rest_seconds", "Time awaiting a Discord REST call, including rate limit waits.",
+    ["method", "route", "status"])
+LOOP_LAG_SECONDS: Histogram = getRegistry().histogram(
+    "vemt_loop_lag_seconds", "How late the event loop woke a periodic timer.")
+LOOP_LAG_QUANTILE_SECONDS: Gauge = getRegistry().gauge(
+    "vemt_loop_lag_quantile_seconds", "Event loop lag percentiles over the last report interval.", ["quantile"])
+LOOP_STALLS: Counter = getRegistry().counter(
+    "vemt_loop_stalls_total", "Times the event loop was blocked longer than the slow callback threshold.")
+
+
+class MetricsExporter:
+    """ メトリクスを定期的にテキストファイルへ書き出し、またはHTTPで公開する
+
+    テキストファイルはnode_exporterのtextfile collectorで読めるように、一時ファイルに書いてから置き換える。
+    HTTPは GET /metrics にだけ応答する。
+    """
+
+    def __init__(self,
+                 registry: Optional[MetricsRegistry] = None,
+                 textfile_path: Optional[str] = None,
+                 interval: float = 15.0,
+                 http_host: str = "127.0.0.1",
+                 http_port: Optional[int] = None,
+                 logger: Optional[logging.Logger] = None):
+        """ MetricsExporterを初期化する
+
+        Args:
+            registry (Optional[MetricsRegistry]): 書き出すメトリクス. Noneの場合は共有のもの
+            textfile_path (Optional[str]): 書き出すファイルパス. Noneの場合は書き出さない
+            interval (float): ファイルに書き出す間隔（秒）
+            http_host (str): HTTPで待ち受けるアドレス
+            http_port (Optional[int]): HTTPで待ち受けるポート. Noneの場合は待ち受けない
+            logger (Optional[logging.Logger]): ロガー
+        """
+        assert interval > 0
+        self.__registry: MetricsRegistry = registry if registry is not None else getRegistry()
+        self.__textfile_path: Optional[str] = textfile_path
+        self.__interval: float = interval
+        self.__http_host: str = http_host
+        self.__http_port: Optional[int] = http_port
+        self.__logger: logging.Logger = logger if logger is not None else logging.getLogger("MetricsExporter")
+        self.__server: Optional[asyncio.AbstractServer] = None
+
+    def writeTextfile(self):
+        """ テキストファイルに書き出す. ファイル入出力を行うため、イベントループのスレッドでは呼ばない
+        """
+        assert self.__textfile_path
+        temp_path = self.__textfile_path + ".tmp"
+        with open(temp_path, mode="w", encoding="utf-8") as f:
+            f.write(self.__registry.render())
+        os.replace(temp_path, self.__textfile_path)
+
+    async def __handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = (await reader.readline()).decode("latin-1").split()
+            # ヘッダーは読み捨てる
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            if len(request_line) >= 2 and request_line[0] == "GET" and request_line[1].split("?")[0] == "/metrics":
+                status, body = "200 OK", self.__registry.render().encode("utf-8")
+            else:
+                status, body = "404 Not Found", b"not found\n"
+            writer.write("HTTP/1.0 {}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                         "Content-Length: {}\r\n\r\n".format(status, len(body)).encode("latin-1") + body)
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError) as e:
+            self.__logger.debug("Metrics request failed. %s: %s", type(e), e)
+        finally:
+            writer.close()
+
+    async def run(self):
+        """ HTTPの待ち受けを開始し、キャンセルされるまでテキストファイルへ定期的に書き出す
+        """
+        loop = asyncio.get_event_loop()
+        if self.__http_port is not None:
+            self.__server = await asyncio.start_server(self.__handle, self.__http_host, self.__http_port)
+            self.__logger.info("Serving metrics on http://%s:%d/metrics", self.__http_host, self.__http_port)
+        try:
+            if self.__textfile_path:
+                self.__logger.info("Writing metrics to %s every %.0f seconds", self.__textfile_path, self.__interval)
+                while True:
+                    await asyncio.sleep(self.__interval)
+                    try:
+                        await loop.run_in_executor(None, self.writeTextfile)
+                    except OSError as e:
+                        self.__logger.warning("Failed to write metrics to %s. %s: %s",
+                                              self.__textfile_path, type(e), e)
+            elif self.__server is not None:
+                await self.__server.serve_forever()
+        finally:
+            if self.__server is not None:
+                self.__server.close()
+                self.__server = None